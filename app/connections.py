@@ -44,6 +44,7 @@ from urllib.request import (urlopen, HTTPPasswordMgrWithDefaultRealm, HTTPBasicA
 
 from app.commons import log, run_task
 from app.settings import SettingsType
+from app.tools.picons import detach_picon
 
 BQ_FILES_LIST = ("tv", "radio",  # Enigma2.
                  "services.xml", "myservices.xml", "bouquets.xml", "ubouquets.xml")  # Neutrino.
@@ -174,7 +175,10 @@ class UtfFTP(FTP):
             self.download_file(file, save_path, callback)
 
     def download_file(self, name, save_path, callback=None):
-        with open(save_path + name, "wb") as f:
+        path = save_path + name
+        detach_picon(path)  # To prevent overwriting of the linked [symbolic or hard] files.
+
+        with open(path, "wb") as f:
             resp = self.download_binary(name, f)
             msg = f"Downloading file: {name}.   Status: {resp}"
             callback(msg) if callback else log(msg.rstrip())
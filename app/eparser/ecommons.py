@@ -29,6 +29,8 @@
 """ Common elements module. """
 from collections import namedtuple
 from enum import Enum
+from functools import lru_cache
+from urllib.parse import unquote
 
 from app.commons import log
 
@@ -57,6 +59,62 @@ Bouquet.__new__.__defaults__ = (None, BqServiceType.DEFAULT, [], None, None, Non
 Bouquets = namedtuple("Bouquets", ["name", "type", "bouquets"])
 BouquetService = namedtuple("BouquetService", ["name", "type", "data", "num"])
 
+
+class IptvRef(namedtuple("IptvRef", ["ref", "url", "name"])):
+    """ Parsed IPTV service reference [fav id].
+
+        ref -> the first ten fields of the reference [None for Neutrino],
+        url -> unquoted stream URL, name -> description or name of the service.
+    """
+    __slots__ = ()
+
+    @property
+    def stream_type(self):
+        return self._get_field(0)
+
+    @property
+    def sid(self):
+        return self._get_field(3)
+
+    @property
+    def tid(self):
+        return self._get_field(4)
+
+    @property
+    def nid(self):
+        return self._get_field(5)
+
+    @property
+    def namespace(self):
+        return self._get_field(6)
+
+    @property
+    def picon_id(self):
+        return f"{self.ref.replace(':', '_')}.png" if self.ref else None
+
+    def _get_field(self, index):
+        return self.ref.split(":", index + 1)[index] if self.ref else None
+
+
+@lru_cache(maxsize=2 ** 17)
+def parse_iptv_ref(fav_id, is_enigma=True):
+    """ Parses the IPTV service reference [fav id]. The results are memoized.
+
+        Returns IptvRef or None if the data has the wrong format.
+    """
+    if not is_enigma:
+        # url::description::...
+        url, sep, data = fav_id.partition("::")
+        return IptvRef(None, url, data.partition("::")[0])
+
+    data, sep, desc = fav_id.partition("#DESCRIPTION")
+    data = data.strip().split(":", 11)
+    if len(data) < 11:
+        return None
+
+    name = data[11].strip() if len(data) > 11 else ""
+    return IptvRef(":".join(data[:10]), unquote(data[10].strip()), desc.lstrip(":").strip() or name)
+
 # *************** *.xml [Satellites, Terrestrial, Cable] ***************** #
 
 Satellite = namedtuple("Satellite", ["name", "flags", "position", "transponders"])
@@ -34,7 +34,7 @@ from enum import Enum
 from pathlib import Path
 
 from app.commons import log
-from app.eparser.ecommons import BqServiceType, BouquetService, Bouquets, Bouquet, BqType
+from app.eparser.ecommons import BqServiceType, BouquetService, Bouquets, Bouquet, BqType, parse_iptv_ref
 
 _TV_FILE = "bouquets.tv"
 _RADIO_FILE = "bouquets.radio"
@@ -312,8 +312,9 @@ class BouquetsReader:
                         bq = Bouquet(sub_bq_name, sub_type, tuple(sub_srvs), None, None, sf_name)
                         services.append(BouquetService(sub_bq_name, BqServiceType.BOUQUET, bq, num))
                 elif srv_data[0].strip() in self._STREAM_TYPES or srv_data[10].startswith(("http", "rtsp")):
-                    stream_data, sep, desc = srv.partition("#DESCRIPTION")
-                    desc = desc.lstrip(":").strip() if desc else srv_data[-1].strip()
+                    # The parsed reference is cached for the further use.
+                    ref = parse_iptv_ref(srv)
+                    desc = ref.name if ref else srv_data[-1].strip()
                     services.append(BouquetService(desc, BqServiceType.IPTV, srv, num))
                 else:
                     fav_id = srv.strip().upper()
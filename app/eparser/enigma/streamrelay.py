@@ -34,6 +34,7 @@ import os.path
 from contextlib import suppress
 
 from app.commons import log
+from app.eparser.ecommons import parse_iptv_ref
 
 _FILE_NAME = "whitelist_streamrelay"
 
@@ -53,11 +54,11 @@ class StreamRelay(dict):
 
     def get_ref_data(self, ref):
         """ Returns tuple from FAV ID and ref or ref and None for comments. """
-        data = ref.split(":")
-        if len(data) == 11:
-            if "http" in data[-1]:
+        if ref.count(":") == 10:
+            data = parse_iptv_ref(ref)
+            if "http" in data.url:
                 return ref.replace("%3a", "%3A"), ref
-            return f"{data[3]}:{data[4]}:{data[5]}:{data[6]}", ref
+            return f"{data.sid}:{data.tid}:{data.nid}:{data.namespace}", ref
         return ref, None
 
     def save(self, path):
@@ -27,12 +27,18 @@
 
 
 """ Module for IPTV and streams support """
+import gzip
+import io
 import re
+import unicodedata
+from collections import namedtuple
+from contextlib import contextmanager
 from enum import Enum
-from urllib.parse import unquote, quote
+from urllib.parse import unquote, quote, urlsplit, urlunsplit, parse_qsl, urlencode
+from urllib.request import urlopen, Request
 
 from app.commons import log
-from app.eparser.ecommons import BqServiceType, Service
+from app.eparser.ecommons import BqServiceType, Service, parse_iptv_ref
 from app.settings import SettingsType
 from app.ui.uicommons import IPTV_ICON
 
@@ -43,6 +49,8 @@ MARKER_FORMAT = " 1:64:{}:0:0:0:0:0:0:0::{}\n#DESCRIPTION {}\n"
 PICON_FORMAT = "{}_{}_{:X}_{:X}_{:X}_{:X}_{:X}_0_0_0.png"
 
 ENCODING_BLACKLIST = {"MacRoman"}
+M3U_SAMPLE_SIZE = 64 * 1024
+M3U_CHUNK_SIZE = 1000
 
 
 class StreamType(Enum):
@@ -61,10 +69,22 @@ class StreamType(Enum):
 
 def parse_m3u(path, s_type, detect_encoding=True, params=None):
     """ Parses *m3u* file and returns tuple with EPG src URLs and services list. """
+    epg_src, services = None, []
+    for epg_src, chunk in iter_m3u(path, s_type, detect_encoding, params):
+        services.extend(chunk)
+
+    return epg_src, services
+
+
+def iter_m3u(path, s_type, detect_encoding=True, params=None, chunk_size=M3U_CHUNK_SIZE):
+    """ Incrementally parses *m3u* playlist [file, URL or binary stream].
+
+        Yields tuples with EPG src URLs and a chunk [list] of services.
+        The encoding is detected from the sample prefix of the data only.
+    """
     pattern = re.compile(r'(\S+)="(.*?)"')
 
-    with open(path, "rb") as file:
-        data = file.read()
+    with open_m3u(path) as file:
         encoding = "utf-8"
 
         if detect_encoding:
@@ -73,9 +93,11 @@ def parse_m3u(path, s_type, detect_encoding=True, params=None):
             except ModuleNotFoundError:
                 pass
             else:
-                enc = chardet.detect(data)
-                encoding = enc.get("encoding", "utf-8")
-                encoding = "utf-8" if encoding in ENCODING_BLACKLIST else encoding
+                sample, file = read_sample(file, M3U_SAMPLE_SIZE)
+                enc = chardet.detect(sample)
+                encoding = enc.get("encoding", None) or "utf-8"
+                # A pure ASCII sample says nothing about the rest of the data.
+                encoding = "utf-8" if encoding in ENCODING_BLACKLIST or encoding == "ascii" else encoding
 
         aggr = [None] * 10
         s_aggr = aggr[: -3]
@@ -87,12 +109,15 @@ def parse_m3u(path, s_type, detect_encoding=True, params=None):
         sid_counter = 1
         name = None
         picon = None
+        epg_id = None
         p_id = "1_0_1_0_0_0_0_0_0_0.png"
         st = BqServiceType.IPTV.name
         params = params or [0, 0, 0, 0]
         m_name = BqServiceType.MARKER.name
 
-        for line in str(data, encoding=encoding, errors="ignore").splitlines():
+        text = io.TextIOWrapper(file, encoding=encoding, errors="ignore")
+        for line in text:
+            line = line.rstrip("\n")
             if line.startswith("#EXTM3U"):
                 data = dict(pattern.findall(line))
                 epg_src = data.get("x-tvg-url", data.get("url-tvg", None))
@@ -130,37 +155,133 @@ def parse_m3u(path, s_type, detect_encoding=True, params=None):
                 else:
                     log(f"*.m3u* parse error ['{path}']: name[{name}], url[{url}], fav id[{fav_id}]")
 
-    return epg_src, services
+                if len(services) >= chunk_size:
+                    yield epg_src, services
+                    services = []
+
+        text.detach()  # The stream is closed by the owner.
+        if services or sid_counter == 1:
+            yield epg_src, services
+
+
+def read_sample(file, size):
+    """ Reads the sample of the data and rewinds the stream.
+
+        Returns the sample and the stream positioned at the start of the sample.
+        Not seekable [network] streams are wrapped to return the sample data first.
+    """
+    sample = file.read(size)
+    if file.seekable():
+        file.seek(-len(sample), io.SEEK_CUR)
+        return sample, file
+    return sample, io.BufferedReader(_SampleStream(sample, file), M3U_SAMPLE_SIZE)
+
+
+class _SampleStream(io.RawIOBase):
+    """ Raw stream that returns the already read sample and then the rest of the source stream. """
+
+    def __init__(self, sample, stream):
+        self._sample = memoryview(sample)
+        self._stream = stream
+
+    def readable(self):
+        return True
+
+    def readinto(self, buf):
+        if self._sample:
+            size = min(len(buf), len(self._sample))
+            buf[:size] = self._sample[:size]
+            self._sample = self._sample[size:]
+            return size
+
+        data = self._stream.read(len(buf))
+        buf[:len(data)] = data
+        return len(data)
+
+
+@contextmanager
+def open_m3u(path):
+    """ Opens *m3u* data [file path, URL or binary stream] as a buffered binary stream. """
+    if hasattr(path, "read"):
+        yield path if isinstance(path, io.BufferedIOBase) else io.BufferedReader(path, M3U_SAMPLE_SIZE)
+    elif str(path).startswith(("http://", "https://")):
+        with urlopen(Request(str(path), headers={"User-Agent": "Mozilla/5.0"}), timeout=10) as resp:
+            yield io.BufferedReader(resp, M3U_SAMPLE_SIZE)
+    else:
+        with open(path, "rb", buffering=M3U_SAMPLE_SIZE) as file:
+            yield file
 
 
-def export_to_m3u(path, bouquet, s_type, url=None):
-    pattern = re.compile(".*:(http.*).*") if s_type is SettingsType.ENIGMA_2 else re.compile("(http.*?)::::.*")
-    lines = ["#EXTM3U\n"]
-    current_grp = None
+def export_to_m3u(path, bouquet, s_type, url=None, logos=None, epg_ids=None, compress=False):
+    """ Exports the bouquet to the *.m3u [*.m3u.gz if compress] file in the given folder.
 
-    for s in bouquet.services:
+        Returns the number of exported services.
+    """
+    file_path = f"{path}{bouquet.name}.m3u{'.gz' if compress else ''}"
+    if compress:
+        file = gzip.open(file_path, "wt", encoding="utf-8", compresslevel=6)
+    else:
+        file = open(file_path, "w", encoding="utf-8", buffering=M3U_SAMPLE_SIZE)
+
+    with file:
+        return write_m3u(file, bouquet.services, s_type, url, logos, epg_ids)
+
+
+def write_m3u(file, services, s_type, url=None, logos=None, epg_ids=None):
+    """ Writes services to the [text] file in a single pass.
+
+        Markers set the group [group-title] of the following services.
+        @param url: base URL for the DVB [DEFAULT] services. If None, only IPTV services are written.
+        @param logos: picon id -> logo URL [tvg-logo] mapping.
+        @param epg_ids: service name -> EPG id [tvg-id] mapping.
+        Returns the number of written services.
+    """
+    is_enigma = s_type is SettingsType.ENIGMA_2
+    write = file.write
+    write("#EXTM3U\n")
+    group = None
+    count = 0
+
+    for s in services:
         srv_type = s.type
         if srv_type is BqServiceType.IPTV:
-            res = re.match(pattern, s.data)
-            if not res:
+            s_url, picon_id = get_iptv_stream_data(s.data, is_enigma)
+            if not s_url:
                 continue
-            lines.append(f"#EXTINF:-1,{s.name}\n")
-            lines.append(current_grp) if current_grp else None
-            u = res.group(1)
-            if s_type is SettingsType.ENIGMA_2:
-                index = u.rfind(":")
-                lines.append(f"{unquote(u[:index] if index > 0 else u)}\n")
-            else:
-                lines.append(f"{u}\n")
-        elif srv_type is BqServiceType.MARKER:
-            current_grp = f"#EXTGRP:{s.name}\n"
         elif srv_type is BqServiceType.DEFAULT and url:
-            lines.append(f"#EXTINF:-1,{s.name}\n")
-            lines.append(current_grp) if current_grp else None
-            lines.append(f"{url}{s.data}\n")
+            s_url, picon_id = f"{url}{s.data}", f"{s.data.replace(':', '_')}.png" if s.data else None
+        elif srv_type is BqServiceType.MARKER:
+            group = s.name
+            continue
+        else:
+            continue
+
+        attrs = ""
+        if epg_ids:
+            epg_id = epg_ids.get(s.name)
+            attrs += f' tvg-id="{_m3u_attr(epg_id)}"' if epg_id else ""
+        if logos and picon_id:
+            logo = logos.get(picon_id)
+            attrs += f' tvg-logo="{_m3u_attr(logo)}"' if logo else ""
+        if group:
+            write(f'#EXTINF:-1{attrs} group-title="{_m3u_attr(group)}",{s.name}\n#EXTGRP:{group}\n{s_url}\n')
+        else:
+            write(f"#EXTINF:-1{attrs},{s.name}\n{s_url}\n")
+        count += 1
 
-    with open(f"{path}{bouquet.name}.m3u", "w", encoding="utf-8") as file:
-        file.writelines(lines)
+    return count
+
+
+def get_iptv_stream_data(data, is_enigma=True):
+    """ Returns the stream URL and picon id as a tuple from the IPTV service data [fav id]. """
+    ref = parse_iptv_ref(data, is_enigma)
+    if not ref or not is_enigma and not ref.url.startswith("http"):
+        return None, None
+    return ref.url, ref.picon_id
+
+
+def _m3u_attr(value):
+    return str(value).replace('"', "'")
 
 
 def get_fav_id(url, name, settings_type, params=None, st_type=None, s_id=0, srv_type=1, force_quote=True):
@@ -180,5 +301,185 @@ def get_picon_id(params=None, st_type=None, s_id=0, srv_type=1):
     return PICON_FORMAT.format(st_type, s_id, srv_type, *params)
 
 
+# ******************** Deduplication ******************** #
+
+class MergePolicy(Enum):
+    """ What to do with the imported services that already exist. """
+    KEEP = "keep"  # Import all services.
+    SKIP = "skip"  # Skip duplicates.
+    MERGE = "merge"  # Use existing services instead of duplicates.
+
+
+# services -> resulting list, skipped -> number of skipped duplicates, merged -> number of replaced duplicates.
+MergeResult = namedtuple("MergeResult", ["services", "skipped", "merged"])
+
+# Authorization and expiry query parameters [tokens, signatures, etc.]. The other parameters are compared exactly.
+_VOLATILE_PARAMS = {"token", "access_token", "auth", "auth_token", "signature", "sig", "md5", "expires", "expire",
+                    "hdnts", "hdnea", "wmsauthsign", "nimblesessionid", "wowzasessionid"}
+# Numbered mirrors of the same host [cdn1.example.com, edge-02.example.com, etc.].
+_MIRROR_PATTERN = re.compile(r"^(cdn|edge|mirror|node|srv|server|stream|live|s)-?\d+\.")
+_NAME_TAGS_PATTERN = re.compile(r"\[.*?]|\(.*?\)|\b(?:uhd|fhd|hd|sd|4k|8k|hevc|h\.?26[45]|\d{3,4}p|\d{2}fps)\b")
+_NAME_PREFIX_PATTERN = re.compile(r"^[a-z]{2,3}\s*[:|]\s*")
+_NON_WORD_PATTERN = re.compile(r"[\W_]+")
+
+
+def normalize_url(url):
+    """ Returns the URL key for the duplicates search.
+
+        The scheme and host are lowercased, default ports, numbered mirror prefixes of the hosts,
+        authorization and expiry query parameters and fragments are removed, the rest of the query is sorted.
+    """
+    url = url.strip()
+    url = unquote(url) if "%" in url else url
+    if "?" not in url and "#" not in url and "@" not in url:
+        # Fast path for the most common URLs.
+        scheme, sep, rest = url.partition("://")
+        host, sep, path = rest.partition("/")
+        if sep and ":" not in host:
+            host = host.lower()
+            host = _MIRROR_PATTERN.sub(r"\1.", host[4:] if host.startswith("www.") else host)
+            scheme = scheme.lower()
+            return f"{'http' if scheme == 'https' else scheme}://{host}/{path.rstrip('/')}"
+
+    try:
+        parts = urlsplit(url)
+        host = (parts.hostname or "").rstrip(".")
+        port = parts.port
+    except ValueError:
+        return url
+
+    if host.startswith("www."):
+        host = host[4:]
+    host = _MIRROR_PATTERN.sub(r"\1.", host)
+    scheme = parts.scheme.lower()
+    if port and (scheme, port) not in (("http", 80), ("https", 443)):
+        host = f"{host}:{port}"
+
+    query = ""
+    if parts.query:
+        params = ((k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+                  if k.lower() not in _VOLATILE_PARAMS)
+        query = urlencode(sorted(params))
+    # Secured and unsecured streams are considered to be the same.
+    scheme = "http" if scheme == "https" else scheme
+    return urlunsplit((scheme, host, parts.path.rstrip("/") or "/", query, ""))
+
+
+def strip_volatile_params(url):
+    """ Returns the URL without the authorization and expiry query parameters. The rest is kept as is. """
+    if "?" not in url:
+        return url
+
+    try:
+        parts = urlsplit(url)
+    except ValueError:
+        return url
+
+    params = [(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if k.lower() not in _VOLATILE_PARAMS]
+    return urlunsplit(parts._replace(query=urlencode(params)))
+
+
+def normalize_name(name):
+    """ Returns the channel name key for the duplicates search.
+
+        Quality tags [HD, 1080p, etc.], bracketed parts, country prefixes [UK:, US |]
+        and punctuation are removed.
+    """
+    name = unicodedata.normalize("NFKC", name).casefold().strip()
+    key = _NAME_TAGS_PATTERN.sub(" ", _NAME_PREFIX_PATTERN.sub("", name))
+    return _NON_WORD_PATTERN.sub("", key) or name
+
+
+class IptvMerger:
+    """ Finds duplicates of the imported IPTV services in linear time [hash join].
+
+        The services are compared by the normalized URLs and, optionally, by the normalized names.
+    """
+
+    def __init__(self, s_type, match_names=False):
+        self._s_type = s_type
+        self._is_enigma = s_type is SettingsType.ENIGMA_2
+        self._match_names = match_names
+        self._urls = {}
+        self._names = {}
+
+    def __len__(self):
+        return len(self._urls)
+
+    def get_url(self, service):
+        """ Returns the stream URL of the service. """
+        return get_iptv_stream_data(service.fav_id, self._is_enigma)[0]
+
+    def get_keys(self, service):
+        """ Returns the normalized URL and name [or None] of the service. """
+        url = self.get_url(service)
+        name = normalize_name(service.service) if self._match_names and service.service else None
+        return normalize_url(url) if url else None, name
+
+    def add(self, services):
+        """ Adds existing IPTV services [the first ones win]. """
+        m_type = BqServiceType.MARKER.name
+        for s in services:
+            if s.service_type != m_type:
+                self._add(s, *self.get_keys(s))
+
+    def _add(self, service, url_key, name_key, urls=None, names=None):
+        if url_key:
+            (self._urls if urls is None else urls).setdefault(url_key, service)
+        if name_key:
+            (self._names if names is None else names).setdefault(name_key, service)
+
+    def find(self, service):
+        """ Returns an existing service for the given one or None. """
+        return self._find(*self.get_keys(service))
+
+    def _find(self, url_key, name_key, urls=None, names=None):
+        srv = (self._urls if urls is None else urls).get(url_key) if url_key else None
+        if not srv and name_key:
+            srv = (self._names if names is None else names).get(name_key)
+        return srv
+
+    def merge(self, services, policy=MergePolicy.SKIP, exclude=None):
+        """ Applies the policy to the imported services.
+
+            Duplicates within the imported list are also removed [the first ones are kept].
+            Each existing service is used only once on merging.
+            Existing services with the excluded fav ids [e.g. of the target bouquet] are skipped instead of merging.
+            Markers of groups without services are removed.
+            Returns MergeResult.
+        """
+        if policy is MergePolicy.KEEP:
+            return MergeResult(list(services), 0, 0)
+
+        result, marker = [], None
+        skipped = merged = 0
+        m_type = BqServiceType.MARKER.name
+        urls, names = {}, {}  # Imported services.
+        used = set(exclude or ())  # Fav ids of the merged [or excluded] existing services.
+
+        for s in services:
+            if s.service_type == m_type:
+                marker = s
+                continue
+
+            keys = self.get_keys(s)
+            srv = self._find(*keys)
+            if srv and policy is MergePolicy.MERGE and srv.fav_id not in used:
+                used.add(srv.fav_id)
+                merged += 1
+            elif srv or self._find(*keys, urls, names):
+                skipped += 1
+                continue
+            else:
+                self._add(s, *keys, urls, names)
+                srv = s
+
+            if marker:
+                result.append(marker)
+                marker = None
+            result.append(srv)
+
+        return MergeResult(result, skipped, merged)
+
 if __name__ == "__main__":
     pass
@@ -90,12 +90,15 @@ class Defaults:
     FORCE_BQ_NAMES = False
     HTTP_API_SUPPORT = True
     ENABLE_YT_DL = False
+    YT_WORKERS = 4
     ENABLE_SEND_TO = False
     USE_COLORS = True
     NEW_COLOR = "rgb(255,230,204)"
     EXTRA_COLOR = "rgb(179,230,204)"
     TOOLTIP_LOGO_SIZE = 96
     LIST_PICON_SIZE = 32
+    PICONS_WORKERS = min(4, os.cpu_count() or 1)
+    STREAMS_CHECK_INTERVAL = 0  # In minutes. 0 -> disabled.
     FAV_CLICK_MODE = 0
     PLAY_STREAMS_MODE = 1 if IS_DARWIN else 0
     STREAM_LIB = "mpv" if IS_WIN else "vlc"
@@ -604,6 +607,15 @@ class Settings:
     def epg_xml_sources(self, value):
         self._cp_settings["epg_xml_sources"] = value
 
+    @property
+    def iptv_subscriptions(self):
+        """ Remote *.m3u playlists of the bouquets [list of dicts with url, bouquet and interval keys]. """
+        return self._cp_settings.get("iptv_subscriptions", [])
+
+    @iptv_subscriptions.setter
+    def iptv_subscriptions(self, value):
+        self._cp_settings["iptv_subscriptions"] = value
+
     @property
     def enable_epg_name_cache(self):
         """ Enables additional name cache for EPG. """
@@ -697,6 +709,15 @@ class Settings:
     def enable_yt_dl_update(self, value):
         self._settings["enable_yt_dl_update"] = value
 
+    @property
+    def yt_workers(self):
+        """ Number of parallel requests for getting YouTube links. """
+        return self._settings.get("yt_workers", Defaults.YT_WORKERS)
+
+    @yt_workers.setter
+    def yt_workers(self, value):
+        self._settings["yt_workers"] = value
+
     @property
     def enable_send_to(self):
         return self._settings.get("enable_send_to", Defaults.ENABLE_SEND_TO)
@@ -773,6 +794,24 @@ class Settings:
     def tooltip_logo_size(self, value):
         self._settings["tooltip_logo_size"] = value
 
+    @property
+    def picons_workers(self):
+        """ Number of processes for the picons conversion. """
+        return self._settings.get("picons_workers", Defaults.PICONS_WORKERS)
+
+    @picons_workers.setter
+    def picons_workers(self, value):
+        self._settings["picons_workers"] = value
+
+    @property
+    def streams_check_interval(self):
+        """ Interval [in minutes] of the background IPTV streams recheck. 0 -> disabled. """
+        return self._settings.get("streams_check_interval", Defaults.STREAMS_CHECK_INTERVAL)
+
+    @streams_check_interval.setter
+    def streams_check_interval(self, value):
+        self._settings["streams_check_interval"] = value
+
     @property
     def use_colors(self):
         return self._settings.get("use_colors", Defaults.USE_COLORS)
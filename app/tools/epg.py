@@ -28,14 +28,18 @@
 
 """  Module for working with epg.dat file. """
 import abc
+import json
 import os
 import re
 import shutil
+import sqlite3
 import struct
 import xml.etree.ElementTree as ET
 from collections import namedtuple, defaultdict
+from contextlib import closing
 from datetime import datetime, timezone
 from tempfile import NamedTemporaryFile
+from threading import RLock
 from urllib.parse import urlparse
 from xml.dom.minidom import parse, Node, Document
 
@@ -237,6 +241,7 @@ class XmlTvReader(Reader):
     TIME_FORMAT_STR = "%Y%m%d%H%M%S %z"
 
     SUFFIXES = {".gz", ".xz", ".lzma", ".xml"}
+    CHUNK_SIZE = 64 * 1024
 
     Service = namedtuple("Service", ["id", "names", "logo", "events"])
     Event = namedtuple("EpgEvent", ["start", "duration", "title", "desc"])
@@ -251,61 +256,49 @@ class XmlTvReader(Reader):
         return self._cache
 
     def download(self, clb=None):
-        """ Downloads an XMLTV file. """
+        """ Downloads an XMLTV file.
+
+            If the local copy exists, a conditional request [ETag/Last-Modified] is used,
+            so the unmodified data is not downloaded again.
+        """
         try:
             res = urlparse(self._url)
             if not all((res.scheme, res.netloc)):
                 log(f"{self.__class__.__name__} [download] error: Invalid URL {self._url}")
                 return
 
-            with requests.get(url=self._url, stream=True, timeout=(5, 5)) as resp:
-                if resp.reason == "OK":
-                    suf = self._url[self._url.rfind("."):]
-                    if suf not in self.SUFFIXES:
-                        log(f"{self.__class__.__name__} [download] error: Unsupported file extension.")
-                        return
-
-                    data_size = resp.headers.get("content-length")
-                    if not data_size:
-                        log(f"{self.__class__.__name__} [download *.{suf}] error: Error getting data size.")
-                        return
+            suf = self._url[self._url.rfind("."):]
+            if suf not in self.SUFFIXES:
+                log(f"{self.__class__.__name__} [download] error: Unsupported file extension.")
+                return
 
+            with requests.get(url=self._url, headers=self.get_headers(), stream=True, timeout=(5, 5)) as resp:
+                if resp.status_code == 304:
+                    # Resetting the modification time [the data is up to date].
+                    os.utime(self._path)
+                    log("XMLTV data has not been modified.")
+                elif resp.reason == "OK":
                     with NamedTemporaryFile(suffix=suf, delete=not IS_WIN) as tf:
                         downloaded = 0
-                        data_size = int(data_size)
+                        data_size = int(resp.headers.get("content-length", 0))
                         completed = set()
 
-                        for data in resp.iter_content(chunk_size=128):
+                        for data in resp.iter_content(chunk_size=self.CHUNK_SIZE):
                             downloaded += len(data)
                             tf.write(data)
-                            done = int(100 * downloaded / data_size)
-                            if done % 25 == 0 and done not in completed:
-                                completed.add(done)
-                                log(f"Downloading XMLTV file...{done}%" if done < 100 else "XMLTV file download complete.")
+                            if data_size:
+                                done = int(100 * downloaded / data_size)
+                                if done % 25 == 0 and done not in completed:
+                                    completed.add(done)
+                                    log(f"Downloading XMLTV file...{done}%" if done < 100 else
+                                        "XMLTV file download complete.")
+                        if not data_size:
+                            log(f"XMLTV file download complete [{downloaded} bytes].")
                         tf.seek(0)
 
                         os.makedirs(os.path.dirname(self._path), exist_ok=True)
-
-                        if suf.endswith(".gz"):
-                            try:
-                                shutil.copyfile(tf.name, self._path)
-                            except OSError as e:
-                                log(f"{self.__class__.__name__} [download *.gz] error: {e}")
-                        elif self._url.endswith((".xz", ".lzma")):
-                            import lzma
-
-                            try:
-                                with lzma.open(tf, "rb") as lzf:
-                                    shutil.copyfileobj(lzf, self._path)
-                            except (lzma.LZMAError, OSError) as e:
-                                log(f"{self.__class__.__name__} [download *.xz] error: {e}")
-                        else:
-                            try:
-                                import gzip
-                                with gzip.open(self._path, "wb") as f_out:
-                                    shutil.copyfileobj(tf, f_out)
-                            except OSError as e:
-                                log(f"{self.__class__.__name__} [download *.xml] error: {e}")
+                        if self.save_data(tf, suf):
+                            self.update_meta(resp)
 
                         if IS_WIN and os.path.isfile(tf.name):
                             tf.close()
@@ -318,6 +311,69 @@ class XmlTvReader(Reader):
             if clb:
                 clb()
 
+    def save_data(self, file, suf):
+        """ Saves the downloaded data as *.gz file. """
+        if suf.endswith(".gz"):
+            try:
+                shutil.copyfile(file.name, self._path)
+            except OSError as e:
+                log(f"{self.__class__.__name__} [download *.gz] error: {e}")
+            else:
+                return True
+        elif suf.endswith((".xz", ".lzma")):
+            import gzip
+            import lzma
+
+            try:
+                with lzma.open(file, "rb") as lzf, gzip.open(self._path, "wb") as f_out:
+                    shutil.copyfileobj(lzf, f_out)
+            except (lzma.LZMAError, OSError) as e:
+                log(f"{self.__class__.__name__} [download *.xz] error: {e}")
+            else:
+                return True
+        else:
+            try:
+                import gzip
+                with gzip.open(self._path, "wb") as f_out:
+                    shutil.copyfileobj(file, f_out)
+            except OSError as e:
+                log(f"{self.__class__.__name__} [download *.xml] error: {e}")
+            else:
+                return True
+        return False
+
+    def get_headers(self):
+        """ Returns headers for the conditional request if the local copy of the data exists. """
+        headers = {}
+        if not os.path.isfile(self._path):
+            return headers
+
+        try:
+            with open(self.meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return headers
+
+        if meta.get("url") == self._url:
+            if meta.get("etag"):
+                headers["If-None-Match"] = meta["etag"]
+            if meta.get("modified"):
+                headers["If-Modified-Since"] = meta["modified"]
+        return headers
+
+    def update_meta(self, resp):
+        """ Stores the validators [ETag/Last-Modified] of the downloaded data. """
+        meta = {"url": self._url, "etag": resp.headers.get("ETag"), "modified": resp.headers.get("Last-Modified")}
+        try:
+            with open(self.meta_path, "w", encoding="utf-8") as f:
+                json.dump(meta, f)
+        except OSError as e:
+            log(f"{self.__class__.__name__} [update meta] error: {e}")
+
+    @property
+    def meta_path(self):
+        return f"{self._path}.meta"
+
     def get_current_events(self, names: set) -> dict:
         events = defaultdict(list)
 
@@ -421,6 +477,84 @@ class XmlTvReader(Reader):
         return t
 
 
+class NameCache:
+    """ Persistent [sqlite] mapping of service names to EPG ids (tvg-id for *.m3u).
+
+        Lookups are served from memory. Writes are done in batches
+        in a single transaction and are safe across threads.
+    """
+    VERSION = 1
+    DB_FILE = "epg-name-cache.db"
+    _JSON_FILE = "epg-name-cache"  # Old format.
+
+    def __init__(self):
+        self._names = {}
+        self._path = None
+        self._lock = RLock()
+
+    def __contains__(self, name):
+        return name in self._names
+
+    def __len__(self):
+        return len(self._names)
+
+    def get(self, name, default=None):
+        return self._names.get(name, default)
+
+    def open(self, path):
+        """ Loads data from the cache located in the given path. """
+        with self._lock:
+            if self._path == path:
+                return
+
+            self._path = path
+            self._names.clear()
+            with closing(self.connect()) as conn:
+                self._names.update(conn.execute("SELECT name, id FROM names"))
+
+            json_file = f"{path}{self._JSON_FILE}"
+            if os.path.isfile(json_file):
+                self.import_json(json_file)
+
+    def update(self, values: dict, path=None):
+        """ Updates [adds] the name -> id values in one transaction. """
+        with self._lock:
+            if path and path != self._path:
+                self.open(path)
+
+            values = {k: v for k, v in values.items() if self._names.get(k) != v}
+            if not values:
+                return
+
+            if self._path is None:
+                raise ValueError("The cache is not opened!")
+
+            with closing(self.connect()) as conn, conn:
+                conn.executemany("INSERT OR REPLACE INTO names (name, id) VALUES (?, ?)", values.items())
+            self._names.update(values)
+
+    def connect(self):
+        os.makedirs(os.path.dirname(self._path) or ".", exist_ok=True)
+        conn = sqlite3.connect(f"{self._path}{self.DB_FILE}")
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if version < self.VERSION:
+            with conn:
+                conn.execute("CREATE TABLE IF NOT EXISTS names (name TEXT PRIMARY KEY, id TEXT NOT NULL)")
+                conn.execute(f"PRAGMA user_version = {self.VERSION}")
+        return conn
+
+    def import_json(self, json_file):
+        """ Imports the data from the old [*.json] cache file. """
+        log(f"[{self.__class__.__name__}] Importing data from the old cache format... -> [{json_file}]")
+        try:
+            with open(json_file, "r", encoding="utf-8") as cf:
+                self.update(json.load(cf))
+        except (OSError, ValueError, sqlite3.Error) as e:
+            log(f"[{self.__class__.__name__}] Import error: {e}")
+        else:
+            os.remove(json_file)
+
+
 class ChannelsParser:
     _COMMENT = "File was created in DemonEditor"
 
@@ -27,17 +27,23 @@
 
 
 import glob
+import hashlib
+import json
+import mmap
 import os
 import re
 import shutil
 import subprocess
 import tempfile
+import time
 from collections import namedtuple
 from datetime import datetime
 from enum import IntEnum
 from html.parser import HTMLParser
 from io import BytesIO
 from pathlib import Path
+from threading import Lock, RLock, BoundedSemaphore, get_ident
+from urllib.parse import urlparse
 from urllib.request import urlopen, Request
 
 import requests
@@ -63,6 +69,349 @@ class PiconFormat(IntEnum):
     OSCAM = 3
 
 
+class PiconsPack:
+    """ Pack of pre-scaled picons thumbnails [RGBA] of the same size.
+
+        All thumbnails are stored in one file which is memory-mapped at load.
+        The index file contains offsets and sizes keyed by picon id and
+        the modification data of the source files for incremental rebuilding.
+    """
+    VERSION = 1
+    _UPDATE_LOCK = Lock()
+
+    def __init__(self, path, size):
+        self._path = path
+        self._size = size
+        self._pack_file = f"{path}picons-{size}.pack"
+        self._index_file = f"{path}picons-{size}.idx"
+        self._index = {}  # picon id -> [offset, width, height, mtime, file size]
+        self._file = None
+        self._mmap = None
+        self._lock = RLock()
+
+    def __contains__(self, p_id):
+        return p_id in self._index
+
+    def __len__(self):
+        return len(self._index)
+
+    @property
+    def size(self):
+        return self._size
+
+    def is_actual(self, p_id, mtime, size):
+        """ Checks if the thumbnail matches the modification data of the picon file. """
+        entry = self._index.get(p_id)
+        return entry is not None and entry[3:] == [mtime, size]
+
+    def get(self, p_id):
+        """ Returns (width, height, RGBA data) or None. """
+        with self._lock:
+            entry = self._index.get(p_id)
+            if not entry or not entry[1] or not self._mmap:
+                return None
+
+            offset, width, height = entry[:3]
+            return width, height, self._mmap[offset: offset + width * height * 4]
+
+    def load(self):
+        """ Loads the index and maps the pack file. """
+        with self._lock:
+            self.close()
+            try:
+                with open(self._index_file, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                return False
+
+            if data.get("version") != self.VERSION or data.get("size") != self._size:
+                return False
+
+            if os.path.isfile(self._pack_file) and os.path.getsize(self._pack_file):
+                self._file = open(self._pack_file, "rb")
+                self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            self._index = data.get("picons", {})
+            return True
+
+    def close(self):
+        with self._lock:
+            if self._mmap:
+                self._mmap.close()
+                self._mmap = None
+            if self._file:
+                self._file.close()
+                self._file = None
+            self._index = {}
+
+    def update(self, picons_path, decoder, keys=None):
+        """ Updates the pack for the given picons folder.
+
+            Only new or modified picons are decoded and appended to the current pack.
+            The pack is rebuilt only when more than half of its data is no longer used.
+            Concurrent updates are serialized.
+            @param decoder: function (path, size) -> (width, height, RGBA data) or None.
+            @param keys: optional function picon id -> content key. Picons with the same key are stored once.
+            Returns a set of changed picon ids.
+        """
+        files = {}
+        if os.path.isdir(picons_path):
+            with os.scandir(picons_path) as it:
+                for e in it:
+                    if e.name.endswith(".png") and e.is_file():
+                        st = e.stat()
+                        files[e.name] = (e.path, st.st_mtime_ns, st.st_size)
+
+        with self._UPDATE_LOCK:
+            return self.update_files(files, decoder, keys)
+
+    def update_files(self, files, decoder, keys):
+        with self._lock:
+            old_index = dict(self._index)
+            pack_size = len(self._mmap) if self._mmap else 0
+
+        changed = set(old_index) - set(files)
+        index, new_files = {}, {}
+        for p_id, (path, mtime, f_size) in files.items():
+            entry = old_index.get(p_id)
+            if entry and entry[3:] == [mtime, f_size] and entry[0] + entry[1] * entry[2] * 4 <= pack_size:
+                index[p_id] = entry
+            else:
+                new_files[p_id] = (path, mtime, f_size)
+
+        changed.update(new_files)
+        if not changed and os.path.isfile(self._pack_file):
+            return changed
+
+        os.makedirs(self._path, exist_ok=True)
+        used = sum(w * h * 4 for o, w, h in {tuple(e[:3]) for e in index.values()})
+        if pack_size and used * 2 >= pack_size and os.path.getsize(self._pack_file) == pack_size:
+            # Appending the new thumbnails. Unchanged entries keep their data.
+            stored = {keys(p_id): e[:3] for p_id, e in index.items() if e[1]} if keys else {}
+            with open(self._pack_file, "ab") as pf:
+                self.write_thumbnails(pf, pack_size, new_files, decoder, keys, stored, index)
+            tmp_pack = None
+        else:
+            # Rebuilding without the unused data.
+            index, stored = {}, {}
+            tmp_pack = f"{self._pack_file}.{get_ident()}.tmp"
+            with open(tmp_pack, "wb") as pf:
+                offset = self.write_thumbnails(pf, 0, {p: files[p] for p in files if p not in new_files},
+                                               self.get_thumbnail, keys, stored, index)
+                self.write_thumbnails(pf, offset, new_files, decoder, keys, stored, index)
+
+        tmp_index = f"{self._index_file}.{get_ident()}.tmp"
+        with open(tmp_index, "w", encoding="utf-8") as f:
+            json.dump({"version": self.VERSION, "size": self._size, "picons": index}, f)
+
+        with self._lock:
+            self.close()
+            if tmp_pack:
+                os.replace(tmp_pack, self._pack_file)
+            os.replace(tmp_index, self._index_file)
+            self.load()
+
+        log(f"{self.__class__.__name__} [{self._size}px]: {len(index)} picons, {len(changed)} updated.")
+        return changed
+
+    def write_thumbnails(self, pf, offset, files, decoder, keys, stored, index):
+        """ Writes thumbnails of the given files to the pack file. Returns the new offset. """
+        for p_id, (path, mtime, f_size) in files.items():
+            key = keys(p_id) if keys else None
+            if key and key in stored:
+                index[p_id] = stored[key] + [mtime, f_size]
+                continue
+
+            thumbnail = decoder(path, self._size)
+            if key:
+                stored[key] = [offset, *thumbnail[:2]] if thumbnail else [0, 0, 0]
+
+            if thumbnail:
+                width, height, data = thumbnail
+                pf.write(data)
+                index[p_id] = [offset, width, height, mtime, f_size]
+                offset += len(data)
+            else:
+                index[p_id] = [0, 0, 0, mtime, f_size]
+
+        return offset
+
+    def get_thumbnail(self, path, size):
+        """ Returns the current thumbnail of the picon by the file path. """
+        return self.get(os.path.basename(path))
+
+
+class PiconsStore:
+    """ Content-addressed index of the picons folder.
+
+        Picons with identical content [by hash] are grouped.
+        The index is cached with the modification data of the files,
+        so only new or modified files are hashed on update.
+        In compact mode, each image is stored once and other names are materialized as links.
+    """
+    VERSION = 1
+
+    def __init__(self, path):
+        self._path = path
+        self._index_file = f"{path}picons-hash.idx"
+        self._index = {}  # picon id -> [hash, mtime, file size]
+        self._lock = RLock()
+
+    def __contains__(self, p_id):
+        return p_id in self._index
+
+    def __len__(self):
+        return len(self._index)
+
+    def get_hash(self, p_id):
+        entry = self._index.get(p_id)
+        return entry[0] if entry else None
+
+    def get_groups(self):
+        """ Returns a dict of hash -> sorted list of picon ids. """
+        groups = {}
+        with self._lock:
+            for p_id, entry in self._index.items():
+                groups.setdefault(entry[0], []).append(p_id)
+        return {h: sorted(ids) for h, ids in groups.items()}
+
+    def get_duplicates(self):
+        """ Returns groups with more than one picon. """
+        return {h: ids for h, ids in self.get_groups().items() if len(ids) > 1}
+
+    def load(self):
+        with self._lock:
+            try:
+                with open(self._index_file, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                return False
+
+            if data.get("version") != self.VERSION:
+                return False
+
+            self._index = data.get("picons", {})
+            return True
+
+    def update(self, picons_path):
+        """ Updates the index for the given picons folder. Returns a set of changed picon ids. """
+        files = {}
+        if os.path.isdir(picons_path):
+            with os.scandir(picons_path) as it:
+                for e in it:
+                    if e.name.endswith(".png") and e.is_file():
+                        st = e.stat()
+                        files[e.name] = (e.path, st.st_mtime_ns, st.st_size)
+
+        with self._lock:
+            old_index = dict(self._index)
+
+        changed = set(old_index) - set(files)
+        index = {}
+        for p_id, (path, mtime, f_size) in files.items():
+            entry = old_index.get(p_id)
+            if entry and entry[1:] == [mtime, f_size]:
+                index[p_id] = entry
+            else:
+                try:
+                    index[p_id] = [self.get_file_hash(path), mtime, f_size]
+                except OSError as e:
+                    log(f"{self.__class__.__name__} [update] error: {e}")
+                else:
+                    changed.add(p_id)
+
+        with self._lock:
+            self._index = index
+
+        if changed or not os.path.isfile(self._index_file):
+            os.makedirs(self._path, exist_ok=True)
+            tmp_index = f"{self._index_file}.{get_ident()}.tmp"
+            with open(tmp_index, "w", encoding="utf-8") as f:
+                json.dump({"version": self.VERSION, "picons": index}, f)
+            os.replace(tmp_index, self._index_file)
+
+        return changed
+
+    def get_stats(self, picons_path):
+        """ Returns a dict with counts of files, unique images, duplicates and bytes that can be saved. """
+        groups = self.get_groups()
+        duplicates, wasted = 0, 0
+        for ids in filter(lambda i: len(i) > 1, groups.values()):
+            inodes = set()
+            for p_id in ids:
+                try:
+                    st = os.stat(f"{picons_path}{p_id}")
+                except OSError:
+                    continue
+                if (st.st_dev, st.st_ino) not in inodes:
+                    inodes.add((st.st_dev, st.st_ino))
+                    if len(inodes) > 1:
+                        duplicates += 1
+                        wasted += st.st_size
+
+        return {"files": len(self._index), "unique": len(groups), "duplicates": duplicates, "wasted": wasted}
+
+    def compact(self, picons_path, use_symlinks=False):
+        """ Stores each image once. Other names with the same content are replaced by links.
+
+            Hard links are used by default. If hard links are not supported, symbolic links are used.
+            Returns a tuple of (linked files count, saved bytes).
+        """
+        linked, saved = 0, 0
+        for ids in self.get_duplicates().values():
+            src = f"{picons_path}{ids[0]}"
+            if not os.path.isfile(src) or os.path.islink(src):
+                continue
+
+            for p_id in ids[1:]:
+                dst = f"{picons_path}{p_id}"
+                try:
+                    if os.path.islink(dst) or os.path.samefile(src, dst):
+                        continue
+                    size = os.path.getsize(dst)
+                    self.link(src, dst, use_symlinks)
+                except OSError as e:
+                    log(f"{self.__class__.__name__} [compact] error: {e}")
+                else:
+                    linked += 1
+                    saved += size
+
+        log(f"{self.__class__.__name__}: {linked} picons linked, {saved} bytes saved.")
+        return linked, saved
+
+    @staticmethod
+    def link(src, dst, use_symlinks=False):
+        tmp = f"{dst}.tmp"
+        if use_symlinks:
+            os.symlink(os.path.basename(src), tmp)
+        else:
+            try:
+                os.link(src, tmp)
+            except OSError:
+                os.symlink(os.path.basename(src), tmp)
+        os.replace(tmp, dst)
+
+    @staticmethod
+    def get_file_hash(path):
+        with open(path, "rb") as f:
+            return hashlib.blake2b(f.read(), digest_size=16).hexdigest()
+
+
+def detach_picon(path, src=None):
+    """ Removes the picon file if it is a link [shared content].
+
+        Should be called before writing to the picon file
+        to prevent changing of the other [linked] picons.
+        Nothing is done if the optional source is the same file.
+    """
+    try:
+        if src and os.path.samefile(src, path):
+            return
+        if os.path.islink(path) or os.stat(path).st_nlink > 1:
+            os.remove(path)
+    except OSError:
+        pass  # NOP
+
+
 class PiconsCzDownloader:
     """ The main class for loading picons from the https://picon.cz/ source (by Chocholoušek). """
 
@@ -72,6 +421,8 @@ class PiconsCzDownloader:
     _HEADER = {"User-Agent": "DemonEditor/3.0.0", "Referer": ""}
     _LINK_PATTERN = re.compile(r"((.*)-\d+x\d+)-(.*)_by_chocholousek.7z$")
     _FILE_PATTERN = re.compile(b"\\s+(\\w+\\.png).*")
+    _CHUNK_SIZE = 1024 * 1024
+    MAX_WORKERS = 4
 
     def __init__(self, picon_ids=set(), appender=log):
         self._perm_links = {}
@@ -111,7 +462,7 @@ class PiconsCzDownloader:
             if request.reason == "OK":
                 log(f"{self.__class__.__name__}: downloading permalinks file...")
                 buf = BytesIO()
-                [buf.write(chunk) for chunk in request.iter_content(chunk_size=128)]
+                [buf.write(chunk) for chunk in request.iter_content(chunk_size=self._CHUNK_SIZE)]
                 buf.seek(0)
 
                 self._perm_cache_file.touch()
@@ -154,22 +505,108 @@ class PiconsCzDownloader:
         return self._providers.get(url, [])
 
     def download(self, provider, picons_path, picon_ids=None):
-        self._HEADER["Referer"] = provider.url
-        with requests.get(url=provider.url, headers=self._HEADER, stream=True) as request:
+        headers = {**self._HEADER, "Referer": provider.url}
+        with requests.get(url=provider.url, headers=headers, stream=True) as request:
             if request.reason == "OK":
-                dest = f"{picons_path}{provider.on_id}.7z"
                 self._appender(f"Downloading: {provider.url}")
-                with open(dest, mode="bw") as f:
-                    for data in request.iter_content(chunk_size=1024):
-                        f.write(data)
+                # The archive is read in memory [7z requires random access] without a full copy on disk.
+                buf = BytesIO()
+                for data in request.iter_content(chunk_size=self._CHUNK_SIZE):
+                    buf.write(data)
+                buf.seek(0)
                 self._appender(f"Extracting: {provider.on_id}")
-                self.extract(dest, picons_path, picon_ids)
+                self.extract(buf, picons_path, picon_ids)
             else:
                 log(f"{self.__class__.__name__} [download] error: {request.reason}")
 
+    def download_all(self, providers, picons_path, picon_ids=None, max_workers=MAX_WORKERS):
+        """ Downloads several providers concurrently.
+
+            Returns a list of errors [if any].
+        """
+        from concurrent.futures import ThreadPoolExecutor, as_completed
+
+        errors = []
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {executor.submit(self.download, p, picons_path, picon_ids): p for p in providers}
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                except (PiconsError, OSError, requests.exceptions.RequestException) as e:
+                    prv = futures[future]
+                    log(f"{self.__class__.__name__} [download] error: {prv.name} -> {e}")
+                    errors.append(e)
+
+        return errors
+
     def extract(self, src, dest, picon_ids=None):
-        """ Extracts 7z archives. """
-        # TODO: think about https://github.com/miurahr/py7zr
+        """ Extracts 7z archives.
+
+            The source is the archive path [removed after extraction] or a seekable binary file object.
+            The in-process extractor [py7zr] is used if available.
+            The 7-zip executable is used otherwise or if the archive can't be extracted by py7zr.
+        """
+        ids = picon_ids or self._picon_ids
+        is_filter = bool(picon_ids)
+        try:
+            try:
+                import py7zr
+            except ImportError:
+                pass
+            else:
+                try:
+                    return self.extract_native(py7zr, src, dest, ids, is_filter)
+                except PiconsError:
+                    raise
+                except Exception as e:
+                    log(f"{self.__class__.__name__} [extract] error: {e}")
+
+            self.extract_external(src, dest, ids, is_filter)
+        finally:
+            if isinstance(src, str) and os.path.isfile(src):
+                os.remove(src)
+
+    def extract_native(self, py7zr, src, dest, ids, is_filter=False):
+        """ Extracts only matching picons [flat] from the archive [path or file object] without external tools. """
+        with py7zr.SevenZipFile(src, mode="r") as arch:
+            targets = {}
+            for name in arch.getnames():
+                base_name = os.path.basename(name)
+                if base_name in ids or (not ids and base_name.endswith(".png")):
+                    targets[name] = base_name
+
+            if is_filter and not targets:
+                raise PiconsError("No matching picons found!")
+
+            if not targets:
+                return
+
+            with tempfile.TemporaryDirectory(dir=dest) as tmp:
+                arch.extract(path=tmp, targets=list(targets))
+                for name, base_name in targets.items():
+                    path = os.path.join(tmp, name)
+                    if os.path.isfile(path):
+                        os.replace(path, os.path.join(dest, base_name))
+
+        src_name = os.path.basename(src) if isinstance(src, str) else "archive"
+        self._appender(f"Extracted: {len(targets)} picons from {src_name}")
+
+    def extract_external(self, src, dest, ids=None, is_filter=False):
+        """ Extracts 7z archives with the 7-zip executable.
+
+            The data of the file object [source] is saved to a temporary file.
+        """
+        if not isinstance(src, str):
+            fd, path = tempfile.mkstemp(suffix=".7z", dir=dest)
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    src.seek(0)
+                    shutil.copyfileobj(src, f)
+                return self.extract_external(path, dest, ids, is_filter)
+            finally:
+                if os.path.isfile(path):
+                    os.remove(path)
+
         exe = "7z"
         if IS_DARWIN and GTK_PATH:
             exe = "./7zr"
@@ -195,8 +632,7 @@ class PiconsCzDownloader:
             log(f"{self.__class__.__name__} [extract] error: {e}")
             raise PiconsError(e)
 
-        is_filter = bool(picon_ids)
-        ids = picon_ids or self._picon_ids
+        ids = ids or self._picon_ids
         to_extract = []
 
         for o in re.finditer(self._FILE_PATTERN, out):
@@ -287,6 +723,179 @@ class PiconsCzDownloader:
                 }
 
 
+class HttpCache:
+    """ HTTP cache with conditional requests [ETag/Last-Modified] for pages and picons.
+
+        The validators are stored in the local metadata file of the cache [by name].
+        Only the entries changed by the instance are written, so the other ones are kept on saving.
+        Page [data] bodies are stored in the cache folder keyed by URL.
+        The data not used for MAX_DATA_AGE and the least recently used data over MAX_DATA_SIZE are removed on saving.
+        Downloaded files are validated by their local copies.
+        One session [connection pool] is used for all requests, so it can be shared between threads.
+        The optional host limit sets the max number of simultaneous requests per host.
+    """
+    VERSION = 1
+    POOL_SIZE = 10
+    MAX_DATA_SIZE = 64 * 1024 * 1024
+    MAX_DATA_AGE = 30 * 24 * 3600  # In seconds.
+
+    def __init__(self, path, name="http", session=None, timeout=TIMEOUT, host_limit=None):
+        self._path = path
+        self._data_path = f"{path}{name}{os.sep}"
+        self._meta_file = f"{path}{name}-cache.json"
+        self._meta = {}  # url -> {"etag": ..., "modified": ..., "file": ..., "size": ...}
+        self._changed = set()  # URLs of the changed entries.
+        self._timeout = timeout
+        self._host_limit = host_limit
+        self._host_semaphores = {}
+        self._lock = RLock()
+        self._session = session or self.get_session(self.POOL_SIZE)
+        self.load()
+
+    @staticmethod
+    def get_session(pool_size):
+        session = requests.Session()
+        session.headers.update(HEADERS)
+        adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    def load(self):
+        meta = self.read_meta()
+        if meta is None:
+            return False
+
+        with self._lock:
+            self._meta = meta
+        return True
+
+    def read_meta(self):
+        try:
+            with open(self._meta_file, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        return data.get("urls", {}) if data.get("version") == self.VERSION else None
+
+    def save(self):
+        self.cleanup()
+        with self._lock:
+            urls = self.read_meta() or {}
+            for url in self._changed:
+                if url in self._meta:
+                    urls[url] = self._meta[url]
+                else:
+                    urls.pop(url, None)
+            self._changed.clear()
+            data = {"version": self.VERSION, "urls": urls}
+
+        os.makedirs(self._path, exist_ok=True)
+        tmp = f"{self._meta_file}.{get_ident()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp, self._meta_file)
+
+    def close(self):
+        self._session.close()
+
+    def cleanup(self):
+        """ Removes the old data and the least recently used data over the size limit. """
+        if not os.path.isdir(self._data_path):
+            return
+
+        with os.scandir(self._data_path) as it:
+            files = [(e.stat(), e.path) for e in it if e.is_file()]
+        files = sorted(((st.st_mtime, st.st_size, path) for st, path in files), reverse=True)
+
+        min_time, total, removed = time.time() - self.MAX_DATA_AGE, 0, set()
+        for mtime, size, path in files:
+            total += size
+            if mtime < min_time or total > self.MAX_DATA_SIZE:
+                try:
+                    os.remove(path)
+                except OSError as e:
+                    log(f"{self.__class__.__name__} [cleanup] error: {e}")
+                else:
+                    removed.add(path)
+
+        if removed:
+            with self._lock:
+                for url in [u for u, m in self._meta.items() if m.get("file") in removed]:
+                    self._meta.pop(url)
+                    self._changed.add(url)
+
+    def get_page(self, url):
+        """ Returns the page text. The cached copy is used if the page has not been modified. """
+        return self.get_data(url).decode(encoding="utf-8", errors="ignore")
+
+    def get_data(self, url):
+        """ Returns the URL data. The cached copy is used if the data has not been modified. """
+        data_file = f"{self._data_path}{hashlib.sha1(url.encode()).hexdigest()}"
+        has_copy = os.path.isfile(data_file)
+        with self._get(url, data_file if has_copy else None) as resp:
+            if resp.status_code == 304:
+                os.utime(data_file)  # Marks the data as recently used.
+                with open(data_file, "rb") as f:
+                    return f.read()
+
+            resp.raise_for_status()
+            data = resp.content
+            os.makedirs(self._data_path, exist_ok=True)
+            tmp = f"{data_file}.{get_ident()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, data_file)
+            self.update_meta(url, resp, data_file, len(data))
+            return data
+
+    def download(self, url, dest_path):
+        """ Downloads the file if it has been modified. Returns True if the file has been downloaded. """
+        with self._get(url, dest_path if os.path.isfile(dest_path) else None) as resp:
+            if resp.status_code == 304:
+                return False
+
+            resp.raise_for_status()
+            detach_picon(dest_path)
+            with open(dest_path, "wb") as f:
+                f.write(resp.content)
+            self.update_meta(url, resp, dest_path, os.path.getsize(dest_path))
+            return True
+
+    def _get(self, url, local_copy=None):
+        headers = {}
+        meta = self._meta.get(url)
+        if local_copy and meta and meta.get("file") == local_copy:
+            if meta.get("etag"):
+                headers["If-None-Match"] = meta["etag"]
+            if meta.get("modified"):
+                headers["If-Modified-Since"] = meta["modified"]
+
+        if not self._host_limit:
+            return self._session.get(url, headers=headers, timeout=self._timeout)
+
+        with self.get_host_semaphore(urlparse(url).netloc):
+            return self._session.get(url, headers=headers, timeout=self._timeout)
+
+    def get_host_semaphore(self, host):
+        with self._lock:
+            semaphore = self._host_semaphores.get(host)
+            if not semaphore:
+                semaphore = BoundedSemaphore(self._host_limit)
+                self._host_semaphores[host] = semaphore
+            return semaphore
+
+    def update_meta(self, url, resp, path, size):
+        etag, modified = resp.headers.get("ETag"), resp.headers.get("Last-Modified")
+        with self._lock:
+            if etag or modified:
+                self._meta[url] = {"etag": etag, "modified": modified, "file": path, "size": size}
+            else:
+                self._meta.pop(url, None)
+            self._changed.add(url)
+
+
 class PiconsParser(HTMLParser):
     """ Parser for package html page. (https://www.lyngsat.com/packages/*provider-name*.html) """
     _BASE_URL = "https://www.lyngsat.com"
@@ -344,17 +953,23 @@ class PiconsParser(HTMLParser):
             self._current_row = []
 
     @staticmethod
-    def parse(provider, picons_path, picon_ids, s_type=SettingsType.ENIGMA_2):
-        """ Returns tuple(url, picon file name) list. """
+    def parse(provider, picons_path, picon_ids, s_type=SettingsType.ENIGMA_2, cache=None):
+        """ Returns tuple(url, picon file name) list.
+
+            If the cache [HttpCache] is set, the page is downloaded only if it has been modified.
+        """
         url = f"{PiconsParser._BASE_URL}{provider.url}"
         picons_data = []
         try:
-            with urlopen(Request(url, headers=HEADERS), timeout=TIMEOUT) as resp:
-                if resp.getcode() == 200:
-                    logo_data = resp.read().decode(encoding="utf-8", errors="ignore")
-                else:
-                    log(f"Provider picons downloading error:: {resp.reason} -> {resp.url}")
-                    return picons_data
+            if cache:
+                logo_data = cache.get_page(url)
+            else:
+                with urlopen(Request(url, headers=HEADERS), timeout=TIMEOUT) as resp:
+                    if resp.getcode() == 200:
+                        logo_data = resp.read().decode(encoding="utf-8", errors="ignore")
+                    else:
+                        log(f"Provider picons downloading error:: {resp.reason} -> {resp.url}")
+                        return picons_data
         except Exception as e:
             log(f"Provider picons downloading error:: {e} -> {url}")
         else:
@@ -537,12 +1152,24 @@ def parse_providers(url):
     return providers
 
 
-def download_picon(src_url, dest_path):
-    """ Downloads and saves the picon to file.  """
+def download_picon(src_url, dest_path, cache=None):
+    """ Downloads and saves the picon to file.
+
+        If the cache [HttpCache] is set, the picon is downloaded only if it has been modified.
+    """
+    if cache:
+        try:
+            if cache.download(src_url, dest_path):
+                log(f"Downloaded: {os.path.basename(dest_path)}.")
+        except (OSError, requests.exceptions.RequestException) as e:
+            log(f"Picon download error: {src_url}  [{e}]")
+        return
+
     log(f"Downloading: {os.path.basename(dest_path)}.")
     with urlopen(Request(src_url, headers=HEADERS), timeout=3.5) as resp:
         if resp.getcode() == 200:
             try:
+                detach_picon(dest_path)
                 with open(dest_path, "wb") as f:
                     f.write(resp.read())
             except OSError as e:
@@ -551,8 +1178,140 @@ def download_picon(src_url, dest_path):
             log(f"Picon download error: {src_url}  [{resp.reason}]")
 
 
+# ****************** Conversion ******************** #
+
+class PiconsConverter:
+    """ Process pool based picons conversion pipeline.
+
+        Tasks are [function, source path, destination paths, *args] tuples.
+        The function is called in a worker process as function(src, dests, *args).
+        Tasks whose destination files are newer than the source are skipped.
+        The callback [if set] is called with (done, total) values to report progress.
+        GTK [GdkPixbuf] based tasks must be run in threads: the workers are forks of the GTK process.
+    """
+    def __init__(self, workers=None, callback=None):
+        self._workers = workers or os.cpu_count() or 1
+        self._callback = callback
+        self._is_canceled = False
+
+    @property
+    def is_canceled(self):
+        return self._is_canceled
+
+    def cancel(self):
+        self._is_canceled = True
+
+    def run(self, tasks, use_threads=False):
+        """ Runs the tasks and returns the number of processed files. """
+        from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+        self._is_canceled = False
+        tasks = [t for t in tasks if not self.is_up_to_date(t[1], t[2])]
+        total, done, processed = len(tasks), 0, 0
+        if not tasks:
+            self.notify(done, total)
+            return processed
+
+        step = max(1, total // 100)
+        pool = ThreadPoolExecutor if use_threads else ProcessPoolExecutor
+        with pool(max_workers=min(self._workers, total)) as executor:
+            futures = {executor.submit(func, src, dests, *args): src for func, src, dests, *args in tasks}
+            for future in as_completed(futures):
+                if self._is_canceled:
+                    log("Picons conversion is canceled!")
+                    [f.cancel() for f in futures]
+                    break
+
+                done += 1
+                try:
+                    processed += bool(future.result())
+                except Exception as e:
+                    log(f"Picon conversion error: {futures[future]} -> {e}")
+
+                if done % step == 0 or done == total:
+                    self.notify(done, total)
+
+        return processed
+
+    def notify(self, done, total):
+        if self._callback:
+            self._callback(done, total)
+
+    def resize(self, files, size):
+        """ Resizes picons in place. Picons that already have the given size are skipped. """
+        return self.run((resize_picon, str(f), (), size) for f in files)
+
+    def svg_to_png(self, files, remove_svg=True):
+        """ Rasterizes *.svg files to *.png [in threads]. """
+        tasks = ((rasterize_svg, str(f), (f"{os.path.splitext(f)[0]}.png",), remove_svg) for f in files)
+        return self.run(tasks, use_threads=True)
+
+    @staticmethod
+    def is_up_to_date(src, dests):
+        if not dests:
+            return False
+
+        try:
+            mtime = os.stat(src).st_mtime_ns
+            return all(os.stat(d).st_mtime_ns >= mtime for d in dests)
+        except OSError:
+            return False
+
+
+def resize_picon(path, dests, size):
+    """ Resizes the picon [in place if no dests]. Returns False if resizing is not required. """
+    from PIL import Image
+
+    with Image.open(path) as img:
+        if img.size == size:
+            return False
+        img = img.resize(size, Image.Resampling.LANCZOS)
+
+    for dest in dests or (path,):
+        tmp = f"{dest}.tmp"
+        img.save(tmp, "PNG", optimize=True)
+        os.replace(tmp, dest)
+    return True
+
+
+def rasterize_svg(path, dests, remove_svg=True):
+    """ Rasterizes the *.svg file to *.png. """
+    from gi.repository import GdkPixbuf
+
+    pixbuf = GdkPixbuf.Pixbuf.new_from_file(path)
+    for dest in dests:
+        pixbuf.savev(dest, "png", [], [])
+
+    if remove_svg:
+        os.remove(path)
+    return True
+
+
+def copy_picon(path, dests):
+    for dest in dests:
+        shutil.copyfile(path, dest)
+    return True
+
+
+def encode_oscam_picon(path, dests):
+    """ Writes the picon as base64 encoded data [*.tpl]. """
+    import base64
+    from PIL import Image
+
+    with Image.open(path) as image:
+        image.thumbnail((100, 60))
+        buff = BytesIO()
+        image.save(buff, format="PNG")
+
+    data_bytes = b"data:image/png;base64," + base64.b64encode(buff.getvalue())
+    for dest in dests:
+        with open(dest, "wb") as f:
+            f.write(data_bytes)
+    return True
+
+
 @run_task
-def convert_to(src_path, dest_path, p_format, ids=None, services=None, done_callback=None):
+def convert_to(src_path, dest_path, p_format, ids=None, services=None, done_callback=None, converter=None):
     """ Converts format [names] of picons.
 
         Copies resulting files from src to dest and writes state to callback.
@@ -567,32 +1326,31 @@ def convert_to(src_path, dest_path, p_format, ids=None, services=None, done_call
         to_convert.append((base_name, file))
 
     if p_format is PiconFormat.NEUTRINO:
-        convert_to_neutrino(to_convert, dest_path)
+        convert_to_neutrino(to_convert, dest_path, converter)
     elif p_format is PiconFormat.OSCAM:
-        convert_to_oscam(to_convert, dest_path, services)
+        convert_to_oscam(to_convert, dest_path, services, converter)
 
     if done_callback:
         done_callback()
 
 
-def convert_to_neutrino(files, dest_path):
+def convert_to_neutrino(files, dest_path, converter=None):
+    tasks = []
     for base_name, file in files:
         pic_data = base_name.rstrip(".png").split("_")
         dest_file = _NEUTRINO_PICON_KEY.format(int(pic_data[4], 16), int(pic_data[5], 16), int(pic_data[3], 16))
-        dest = f"{dest_path}{os.sep}{dest_file}"
-        log(f'Converting "{base_name}" to "{dest_file}"')
-        shutil.copyfile(file, dest)
+        tasks.append((copy_picon, file, (f"{dest_path}{os.sep}{dest_file}",)))
+
+    count = (converter or PiconsConverter()).run(tasks)
+    log(f"Converted {count} of {len(files)} picons.")
 
 
-def convert_to_oscam(files, dest_path, services):
+def convert_to_oscam(files, dest_path, services, converter=None):
     if not files:
         return
 
     os.makedirs(dest_path, exist_ok=True)
-
-    import base64
-    from io import BytesIO
-    from PIL import Image
+    tasks = []
 
     for base_name, file in files:
         to_convert = []
@@ -610,18 +1368,10 @@ def convert_to_oscam(files, dest_path, services):
         else:
             to_convert.append(f"{dest_path}{os.sep}{base_name}.tpl")
 
-        image = Image.open(file)
-        image.thumbnail((100, 60))
-
-        buff = BytesIO()
-        image.save(buff, format="PNG")
-        data_bytes = b"data:image/png;base64," + base64.b64encode(buff.getvalue())
-
-        for dest_file in to_convert:
-            log(f'Converting "{base_name}" to "{dest_file}"')
+        tasks.append((encode_oscam_picon, file, tuple(to_convert)))
 
-            with open(dest_file, "wb") as f:
-                f.write(data_bytes)
+    count = (converter or PiconsConverter()).run(tasks)
+    log(f"Converted {count} of {len(files)} picons.")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,556 @@
+# -*- coding: utf-8 -*-
+#
+# The MIT License (MIT)
+#
+# Copyright (c) 2026 Dmitriy Yefremov
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+# Author: Dmitriy Yefremov
+#
+
+
+""" Module for checking IPTV streams availability. """
+import json
+import os
+import re
+import sqlite3
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import closing
+from enum import Enum
+from threading import Lock, RLock, BoundedSemaphore
+from urllib.parse import urlparse, urljoin
+
+import requests
+
+
+HEADERS = {"User-Agent": "Mozilla/5.0 (X11; Linux x86_64; rv:152.0) Gecko/20100101 Firefox/152.0"}
+HLS_SUFFIXES = (".m3u8", ".m3u")
+
+
+class StreamStatus(Enum):
+    OK = "ok"
+    HTTP_ERROR = "http"
+    TIMEOUT = "timeout"
+    CONNECTION_ERROR = "connection"
+    INVALID = "invalid"  # E.g. HLS manifest without #EXTM3U header.
+    UNSUPPORTED = "unsupported"  # Not HTTP streams [rtmp, rtsp, udp, etc.].
+
+
+# Result of the stream check. code -> HTTP status code [or None], latency -> first response time in seconds.
+CheckResult = namedtuple("CheckResult", ["url", "status", "code", "latency", "time"])
+# Summary of the stream checks history.
+# checks -> total number of checks, errors -> total number of failed checks,
+# failures -> number of the last consecutive failed checks, last_ok -> time of the last successful check.
+StreamHealth = namedtuple("StreamHealth", ["url", "status", "code", "latency", "time", "checks", "errors", "failures",
+                                           "last_ok"])
+# Variant of the HLS stream. bandwidth -> [peak] bits per second, resolution -> WxH.
+StreamVariant = namedtuple("StreamVariant", ["bandwidth", "resolution", "codecs", "url"])
+# Result of the stream probe [extended CheckResult]. latency -> first byte latency in seconds,
+# kind -> "hls", "ts" or content type, variants -> list of StreamVariant, codecs -> codecs of the first segment,
+# segment_latency -> first byte latency of the first segment.
+ProbeResult = namedtuple("ProbeResult", CheckResult._fields + ("kind", "variants", "codecs", "segment_latency"))
+ProbeResult.__new__.__defaults__ = (None, (), (), None)
+# Stored metadata of the probed stream.
+StreamInfo = namedtuple("StreamInfo", ["url", "kind", "variants", "codecs", "latency", "segment_latency", "time"])
+
+
+class StreamChecker:
+    """ Checks the availability of the streams with a bounded thread pool.
+
+        Requests are made with one session [connection reuse] and limited per host.
+        HEAD is used first, a ranged GET as a fallback. HLS manifests are fetched
+        [they are small] and validated. Results are cached for the TTL seconds.
+    """
+    WORKERS = 32
+    HOST_LIMIT = 4
+    TTL = 3600
+    MAX_MANIFEST_SIZE = 64 * 1024
+    # Codes for which the HEAD request will be retried with GET.
+    _HEAD_FALLBACK_CODES = {400, 403, 404, 405, 501}
+    # The results are shared between instances.
+    _cache = {}
+    _cache_lock = Lock()
+    RESULT = CheckResult
+
+    def __init__(self, workers=WORKERS, host_limit=HOST_LIMIT, timeout=(3, 5), ttl=TTL):
+        self._workers = workers
+        self._host_limit = host_limit
+        self._timeout = timeout
+        self._ttl = ttl
+        self._semaphores = {}
+        self._lock = Lock()
+        self._is_canceled = False
+        self._session = requests.Session()
+        self._session.headers.update(HEADERS)
+        adapter = requests.adapters.HTTPAdapter(pool_connections=workers, pool_maxsize=workers)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+
+    @property
+    def is_canceled(self):
+        return self._is_canceled
+
+    def cancel(self):
+        self._is_canceled = True
+
+    def close(self):
+        self._session.close()
+
+    @staticmethod
+    def is_unavailable(result):
+        """ Returns True if the stream should be considered unavailable.
+
+            Forbidden [403] streams are considered available [geo-blocking, etc.].
+            Streams that can't be checked [UNSUPPORTED] are also considered available.
+        """
+        if result.status is StreamStatus.HTTP_ERROR:
+            return result.code != 403
+        return result.status in (StreamStatus.TIMEOUT, StreamStatus.CONNECTION_ERROR, StreamStatus.INVALID)
+
+    def check_all(self, urls):
+        """ Checks the URLs and yields results as soon as they are ready. Duplicate URLs are checked once. """
+        self._is_canceled = False
+        urls = list(dict.fromkeys(urls))
+        with ThreadPoolExecutor(max_workers=self._workers) as executor:
+            futures = [executor.submit(self.check, u) for u in urls]
+            for future in as_completed(futures):
+                if self._is_canceled:
+                    [f.cancel() for f in futures]
+                    return
+                yield future.result()
+
+    def check(self, url):
+        """ Returns the [cached] result of the stream check. """
+        now = time.time()
+        with self._cache_lock:
+            result = self._cache.get(url)
+        if result and now - result.time < self._ttl:
+            return result
+
+        if self._is_canceled:
+            return self.RESULT(url, StreamStatus.UNSUPPORTED, None, None, now)
+
+        result = self.probe(url)
+        with self._cache_lock:
+            self._cache[url] = result
+        return result
+
+    def probe(self, url):
+        parsed = urlparse(url)
+        if parsed.scheme not in ("http", "https"):
+            return CheckResult(url, StreamStatus.UNSUPPORTED, None, None, time.time())
+
+        start = time.perf_counter()
+        try:
+            with self.get_semaphore(parsed.netloc):
+                if parsed.path.lower().endswith(HLS_SUFFIXES):
+                    status, code = self.probe_manifest(url)
+                else:
+                    status, code = self.probe_stream(url)
+        except requests.exceptions.Timeout:
+            status, code = StreamStatus.TIMEOUT, None
+        except (requests.exceptions.RequestException, OSError):
+            status, code = StreamStatus.CONNECTION_ERROR, None
+
+        return CheckResult(url, status, code, time.perf_counter() - start, time.time())
+
+    def probe_stream(self, url):
+        with self._session.head(url, timeout=self._timeout, allow_redirects=True) as resp:
+            code = resp.status_code
+        if code < 400:
+            return StreamStatus.OK, code
+
+        if code in self._HEAD_FALLBACK_CODES:
+            # Some servers don't support HEAD requests.
+            headers = {"Range": "bytes=0-1023"}
+            with self._session.get(url, headers=headers, timeout=self._timeout, stream=True) as resp:
+                code = resp.status_code
+
+        return (StreamStatus.OK if code < 400 else StreamStatus.HTTP_ERROR), code
+
+    def probe_manifest(self, url):
+        with self._session.get(url, timeout=self._timeout, stream=True) as resp:
+            code = resp.status_code
+            if code >= 400:
+                return StreamStatus.HTTP_ERROR, code
+
+            data = b""
+            for chunk in resp.iter_content(chunk_size=8192):
+                data += chunk
+                if len(data) >= self.MAX_MANIFEST_SIZE or b"\n" in data:
+                    break
+
+        return (StreamStatus.OK if data.lstrip(b"\xef\xbb\xbf \r\n\t").startswith(b"#EXTM3U") else
+                StreamStatus.INVALID), code
+
+    def get_semaphore(self, host):
+        with self._lock:
+            semaphore = self._semaphores.get(host)
+            if not semaphore:
+                semaphore = BoundedSemaphore(self._host_limit)
+                self._semaphores[host] = semaphore
+            return semaphore
+
+
+class StreamProber(StreamChecker):
+    """ Lightweight HLS and MPEG-TS prober [without playback].
+
+        For HLS, the master playlist variants [bandwidth, resolution, codecs] are read,
+        then the header [first packets] of the first segment is fetched.
+        For MPEG-TS, the first packets of the stream are fetched.
+        Codecs are detected from the PMT [Program Map Table].
+        Streams are probed concurrently with the base class pool and per host limits.
+    """
+    TTL = 0
+    TS_PACKET_SIZE = 188
+    TS_PROBE_SIZE = TS_PACKET_SIZE * 256
+    MAX_MANIFEST_SIZE = 256 * 1024
+    _cache = {}
+    _cache_lock = Lock()
+    RESULT = ProbeResult
+
+    _ATTR_PATTERN = re.compile(r'([A-Z0-9-]+)=("[^"]*"|[^,]*)')
+    # PMT stream types.
+    STREAM_TYPES = {0x01: "MPEG-1 Video", 0x02: "MPEG-2 Video", 0x03: "MPEG-1 Audio", 0x04: "MPEG-2 Audio",
+                    0x0F: "AAC", 0x11: "AAC-LATM", 0x10: "MPEG-4 Video", 0x1B: "H.264", 0x24: "HEVC",
+                    0x42: "AVS", 0x81: "AC-3", 0x87: "E-AC-3"}
+    # Descriptors of the private [0x06] PES streams.
+    _DESCRIPTOR_TYPES = {0x6A: "AC-3", 0x7A: "E-AC-3", 0x7B: "DTS", 0x7C: "AAC"}
+
+    def __init__(self, workers=StreamChecker.WORKERS, host_limit=StreamChecker.HOST_LIMIT, timeout=(3, 5), ttl=TTL):
+        super().__init__(workers, host_limit, timeout, ttl)
+
+    def probe(self, url):
+        parsed = urlparse(url)
+        if parsed.scheme not in ("http", "https"):
+            return ProbeResult(url, StreamStatus.UNSUPPORTED, None, None, time.time())
+
+        try:
+            with self.get_semaphore(parsed.netloc):
+                return self.probe_url(url)
+        except requests.exceptions.Timeout:
+            status = StreamStatus.TIMEOUT
+        except (requests.exceptions.RequestException, OSError):
+            status = StreamStatus.CONNECTION_ERROR
+
+        return ProbeResult(url, status, None, None, time.time())
+
+    def probe_url(self, url):
+        code, latency, data, content_type = self.fetch(url, self.TS_PROBE_SIZE)
+        if code >= 400:
+            return ProbeResult(url, StreamStatus.HTTP_ERROR, code, latency, time.time())
+
+        if data.lstrip(b"\xef\xbb\xbf \r\n\t").startswith(b"#EXTM3U"):
+            if len(data) >= self.TS_PROBE_SIZE:
+                data = self.fetch(url, self.MAX_MANIFEST_SIZE)[2]
+            variants, codecs, seg_latency = self.probe_playlist(url, data.decode("utf-8", errors="ignore"))
+            return ProbeResult(url, StreamStatus.OK, code, latency, time.time(), "hls", variants, codecs, seg_latency)
+
+        codecs = self.get_ts_codecs(data)
+        kind = "ts" if codecs or self.get_sync_offset(data) >= 0 else content_type
+        return ProbeResult(url, StreamStatus.OK, code, latency, time.time(), kind, (), codecs)
+
+    def fetch(self, url, size):
+        """ Fetches up to size bytes of the data.
+
+            Returns tuple with the status code, first byte latency, data and content type.
+        """
+        start = time.perf_counter()
+        latency = None
+        data = b""
+        with self._session.get(url, timeout=self._timeout, stream=True) as resp:
+            code = resp.status_code
+            content_type = resp.headers.get("content-type", "").partition(";")[0].strip() or None
+            if code >= 400:
+                return code, time.perf_counter() - start, data, content_type
+
+            for chunk in resp.iter_content(chunk_size=8192):
+                if latency is None:
+                    latency = time.perf_counter() - start
+                data += chunk
+                if len(data) >= size:
+                    break
+
+        return code, latency, data[:size], content_type
+
+    def probe_playlist(self, url, text):
+        """ Returns variants, codecs and the first byte latency of the first segment. """
+        variants = self.get_variants(url, text)
+        if variants:
+            # The variant with the lowest bandwidth is used to check the segments.
+            variant = min(variants, key=lambda v: v.bandwidth or 0)
+            code, latency, data, content_type = self.fetch(variant.url, self.MAX_MANIFEST_SIZE)
+            if code >= 400:
+                return tuple(variants), (), None
+            url, text = variant.url, data.decode("utf-8", errors="ignore")
+
+        segment = self.get_first_segment(url, text)
+        if not segment:
+            return tuple(variants), (), None
+
+        code, latency, data, content_type = self.fetch(segment, self.TS_PROBE_SIZE)
+        return tuple(variants), (self.get_ts_codecs(data) if code < 400 else ()), latency
+
+    @staticmethod
+    def get_variants(url, text):
+        """ Returns the list of variants from the master playlist. """
+        variants = []
+        attrs = None
+        for line in text.splitlines():
+            line = line.strip()
+            if line.startswith("#EXT-X-STREAM-INF:"):
+                attrs = {k: v.strip('"') for k, v in StreamProber._ATTR_PATTERN.findall(line[18:])}
+            elif attrs is not None and line and not line.startswith("#"):
+                bandwidth = attrs.get("BANDWIDTH", "")
+                variants.append(StreamVariant(int(bandwidth) if bandwidth.isdigit() else None,
+                                              attrs.get("RESOLUTION"), attrs.get("CODECS"), urljoin(url, line)))
+                attrs = None
+        return variants
+
+    @staticmethod
+    def get_first_segment(url, text):
+        """ Returns the URL of the first segment from the media playlist. """
+        is_segment = False
+        for line in text.splitlines():
+            line = line.strip()
+            if line.startswith("#EXTINF"):
+                is_segment = True
+            elif is_segment and line and not line.startswith("#"):
+                return urljoin(url, line)
+
+    @staticmethod
+    def get_sync_offset(data):
+        """ Returns the offset of the first TS packet or -1. """
+        size = StreamProber.TS_PACKET_SIZE
+        for offset in range(min(size, len(data) - size)):
+            if data[offset] == 0x47 and data[offset + size] == 0x47:
+                return offset
+        return -1
+
+    @staticmethod
+    def get_ts_codecs(data):
+        """ Returns codecs of the streams found in the PMT of the MPEG-TS data. """
+        offset = StreamProber.get_sync_offset(data)
+        if offset < 0:
+            return ()
+
+        size = StreamProber.TS_PACKET_SIZE
+        pmt_pids = set()
+        for pos in range(offset, len(data) - size + 1, size):
+            packet = data[pos: pos + size]
+            if packet[0] != 0x47 or not packet[1] & 0x40:
+                # Without sync byte or not a start of the section.
+                continue
+
+            pid = ((packet[1] & 0x1F) << 8) | packet[2]
+            if pid != 0 and pid not in pmt_pids:
+                continue
+
+            payload = 4
+            if packet[3] & 0x20:
+                payload += 1 + packet[4]
+            if payload >= size:
+                continue
+
+            section = packet[payload + 1 + packet[payload]:]
+            if len(section) < 12:
+                continue
+
+            end = min(3 + (((section[1] & 0x0F) << 8) | section[2]) - 4, len(section))
+            if pid == 0 and section[0] == 0x00:
+                # PAT
+                for i in range(8, end - 3, 4):
+                    if (section[i] << 8) | section[i + 1]:
+                        pmt_pids.add(((section[i + 2] & 0x1F) << 8) | section[i + 3])
+            elif section[0] == 0x02:
+                # PMT
+                return StreamProber.parse_pmt(section, end)
+        return ()
+
+    @staticmethod
+    def parse_pmt(section, end):
+        codecs = []
+        i = 12 + (((section[10] & 0x0F) << 8) | section[11])
+        while i + 5 <= end:
+            s_type = section[i]
+            info_length = ((section[i + 3] & 0x0F) << 8) | section[i + 4]
+            codec = StreamProber.STREAM_TYPES.get(s_type)
+            if s_type == 0x06:
+                # Private PES. Searching for the known descriptors.
+                d_pos, d_end = i + 5, min(i + 5 + info_length, end)
+                while d_pos + 2 <= d_end and not codec:
+                    codec = StreamProber._DESCRIPTOR_TYPES.get(section[d_pos])
+                    d_pos += 2 + section[d_pos + 1]
+            if codec and codec not in codecs:
+                codecs.append(codec)
+            i += 5 + info_length
+        return tuple(codecs)
+
+
+class StreamsHealth:
+    """ Persistent [sqlite] history of the stream checks.
+
+        The summary and the probe metadata for each URL are served from memory.
+        Writes are done in batches in a single transaction and are safe across threads.
+    """
+    VERSION = 2
+    DB_FILE = "streams-health.db"
+    HISTORY_TTL = 30 * 24 * 3600
+    # A failing stream is considered unavailable if it was not available during this period.
+    DEAD_PERIOD = 3 * 24 * 3600
+
+    def __init__(self):
+        self._streams = {}
+        self._infos = {}
+        self._path = None
+        self._lock = RLock()
+
+    def __contains__(self, url):
+        return url in self._streams
+
+    def __len__(self):
+        return len(self._streams)
+
+    def get(self, url, default=None):
+        return self._streams.get(url, default)
+
+    def get_info(self, url, default=None):
+        """ Returns the metadata [StreamInfo] of the probed stream. """
+        return self._infos.get(url, default)
+
+    def open(self, path):
+        """ Loads data from the database located in the given path. """
+        with self._lock:
+            if self._path == path:
+                return
+
+            self._path = path
+            self._streams.clear()
+            self._infos.clear()
+            with closing(self.connect()) as conn:
+                for r in conn.execute(f"SELECT {', '.join(StreamHealth._fields)} FROM streams"):
+                    self._streams[r[0]] = StreamHealth(r[0], StreamStatus(r[1]), *r[2:])
+                for r in conn.execute(f"SELECT {', '.join(StreamInfo._fields)} FROM probes"):
+                    variants = tuple(StreamVariant(*v) for v in json.loads(r[2]))
+                    self._infos[r[0]] = StreamInfo(r[0], r[1], variants, tuple(json.loads(r[3])), *r[4:])
+
+    def update(self, results):
+        """ Adds the check results to the history in one transaction.
+
+            The metadata of the successfully probed streams [ProbeResult] is also stored.
+        """
+        with self._lock:
+            if self._path is None:
+                raise ValueError("The database is not opened!")
+
+            streams, infos = {}, {}
+            for res in results:
+                if isinstance(res, ProbeResult) and res.status is StreamStatus.OK:
+                    infos[res.url] = StreamInfo(res.url, res.kind, tuple(res.variants), tuple(res.codecs),
+                                                res.latency, res.segment_latency, res.time)
+                health = streams.get(res.url) or self._streams.get(res.url)
+                if res.status is StreamStatus.UNSUPPORTED:
+                    continue
+
+                failed = StreamChecker.is_unavailable(res)
+                checks, errors, failures, last_ok = health[5:] if health else (0, 0, 0, None)
+                streams[res.url] = StreamHealth(res.url, res.status, res.code, res.latency, res.time, checks + 1,
+                                                errors + failed, failures + 1 if failed else 0,
+                                                last_ok if failed else res.time)
+            if not streams:
+                return
+
+            with closing(self.connect()) as conn, conn:
+                values = [(h.url, h.status.value, *h[2:]) for h in streams.values()]
+                conn.executemany(f"INSERT OR REPLACE INTO streams ({', '.join(StreamHealth._fields)}) "
+                                 f"VALUES ({', '.join('?' * len(StreamHealth._fields))})", values)
+                conn.executemany("INSERT INTO history (url, status, code, latency, time) VALUES (?, ?, ?, ?, ?)",
+                                 ((h.url, h.status.value, h.code, h.latency, h.time) for h in streams.values()))
+                conn.execute("DELETE FROM history WHERE time < ?", (time.time() - self.HISTORY_TTL,))
+                conn.executemany(f"INSERT OR REPLACE INTO probes ({', '.join(StreamInfo._fields)}) "
+                                 f"VALUES ({', '.join('?' * len(StreamInfo._fields))})",
+                                 ((i.url, i.kind, json.dumps(i.variants), json.dumps(i.codecs), *i[4:])
+                                  for i in infos.values()))
+            self._streams.update(streams)
+            self._infos.update(infos)
+
+    def get_history(self, url):
+        """ Returns the list of check results for the given URL [oldest first]. """
+        with self._lock, closing(self.connect()) as conn:
+            sql = "SELECT url, status, code, latency, time FROM history WHERE url = ? ORDER BY time"
+            return [CheckResult(r[0], StreamStatus(r[1]), *r[2:]) for r in conn.execute(sql, (url,))]
+
+    def is_unavailable(self, url, now=None):
+        """ Returns True if the last check of the stream has failed and
+            there were no successful checks during the DEAD_PERIOD.
+        """
+        health = self._streams.get(url)
+        if not health or not health.failures:
+            return False
+
+        now = now or time.time()
+        return health.last_ok is None or now - health.last_ok > self.DEAD_PERIOD
+
+    @staticmethod
+    def is_flaky(health):
+        """ Returns True if the stream has both failed and successful checks. """
+        return 0 < health.errors < health.checks
+
+    def get_stale(self, urls, limit, max_age):
+        """ Returns the list [up to the limit] of URLs to recheck.
+
+            Never checked streams go first, then failing or flaky ones, then the oldest checks.
+            Streams checked in the last max_age seconds are skipped.
+        """
+        now = time.time()
+        stale = []
+        for url in dict.fromkeys(urls):
+            health = self._streams.get(url)
+            if not health:
+                stale.append((0, 0, url))
+            elif now - health.time > max_age:
+                stale.append((1 if health.failures or self.is_flaky(health) else 2, health.time, url))
+
+        stale.sort()
+        return [url for p, t, url in stale[:limit]]
+
+    def connect(self):
+        os.makedirs(os.path.dirname(self._path) or ".", exist_ok=True)
+        conn = sqlite3.connect(f"{self._path}{self.DB_FILE}")
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if version < self.VERSION:
+            with conn:
+                conn.execute("CREATE TABLE IF NOT EXISTS streams (url TEXT PRIMARY KEY, status TEXT NOT NULL, "
+                             "code INTEGER, latency REAL, time REAL NOT NULL, checks INTEGER NOT NULL, "
+                             "errors INTEGER NOT NULL, failures INTEGER NOT NULL, last_ok REAL)")
+                conn.execute("CREATE TABLE IF NOT EXISTS history (url TEXT NOT NULL, status TEXT NOT NULL, "
+                             "code INTEGER, latency REAL, time REAL NOT NULL)")
+                conn.execute("CREATE INDEX IF NOT EXISTS history_url ON history (url)")
+                conn.execute("CREATE TABLE IF NOT EXISTS probes (url TEXT PRIMARY KEY, kind TEXT, "
+                             "variants TEXT NOT NULL, codecs TEXT NOT NULL, latency REAL, segment_latency REAL, "
+                             "time REAL NOT NULL)")
+                conn.execute(f"PRAGMA user_version = {self.VERSION}")
+        return conn
+
+
+if __name__ == "__main__":
+    pass
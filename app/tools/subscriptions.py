@@ -0,0 +1,259 @@
+# -*- coding: utf-8 -*-
+#
+# The MIT License (MIT)
+#
+# Copyright (c) 2026 Dmitriy Yefremov
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+# Author: Dmitriy Yefremov
+#
+
+
+""" Module for the remote IPTV playlists [subscriptions]. """
+import hashlib
+import json
+import os
+import time
+from collections import namedtuple, defaultdict
+from threading import RLock
+from urllib.parse import quote
+
+import requests
+
+from app.eparser.ecommons import BqServiceType, parse_iptv_ref
+from app.eparser.iptv import iter_m3u, strip_volatile_params
+from app.settings import SettingsType
+from app.tools.streams import HEADERS
+
+# url -> playlist URL, bouquet -> bouquet key [name:type], interval -> refresh interval in minutes.
+Subscription = namedtuple("Subscription", ["url", "bouquet", "interval"])
+Subscription.__new__.__defaults__ = (360,)
+# Difference between the playlist and the current bouquet.
+# services -> services in the playlist order [the existing ones are reused], added -> new services,
+# removed -> services that are no longer in the playlist, changed -> list of (old, new) services.
+SubscriptionDiff = namedtuple("SubscriptionDiff", ["services", "added", "removed", "changed"])
+
+
+class Subscriptions:
+    """ Refreshes the remote *.m3u playlists of the bouquets.
+
+        Playlists are requested conditionally [ETag/Last-Modified] and streamed to local copies.
+        The state [validators, last check time] is stored in the metadata file.
+    """
+    VERSION = 1
+    META_FILE = "subscriptions.json"
+    CHUNK_SIZE = 64 * 1024
+    TIMEOUT = (5, 30)
+
+    def __init__(self):
+        self._path = None
+        self._meta = {}  # url -> {"etag": ..., "modified": ..., "checked": ..., "applied": ...}
+        self._session = None
+        self._lock = RLock()
+
+    def open(self, path):
+        """ Loads the state from the metadata file located in the given path. """
+        with self._lock:
+            if self._path == path:
+                return
+
+            self._path = path
+            self._meta.clear()
+            try:
+                with open(f"{path}{self.META_FILE}", "r", encoding="utf-8") as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                return
+
+            if data.get("version") == self.VERSION:
+                self._meta.update(data.get("urls", {}))
+
+    def save(self):
+        with self._lock:
+            data = {"version": self.VERSION, "urls": dict(self._meta)}
+
+        os.makedirs(self._path, exist_ok=True)
+        meta_file = f"{self._path}{self.META_FILE}"
+        tmp = f"{meta_file}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp, meta_file)
+
+    def close(self):
+        if self._session:
+            self._session.close()
+            self._session = None
+
+    def get_session(self):
+        with self._lock:
+            if not self._session:
+                self._session = requests.Session()
+                self._session.headers.update(HEADERS)
+            return self._session
+
+    def get_file(self, url):
+        """ Returns the path of the local copy of the playlist. """
+        return f"{self._path}subscriptions{os.sep}{hashlib.sha1(url.encode()).hexdigest()}.m3u"
+
+    def is_due(self, sub, now=None):
+        """ Checks if the subscription should be refreshed. """
+        checked = self._meta.get(sub.url, {}).get("checked", 0)
+        return (now or time.time()) - checked >= sub.interval * 60
+
+    def fetch(self, sub):
+        """ Downloads the playlist if it has been modified.
+
+            Returns the path of the local copy or None if the playlist has not been modified
+            and its copy has already been applied.
+        """
+        path = self.get_file(sub.url)
+        meta = self._meta.get(sub.url, {})
+        headers = {}
+        if os.path.isfile(path):
+            if meta.get("etag"):
+                headers["If-None-Match"] = meta["etag"]
+            if meta.get("modified"):
+                headers["If-Modified-Since"] = meta["modified"]
+
+        with self.get_session().get(sub.url, headers=headers, stream=True, timeout=self.TIMEOUT) as resp:
+            modified = resp.status_code != 304
+            if modified:
+                resp.raise_for_status()
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                tmp = f"{path}.tmp"
+                with open(tmp, "wb") as f:
+                    for data in resp.iter_content(chunk_size=self.CHUNK_SIZE):
+                        f.write(data)
+                os.replace(tmp, path)
+
+        with self._lock:
+            meta = self._meta.setdefault(sub.url, {})
+            meta["checked"] = time.time()
+            if modified:
+                meta.update(etag=resp.headers.get("ETag"), modified=resp.headers.get("Last-Modified"), applied=False)
+        self.save()
+
+        return path if modified or not meta.get("applied") else None
+
+    def set_unchecked(self, url):
+        """ Resets the last check time, so the subscription is refreshed on the next check. """
+        with self._lock:
+            self._meta.get(url, {}).pop("checked", None)
+        self.save()
+
+    def set_applied(self, url):
+        with self._lock:
+            self._meta.setdefault(url, {})["applied"] = True
+        self.save()
+
+    def remove(self, url):
+        """ Removes the state and the local copy of the playlist. """
+        with self._lock:
+            self._meta.pop(url, None)
+        self.save()
+
+        path = self.get_file(url)
+        if os.path.isfile(path):
+            os.remove(path)
+
+    @staticmethod
+    def diff(path, services, s_type):
+        """ Compares the playlist with the current bouquet services.
+
+            The services are matched by the URLs without the authorization and expiry parameters
+            [tokens, signatures, etc.], the ones with the exact URLs first.
+            Each current service is matched only once, so the duplicates are matched [or removed] too.
+            The matched services with another URL or name are considered as changed [their references are kept].
+            Returns SubscriptionDiff.
+        """
+        is_enigma = s_type is SettingsType.ENIGMA_2
+        m_type = BqServiceType.MARKER.name
+        current, markers = {}, {}  # current -> stripped URL: list of [not matched] services with refs.
+        for s in services:
+            if s.service_type == m_type:
+                markers.setdefault(s.service, s)
+            elif s.service_type == BqServiceType.IPTV.name:
+                ref = parse_iptv_ref(s.fav_id, is_enigma)
+                if ref and ref.url:
+                    current.setdefault(strip_volatile_params(ref.url), []).append((s, ref))
+
+        result, added, changed = [], [], []
+        found = set()
+        for epg_src, chunk in iter_m3u(path, s_type):
+            for s in chunk:
+                if s.service_type == m_type:
+                    result.append(markers.get(s.service, s))
+                    continue
+
+                key = strip_volatile_params(s.data_id)
+                candidates = current.get(key)
+                if candidates:
+                    i = next((i for i, (c, r) in enumerate(candidates) if r.url == s.data_id), 0)
+                    srv, ref = candidates.pop(i)
+                elif key in found:
+                    continue  # Duplicate in the playlist.
+                else:
+                    srv, ref = None, None
+
+                found.add(key)
+                if not srv:
+                    srv = s._replace(picon=None)
+                    added.append(srv)
+                elif ref.url != s.data_id or srv.service != s.service:
+                    fav_id = s.fav_id
+                    if is_enigma:
+                        fav_id = f" {ref.ref}:{quote(s.data_id)}:{s.service}\n#DESCRIPTION {s.service}\n"
+                    new = s._replace(picon=None, picon_id=srv.picon_id, fav_id=fav_id)
+                    changed.append((srv, new))
+                    srv = new
+                result.append(srv)
+
+        removed = [s for candidates in current.values() for s, r in candidates]
+        return SubscriptionDiff(result, added, removed, changed)
+
+    @staticmethod
+    def apply(fav_ids, diff):
+        """ Returns a new list of the bouquet services [fav ids] with the applied difference.
+
+            The order of the existing services is kept. The new ones are inserted
+            after the nearest preceding [in the playlist] existing service.
+        """
+        removed = {s.fav_id for s in diff.removed}
+        replaced = {old.fav_id: new.fav_id for old, new in diff.changed}
+        fav_ids = [replaced.get(f, f) for f in fav_ids if f not in removed]
+        existing = set(fav_ids)
+
+        anchor, inserts = None, defaultdict(list)
+        for s in diff.services:
+            if s.fav_id in existing:
+                anchor = s.fav_id
+            else:
+                existing.add(s.fav_id)
+                inserts[anchor].append(s.fav_id)
+
+        result = inserts[None]
+        for f in fav_ids:
+            result.append(f)
+            result.extend(inserts.get(f, ()))
+        return result
+
+
+if __name__ == "__main__":
+    pass
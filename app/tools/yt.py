@@ -33,12 +33,16 @@ import os
 import re
 import shutil
 import sys
+import time
 from html.parser import HTMLParser
 from json import JSONDecodeError
+from threading import Lock
 from urllib import parse
 from urllib.error import URLError
 from urllib.request import Request, urlopen, urlretrieve
 
+import requests
+
 from app.commons import log, run_task
 from app.settings import SEP
 from app.ui.uicommons import show_notification
@@ -66,11 +70,18 @@ class YouTube:
     _VIDEO_INFO_LINK = "https://youtube.com/get_video_info?video_id={}&hl=en"
 
     VIDEO_LINK = "https://www.youtube.com/watch?v={}"
+    # Default lifetime [in seconds] of the received links.
+    # The real one is taken from the 'expire' parameter of the links.
+    LINKS_TTL = 3600
+    _EXPIRE_MARGIN = 600
 
     def __init__(self, settings, callback):
         self._settings = settings
         self._yt_dl = None
         self._callback = callback
+        # (video id, source) -> (links, title, expiration time).
+        self._links = {}
+        self._links_lock = Lock()
 
         if self._settings.enable_yt_dl:
             try:
@@ -106,15 +117,41 @@ class YouTube:
         """  Getting link to YouTube video by id or URL.
 
             Returns tuple from the video links dict and title.
+            The received links [all qualities] are cached until they expire.
          """
-        if self._settings.enable_yt_dl and url:
+        use_dl = bool(self._settings.enable_yt_dl and url)
+        key = (video_id or url, use_dl)
+        with self._links_lock:
+            links, title, expires = self._links.get(key, (None, None, 0))
+        if links and time.time() < expires:
+            return dict(links), title
+
+        if use_dl:
             if not self._yt_dl:
                 self._yt_dl = YouTubeDL.get_instance(self._settings, self._callback)
                 if not self._yt_dl:
                     raise YouTubeException("yt-dlp initialization error.")
-            return self._yt_dl.get_yt_link(url, skip_errors)
-
-        return self.get_yt_link_by_id(video_id)
+            links, title = self._yt_dl.get_yt_link(url, skip_errors)
+        else:
+            links, title = self.get_yt_link_by_id(video_id)
+
+        if links:
+            with self._links_lock:
+                self._links[key] = (dict(links), title, self.get_expiration_time(links))
+        return links, title
+
+    def get_expiration_time(self, links):
+        """ Returns the time when the first of the links expires. """
+        expires = []
+        for link in filter(None, links.values()):
+            exp = parse.parse_qs(parse.urlparse(link).query).get("expire", None)
+            if exp and exp[0].isdigit():
+                expires.append(int(exp[0]) - self._EXPIRE_MARGIN)
+        return min(expires) if expires else time.time() + self.LINKS_TTL
+
+    def clear_links_cache(self):
+        with self._links_lock:
+            self._links.clear()
 
     @staticmethod
     def get_yt_link_by_id(video_id):
@@ -170,6 +207,9 @@ class InnerTube:
         Based on InnerTube class from pytube [https://github.com/pytube/pytube] project!
     """
     _BASE_URI = "https://www.youtube.com/youtubei/v1"
+    # The session is shared to reuse connections.
+    _SESSION = None
+    _SESSION_LOCK = Lock()
 
     _DEFAULT_CLIENTS = {
         # The client is taken from -> https://github.com/JuanBindez/pytubefix
@@ -214,26 +254,26 @@ class InnerTube:
     @staticmethod
     def _call_api(endpoint, query, data):
         """ Make a request to a given endpoint with the provided query parameters and data."""
-        headers = {"Content-Type": "application/json", }
-        response = InnerTube._execute(f"{endpoint}?{parse.urlencode(query)}", "POST", headers=headers, data=data)
-
         try:
-            resp = json.loads(response.read())
-        except JSONDecodeError as e:
+            response = InnerTube._execute(endpoint, query, data)
+            response.raise_for_status()
+            return response.json()
+        except ValueError as e:
             log(f"{__class__.__name__}: Parsing response error: {e}")
-        else:
-            return resp
+        except requests.exceptions.RequestException as e:
+            raise YouTubeException(e)
 
     @staticmethod
-    def _execute(url, method=None, headers=None, data=None, timeout=_TIMEOUT):
-        base_headers = {"User-Agent": "Mozilla/5.0", "accept-language": "en-US,en"}
-        if headers:
-            base_headers.update(headers)
-        if data:
-            # Encoding data for request.
-            if not isinstance(data, bytes):
-                data = bytes(json.dumps(data), encoding="utf-8")
-        return urlopen(Request(url, headers=base_headers, method=method, data=data), timeout=timeout)
+    def _execute(url, params=None, data=None, timeout=_TIMEOUT):
+        return InnerTube.get_session().post(url, params=params, json=data, timeout=timeout)
+
+    @classmethod
+    def get_session(cls):
+        with cls._SESSION_LOCK:
+            if not cls._SESSION:
+                cls._SESSION = requests.Session()
+                cls._SESSION.headers.update({"User-Agent": "Mozilla/5.0", "accept-language": "en-US,en"})
+            return cls._SESSION
 
 
 class PlayListParser(HTMLParser):
@@ -29,12 +29,12 @@
 """ Module for working with EPG. """
 import abc
 import gzip
-import json
 import locale
 import os
 import re
 import shutil
 import urllib.request
+from bisect import bisect_left
 from datetime import datetime
 from enum import Enum
 from hashlib import sha1
@@ -48,12 +48,13 @@ from app.commons import run_idle, run_task, run_with_delay, log
 from app.connections import download_data, DownloadType, HttpAPI
 from app.eparser.ecommons import BouquetService, BqServiceType
 from app.settings import SEP, EpgSource, IS_WIN
-from app.tools.epg import EPG, ChannelsParser, EpgEvent, XmlTvReader
+from app.tools.epg import EPG, ChannelsParser, EpgEvent, XmlTvReader, NameCache
 from app.ui.dialogs import translate, show_dialog, DialogType, get_builder, show_chooser_dialog
 from app.ui.tasks import BGTaskWidget
 from app.ui.timers import TimerTool
 from ..main_helper import on_popup_menu, update_entry_data, scroll_to, update_toggle_model, update_filter_sat_positions, \
     show_info_bar_message
+from ..search import TrigramIndex
 from ..uicommons import Gtk, Gdk, UI_RESOURCES_PATH, Column, EPG_ICON, KeyboardKey, Page, HeaderBar
 
 
@@ -133,8 +134,7 @@ class StringComparer:
 
 
 class EpgCache(abc.ABC):
-    _CACHE_FILE = "epg-name-cache"
-    NAME_CACHE = {}  # service name -> id (tvg-id for *.m3u)
+    NAME_CACHE = NameCache()  # service name -> id (tvg-id for *.m3u)
 
     def __init__(self, app):
         super().__init__()
@@ -213,24 +213,18 @@ class EpgCache(abc.ABC):
     @staticmethod
     @run_task
     def update_name_cache(path, values):
-        EpgCache.NAME_CACHE.update(values)
         log(f"[{EpgCache.__name__}] Updating name cache...")
-        f_name = f"{path}{EpgCache._CACHE_FILE}"
-        with open(f_name, "w", encoding="utf-8") as cf:
-            log(f"[{EpgCache.__name__}] Dumping name cache... -> [{f_name}]")
-            json.dump(EpgCache.NAME_CACHE, cf)
+        try:
+            EpgCache.NAME_CACHE.update(values, path)
+        except Exception as e:
+            log(f"[{EpgCache.__name__}] Name cache update error: {e}")
 
     @staticmethod
     @run_task
     def init_name_cache(path):
-        f_name = f"{path}{EpgCache._CACHE_FILE}"
-        if not os.path.isfile(f_name):
-            return
-
         log(f"[{EpgCache.__name__}] Name cache init...")
         try:
-            with open(f_name, "r", encoding="utf-8") as cf:
-                EpgCache.NAME_CACHE.update(json.load(cf))
+            EpgCache.NAME_CACHE.open(path)
         except Exception as e:
             log(f"[{EpgCache.__name__}] Name cache init error: {e}")
 
@@ -1277,8 +1271,7 @@ class EpgDialog:
 
     @run_idle
     def on_auto_configuration(self, item):
-        gen = self.auto_configuration()
-        GLib.idle_add(lambda: next(gen, False), priority=GLib.PRIORITY_LOW)
+        self.auto_configuration()
 
     def auto_configuration(self):
         """ Simple mapping of services by name. """
@@ -1291,47 +1284,68 @@ class EpgDialog:
                        u"ABVGDEEJZIJKLMNOPRSTUFHZCSS_Y_EUAIEGUEDLNCJTV")
             tr = {ord(k): ord(v) for k, v in zip(*symbols)}
 
-        source = {}
-        for row in self._source_view.get_model():
-            name = re.sub("\\W+", "", str(row[0])).upper()
-            name = name.translate(tr) if use_cyrillic else name
-            source[name] = row
+        def get_name(n):
+            n = re.sub("\\W+", "", str(n)).upper()
+            return n.translate(tr) if use_cyrillic else n
 
-        success_count = 0
-        not_founded = {}
+        source = {get_name(row[0]): row[:] for row in self._source_view.get_model()}
+        rows = [(get_name(r[Column.FAV_SERVICE]), r[Column.FAV_ID]) for r in self._bouquet_model if
+                r[Column.FAV_TYPE] == BqServiceType.IPTV.value]
 
-        for r in self._bouquet_model:
-            if r[Column.FAV_TYPE] != BqServiceType.IPTV.value:
-                continue
-            name = re.sub("\\W+", "", str(r[Column.FAV_SERVICE])).upper()
-            if use_cyrillic:
-                name = name.translate(tr)
-            ref = source.get(name, None)  # Not [pop], because the list may contain duplicates or similar names!
-            if ref:
-                self.assign_data(r, ref, True)
-                success_count += 1
-                self._bouquet_epg_count_label.set_text(str(success_count))
-                yield True
-            else:
-                not_founded[name] = r
+        self.find_mappings(source, rows, self._enable_deep_comparing_switch.get_active())
+
+    @run_task
+    def find_mappings(self, source, rows, use_deep):
+        """ Searches for the services mapping in a separate thread.
+
+            Similar names are compared only with a few candidates selected
+            by trigrams [deep comparing] or by prefix.
+            The rows are passed as (name, fav_id) tuples. Tree iters are not used
+            here because the model may be changed before the mappings are applied.
+        """
+        mapped = []
+        not_found = []
+        for name, fav_id in rows:
+            # Not [pop], because the list may contain duplicates or similar names!
+            ref = source.get(name, None)
+            mapped.append((fav_id, ref)) if ref else not_found.append((name, fav_id))
 
         # Additional attempt to search in the remaining elements
-        use_deep = self._enable_deep_comparing_switch.get_active()
-        for n in not_founded:
-            for k in source:
-                if StringComparer.is_similar(k, n, StringComparer.ALG.JARO) if use_deep else k.startswith(n):
-                    self.assign_data(not_founded[n], source[k], True)
-                    success_count += 1
-                    self._bouquet_epg_count_label.set_text(str(success_count))
-                    break
-                yield True
+        not_found = [(n, fav_id) for n, fav_id in not_found if n]
+        if not_found and use_deep:
+            index = TrigramIndex()
+            index.build((k, k) for k in source)
+            for name, fav_id in not_found:
+                candidates = index.query(name, limit=10, threshold=0.3)
+                key = next((k for k, s in candidates if StringComparer.is_similar(k, name, StringComparer.ALG.JARO)),
+                           None)
+                if key:
+                    mapped.append((fav_id, source[key]))
+        elif not_found:
+            keys = sorted(source)
+            for name, fav_id in not_found:
+                i = bisect_left(keys, name)
+                if i < len(keys) and keys[i].startswith(name):
+                    mapped.append((fav_id, source[keys[i]]))
+
+        GLib.idle_add(self.apply_mappings, mapped)
+
+    def apply_mappings(self, mapped):
+        """ Assigns the found data to the current rows [by fav_id]. Must be called in the main thread. """
+        mapped = dict(mapped)
+        success_count = 0
+        for row in self._bouquet_model:
+            ref = mapped.get(row[Column.FAV_ID])
+            if ref and row[Column.FAV_TYPE] == BqServiceType.IPTV.value:
+                self.assign_data(row, ref, True)
+                success_count += 1
 
+        self._bouquet_epg_count_label.set_text(str(success_count))
         self._auto_config_button.set_sensitive(True)
         self.update_epg_count()
         self.show_info_message("{} {} {}".format(translate("Done!"),
                                                  translate("Count of successfully configured services:"),
                                                  success_count), Gtk.MessageType.INFO)
-        yield True
 
     def assign_refs(self, model, paths, data):
         [self.assign_data(model[p], data) for p in paths]
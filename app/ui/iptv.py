@@ -29,12 +29,12 @@
 import concurrent.futures
 import os
 import re
+import sqlite3
 import urllib
 from datetime import date
+from collections import Counter
 from itertools import groupby, chain
-from urllib.error import HTTPError
 from urllib.parse import urlparse, unquote, quote
-from urllib.request import Request, urlopen
 
 import requests
 from gi.repository import GLib, Gio, GdkPixbuf
@@ -42,12 +42,14 @@ from gi.repository import GLib, Gio, GdkPixbuf
 from app.commons import run_idle, run_task, log
 from app.eparser.ecommons import BqServiceType, BouquetService, Service
 from app.eparser.iptv import (NEUTRINO_FAV_ID_FORMAT, StreamType, ENIGMA2_FAV_ID_FORMAT, get_fav_id, MARKER_FORMAT,
-                              parse_m3u, PICON_FORMAT)
+                              iter_m3u, PICON_FORMAT, IptvMerger, MergePolicy)
 from app.settings import SettingsType
+from app.tools.picons import detach_picon, HttpCache
+from app.tools.streams import StreamChecker
 from app.tools.yt import YouTubeException, YouTube
 from app.ui.dialogs import Action, show_dialog, DialogType, translate, get_builder, BaseDialog
 from app.ui.epg.epg import EpgCache
-from app.ui.main_helper import get_iptv_url, on_popup_menu, get_picon_pixbuf, show_info_bar_message, gen_bouquet_name
+from app.ui.main_helper import get_iptv_url, on_popup_menu, show_info_bar_message, gen_bouquet_name
 from app.ui.uicommons import (Gtk, Gdk, UI_RESOURCES_PATH, IPTV_ICON, Column, KeyboardKey, get_yt_icon, HeaderBar)
 
 _DIGIT_ENTRY_NAME = "digit-entry"
@@ -396,7 +398,15 @@ class IptvDialog:
 
 class SearchUnavailableDialog:
 
-    def __init__(self, transient, model, fav_bouquet, iptv_rows, s_type):
+    """ Searches for unavailable streams.
+
+        If the health history is given, the results are saved to it
+        and streams are considered unavailable based on that history.
+        Rows without HTTP URLs can't be checked and are skipped.
+    """
+    BATCH_SIZE = 50
+
+    def __init__(self, transient, model, fav_bouquet, iptv_rows, s_type, health=None):
         handlers = {"on_response": self.on_response}
 
         builder = get_builder(UI_RESOURCES_PATH + "iptv.glade", handlers,
@@ -414,55 +424,87 @@ class SearchUnavailableDialog:
         self._max_rows = len(self._iptv_rows)
         self._level_bar.set_max_value(self._max_rows)
         self._download_task = True
+        self._is_closed = False
         self._to_delete = []
+        self._checker = StreamChecker()
+        self._health = health
+        # URL -> rows. The same stream is checked only once.
+        self._urls = {}
+        self._skipped = 0
+        for row in self._iptv_rows:
+            url = get_iptv_url(row, self._s_type)
+            if url and urlparse(url).scheme in ("http", "https"):
+                self._urls.setdefault(url, []).append(row)
+            else:
+                self._skipped += 1
 
         self.update_counter()
         self.do_search()
 
     @run_task
     def do_search(self):
-        import ssl
-        import certifi
+        stats = Counter()
+        results = []
+        if self._skipped:
+            log(f"Streams check: {self._skipped} rows without HTTP URL skipped.")
+            self.update_bar(self._skipped)
 
-        context = ssl.create_default_context(cafile=certifi.where())
-
-        with concurrent.futures.ThreadPoolExecutor(max_workers=4) as executor:
-            futures = {executor.submit(self.get_unavailable, row, context): row for row in self._iptv_rows}
-            for future in concurrent.futures.as_completed(futures):
+        try:
+            for result in self._checker.check_all(self._urls):
                 if not self._download_task:
-                    executor.shutdown()
-                    return
-                future.result()
+                    break
+
+                stats[result.status] += 1
+                results.append(result)
+                if len(results) >= self.BATCH_SIZE:
+                    self.process_results(results)
+                    results = []
+            else:
+                self.process_results(results)
+        finally:
             self._download_task = False
-        self.on_close()
+            self._checker.close()
+            log(f"Streams check: {', '.join(f'{s.value}: {c}' for s, c in stats.items())}.")
+            self.on_close()
 
-    def get_unavailable(self, row, context):
-        if not self._download_task:
-            return
-        try:
-            req = Request(get_iptv_url(row, self._s_type))
-            self.update_bar()
-            urlopen(req, context=context, timeout=2)
-        except HTTPError as e:
-            if e.code != 403:
-                self.append_data(row)
-        except Exception:
-            self.append_data(row)
+    def process_results(self, results):
+        if self._health is not None:
+            try:
+                self._health.update(results)
+            except (OSError, sqlite3.Error) as e:
+                log(f"{self.__class__.__name__} [health update] error: {e}")
+                self._health = None
+
+        [self.on_result(r, self._urls.get(r.url, ())) for r in results]
+
+    @run_idle
+    def on_result(self, result, rows):
+        """ Processes the results as soon as they are ready. """
+        self.update_bar(len(rows))
+        if self._health is None:
+            is_unavailable = self._checker.is_unavailable(result)
+        else:
+            is_unavailable = self._health.is_unavailable(result.url)
+
+        if is_unavailable:
+            code = f" [{result.code}]" if result.code else ""
+            log(f"Unavailable stream: {result.url} -> {result.status.value}{code}")
+            [self.append_data(r) for r in rows]
 
     def append_data(self, row):
         self._to_delete.append(self._model.get_iter(row.path))
         self.update_counter()
 
-    @run_idle
-    def update_bar(self):
-        self._max_rows -= 1
-        self._level_bar.set_value(self._max_rows)
-
     @run_idle
     def update_counter(self):
         self._counter += 1
         self._counter_label.set_text(str(self._counter))
 
+    @run_idle
+    def update_bar(self, count):
+        self._max_rows -= count
+        self._level_bar.set_value(self._max_rows)
+
     def show(self):
         response = self._dialog.run()
 
@@ -474,9 +516,13 @@ class SearchUnavailableDialog:
 
     @run_idle
     def on_close(self):
+        if self._is_closed:
+            return
         if self._download_task and show_dialog(DialogType.QUESTION, self._dialog) == Gtk.ResponseType.CANCEL:
             return
+        self._is_closed = True
         self._download_task = False
+        self._checker.cancel()
         self._dialog.destroy()
 
 
@@ -700,12 +746,14 @@ class M3uImportDialog(IptvListDialog):
         self._errors_count = 0
         self._max_count = 0
         self._is_download = False
+        self._groups = {}  # group -> tree iter.
         self._cancellable = Gio.Cancellable()
         self._dialog.set_title(translate("Playlist import"))
         self._dialog.connect("delete-event", self.on_close)
         self._apply_button.set_label(translate("Import"))
         # Extra box.
-        builder = get_builder(f"{UI_RESOURCES_PATH}m3u.glade", use_str=True, objects=("import_m3u_box",))
+        builder = get_builder(f"{UI_RESOURCES_PATH}m3u.glade", use_str=True,
+                              objects=("import_m3u_box", "import_groups_store"))
         self._info_label = builder.get_object("info_label")
         self._progress_bar = builder.get_object("progress_bar")
         self._spinner = builder.get_object("spinner")
@@ -720,6 +768,12 @@ class M3uImportDialog(IptvListDialog):
         # EPG src.
         self._epg_links_button = builder.get_object("epg_links_box")
         self._add_epg_src_switch = builder.get_object("add_epg_src_switch")
+        # Duplicates.
+        self._duplicates_box = builder.get_object("duplicates_combobox")
+        self._duplicates_names_switch = builder.get_object("duplicates_names_switch")
+        # Groups preview.
+        self._groups_model = builder.get_object("import_groups_store")
+        builder.get_object("groups_scrolled_window").set_visible(s_type is SettingsType.ENIGMA_2)
 
         m3u_box = builder.get_object("import_m3u_box")
         if s_type is SettingsType.ENIGMA_2:
@@ -738,21 +792,43 @@ class M3uImportDialog(IptvListDialog):
 
     @run_task
     def get_m3u(self, path, s_type):
+        """ Parses the playlist in chunks. The groups are shown while the rest is still parsing. """
+        self._services = []
+        has_picons = False
+        iptv_type = BqServiceType.IPTV.name
         try:
             GLib.idle_add(self._spinner.start)
-            self._epg_src, self._services = parse_m3u(path, s_type)
-            for s in self._services:
-                if s.picon:
+            GLib.idle_add(self._apply_button.set_sensitive, False)
+            for self._epg_src, services in iter_m3u(path, s_type):
+                self._services.extend(services)
+                if not has_picons and any(s.picon for s in services):
+                    has_picons = True
                     GLib.idle_add(self._picon_box.set_sensitive, True)
-                    break
+                groups = Counter(s.package for s in services if s.service_type == iptv_type)
+                self.update_groups(groups, len(self._services))
+        except OSError as e:
+            log(f"M3U parse error: {e}")
         finally:
             self.update_info()
 
+    @run_idle
+    def update_groups(self, groups, count):
+        """ Appends rows for the new groups and updates the count of streams of the existing ones. """
+        for group, group_count in groups.items():
+            itr = self._groups.get(group)
+            if itr:
+                self._groups_model.set_value(itr, 1, self._groups_model.get_value(itr, 1) + group_count)
+            else:
+                self._groups[group] = self._groups_model.append((group or "", group_count))
+
+        self._info_label.set_text(f"{translate('Streams detected:')} {count}...")
+
     @run_idle
     def update_info(self):
         msg = f"{translate('Streams detected:')} {len(self._services) if self._services else 0}."
         self._info_label.set_text(msg)
         self._spinner.stop()
+        self._apply_button.set_sensitive(True)
 
         if self._epg_src:
             self._epg_links_button.set_visible(True)
@@ -773,7 +849,13 @@ class M3uImportDialog(IptvListDialog):
         if self._app.app_settings.enable_epg_name_cache:
             EpgCache.update_name_cache(self._app.app_settings.default_data_path, {s[3]: s[0] for s in services if s[0]})
 
+        existing = self._app.current_services
+        policy = MergePolicy(self._duplicates_box.get_active_id())
+        if policy is not MergePolicy.KEEP:
+            services = self.merge_services(services, existing, policy)
+
         if not self.is_all_data_default():
+            src_services = services
             services = []
             params = [int(el.get_text()) for el in self._digit_elems]
             s_id = params[0]
@@ -783,9 +865,9 @@ class M3uImportDialog(IptvListDialog):
             sid_auto = self._sid_auto_check_button.get_active()
             sid = 0 if sid_auto else int(self._list_sid_entry.get_text())
 
-            for i, s in enumerate(self._services, start=params[0]):
-                # Skipping markers.
-                if not s.data_id:
+            for i, s in enumerate(src_services, start=params[0]):
+                # Skipping markers and existing services.
+                if not s.data_id or s.fav_id in existing:
                     services.append(s)
                     continue
 
@@ -793,7 +875,8 @@ class M3uImportDialog(IptvListDialog):
                 picon_id = PICON_FORMAT.format(st_type, s_id, s_type, *params)
                 fav_id = get_fav_id(s.data_id, s.service, self._s_type, params, st_type, s_id, s_type)
                 if s.picon:
-                    picons[s.picon] = picon_id
+                    # Several services can have the same logo.
+                    picons.setdefault(s.picon, []).append(picon_id)
 
                 services.append(s._replace(picon=None, picon_id=picon_id, data_id=None, fav_id=fav_id))
 
@@ -812,6 +895,22 @@ class M3uImportDialog(IptvListDialog):
 
         self.import_services(services)
 
+    def merge_services(self, services, existing, policy):
+        """ Removes or replaces [with existing ones] duplicates of the imported services. """
+        iptv_type = BqServiceType.IPTV.name
+        merger = IptvMerger(self._s_type, self._duplicates_names_switch.get_active())
+        merger.add(s for s in existing.values() if s.service_type == iptv_type)
+        # Services of the target bouquet are not added again.
+        exclude = None
+        if self._current_bq_button.get_active():
+            exclude = self._app.current_bouquets.get(self._app.current_bouquet, ())
+        result = merger.merge(services, policy, exclude)
+
+        msg = f"{translate('Duplicates')}: {result.skipped + result.merged}"
+        log(f"M3U import: {msg} [skipped: {result.skipped}, existing used: {result.merged}].")
+        self._info_label.set_text(msg)
+        return result.services
+
     def import_services(self, services):
         if self._current_bq_button.get_active():
             self._app.append_imported_services(services)
@@ -879,9 +978,12 @@ class M3uImportDialog(IptvListDialog):
         self._url_count = len(picons)
         self._max_count = self._url_count
         self._cancellable.reset()
+        # One connection pool, max 4 connections per host, cached data keyed by URL.
+        path = f"{self._app.app_settings.profile_data_path}cache{os.sep}"
+        cache = HttpCache(path, "logos", timeout=(3, 5), host_limit=4)
 
-        with concurrent.futures.ThreadPoolExecutor(max_workers=10) as executor:
-            futures = {executor.submit(self.download_picon, p, picons.get(p, None)): p for p in filter(None, picons)}
+        with concurrent.futures.ThreadPoolExecutor(max_workers=HttpCache.POOL_SIZE) as executor:
+            futures = {executor.submit(self.download_picon, u, picons[u], cache): u for u in filter(None, picons)}
             done, not_done = concurrent.futures.wait(futures, timeout=0)
             while self._is_download and not_done:
                 done, not_done = concurrent.futures.wait(not_done, timeout=5)
@@ -890,35 +992,51 @@ class M3uImportDialog(IptvListDialog):
                 future.cancel()
             concurrent.futures.wait(not_done)
 
+            try:
+                cache.save()
+            except OSError as e:
+                log(f"HTTP cache saving error: {e}")
+            cache.close()
+
             self.update_progress(self._url_count)
             self.on_done()
 
-    def download_picon(self, url, pic_data):
-        err_msg = "Picon download error: {}  [{}]"
-        timeout = (3, 5)  # connect and read timeouts
-
-        req = requests.get(url, timeout=timeout)
-        if req.status_code != 200:
-            log(err_msg.format(url, req.reason))
+    def download_picon(self, url, picon_ids, cache):
+        try:
+            data = cache.get_data(url)
+        except (OSError, requests.exceptions.RequestException) as e:
+            log(f"Picon download error: {url}  [{e}]")
             self.update_progress(1)
         else:
-            self.on_picon_load_done(req.content, pic_data)
+            self.save_picon(data, picon_ids)
 
-    @run_idle
-    def on_picon_load_done(self, data, user_data):
+    def save_picon(self, data, picon_ids):
+        """ Decodes and saves [off the main loop] the picon for all services with the same logo. """
         try:
-            self._info_label.set_text(f"Processing: {user_data}")
             f = Gio.MemoryInputStream.new_from_data(data)
             pixbuf = GdkPixbuf.Pixbuf.new_from_stream_at_scale(f, 220, 132, False, self._cancellable)
-            path = f"{self._pic_path}{user_data}"
-            pixbuf.savev(path, "png", [], [])
-            self._picons[user_data] = get_picon_pixbuf(path)
+            done, png_data = pixbuf.save_to_bufferv("png", [], [])
+            for p_id in picon_ids:
+                path = f"{self._pic_path}{p_id}"
+                detach_picon(path)
+                with open(path, "wb") as pf:
+                    pf.write(png_data)
         except GLib.GError as e:
             self.update_progress(1)
             if e.code != Gio.IOErrorEnum.CANCELLED:
-                log(f"Loading picon [{user_data}] data error: {e}")
+                log(f"Loading picon [{picon_ids[0]}] data error: {e}")
+        except OSError as e:
+            self.update_progress(1)
+            log(f"Saving picon [{picon_ids[0]}] error: {e}")
         else:
-            self.update_progress()
+            self.on_picon_load_done(picon_ids)
+
+    @run_idle
+    def on_picon_load_done(self, picon_ids):
+        self._info_label.set_text(f"Processing: {picon_ids[0]}")
+        # The picons will be reloaded [at the list size] on the next drawing.
+        [self._picons.pop(p_id) for p_id in picon_ids]
+        self.update_progress()
 
     @run_idle
     def update_progress(self, error=0):
@@ -994,6 +1112,7 @@ class ExportM3uDialog(BaseDialog):
         self._grp_marker_button = builder.get_object("export_grp_markers_button")
         self._bq_count_label = builder.get_object("export_bq_count_label")
         self._services_count_label = builder.get_object("export_services_count_label")
+        self._gzip_switch = builder.get_object("export_gzip_switch")
         self.get_content_area().pack_start(builder.get_object("export_m3u_box"), False, False, 0)
 
         is_enigma = self._app.is_enigma
@@ -1082,8 +1201,8 @@ class ExportM3uDialog(BaseDialog):
                 return BouquetService(srv.service, s_type, fav_id, num)
             return BouquetService("N/A", BqServiceType.MARKER, fav_id, num)
 
-        # Preparing bouquets data.
-        bouquets = {b[:b.rindex(":")]: [get_service(i) for i in s] for b, s in self._bouquets.items()}
+        # Preparing bouquets data [lazily, the services are written in a single pass].
+        bouquets = {b[:b.rindex(":")]: map(get_service, s) for b, s in self._bouquets.items()}
 
         bq_services = []
         s_types = {BqServiceType.IPTV}
@@ -1099,8 +1218,14 @@ class ExportM3uDialog(BaseDialog):
         else:
             bq_services = filter(lambda s: s.type in s_types, chain.from_iterable(bouquets.values()))
 
+        logos_url = None
+        if self._url:
+            # Picons from the receiver [OpenWebif].
+            st = self._app.app_settings
+            logos_url = f"http{'s' if st.http_use_ssl else ''}://{st.host}:{st.http_port}/picon/"
+
         file_name = f"{'_'.join(list(bouquets)[:10])}__{date.today().strftime('%Y_%m_%d')}"
-        self._app.save_bouquet_to_m3u(bq_services, self._url, file_name)
+        self._app.save_bouquet_to_m3u(bq_services, self._url, file_name, self._gzip_switch.get_active(), logos_url)
 
 
 class YtListImportDialog:
@@ -1194,20 +1319,20 @@ class YtListImportDialog:
         self._download_task = True
 
         try:
-            with concurrent.futures.ThreadPoolExecutor(max_workers=4) as executor:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=self._settings.yt_workers) as executor:
                 done_links = {}
-                rows = list(filter(lambda r: r[2], self._model))
+                ids = [r[1] for r in self._model if r[2]]
                 if not self._yt:
                     self._yt = YouTube.get_instance(self._settings)
-
-                futures = {executor.submit(self._yt.get_yt_link, r[1], YouTube.VIDEO_LINK.format(r[1]),
-                                           True): r for r in rows}
+                # Each video is resolved once. Already received [and not expired] links are taken from the cache.
+                futures = {executor.submit(self._yt.get_yt_link, v, YouTube.VIDEO_LINK.format(v), True): v
+                           for v in dict.fromkeys(ids)}
                 size = len(futures)
                 counter = 0
 
                 for future in concurrent.futures.as_completed(futures):
                     if not self._download_task:
-                        executor.shutdown()
+                        [f.cancel() for f in futures]
                         return
 
                     done_links[futures[future]] = future.result()
@@ -1219,7 +1344,7 @@ class YtListImportDialog:
             self.show_info_message(str(e), Gtk.MessageType.ERROR)
         else:
             if self._download_task:
-                self.append_services([done_links[r] for r in rows])
+                self.append_services([done_links[v] for v in ids])
         finally:
             self._download_task = False
             self.update_active_elements(True)
@@ -28,7 +28,9 @@
 
 import os
 import re
+import sqlite3
 import sys
+import time
 from collections import Counter
 from contextlib import suppress
 from datetime import datetime
@@ -40,21 +42,24 @@ from urllib.request import url2pathname
 
 from gi.repository import GLib, Gio, GObject
 
-from app.commons import run_idle, log, run_task, run_with_delay, init_logger, DefaultDict
+from app.commons import run_idle, log, run_task, run_with_delay, init_logger
 from app.connections import (HttpAPI, download_data, DownloadType, upload_data)
 from app.eparser import get_blacklist, write_blacklist, write_bouquet
 from app.eparser import get_services, get_bouquets, write_bouquets, write_services, Bouquets, Bouquet, Service
-from app.eparser.ecommons import CAS, Flag, BouquetService, TrType
+from app.eparser.ecommons import CAS, Flag, BouquetService, TrType, parse_iptv_ref
 from app.eparser.enigma.bouquets import BqServiceType
 from app.eparser.enigma.streamrelay import StreamRelay
-from app.eparser.iptv import export_to_m3u, StreamType
+from app.eparser.iptv import export_to_m3u, StreamType, get_iptv_stream_data, normalize_url
 from app.eparser.neutrino.bouquets import BqType
 from app.settings import (SettingsType, Settings, SettingsException, SettingsReadException, IS_DARWIN, IS_LINUX,
                           PlayStreamsMode, PlaybackMode, USE_HEADER_BAR)
 from app.tools.media import Recorder
+from app.tools.picons import PiconsPack, PiconsStore
+from app.tools.streams import StreamChecker, StreamProber, StreamsHealth, StreamStatus
+from app.tools.subscriptions import Subscriptions, Subscription
 from app.ui.bootlogo import BootLogoManager
 from app.ui.control import ControlTool
-from app.ui.epg.epg import FavEpgCache, EpgSettingsPopover, EpgDialog, EpgTool
+from app.ui.epg.epg import EpgCache, FavEpgCache, EpgSettingsPopover, EpgDialog, EpgTool
 from app.ui.ftp import FtpClientBox
 from app.ui.logs import LogsClient
 from app.ui.playback import PlayerBox
@@ -69,7 +74,7 @@ from .iptv import (IptvDialog, SearchUnavailableDialog, IptvListConfigurationDia
                    M3uImportDialog, ExportM3uDialog)
 from .main_helper import *
 from .picons import PiconManager
-from .search import SearchProvider
+from .search import SearchProvider, FilterIndex, TrigramIndex, get_search_fields
 from .service_dialog import ServiceDetailsDialog, Action
 from .settings_dialog import SettingsDialog
 from .uicommons import (Gtk, Gdk, UI_RESOURCES_PATH, LOCKED_ICON, HIDE_ICON, IPTV_ICON, MOVE_KEYS, KeyboardKey, Column,
@@ -94,6 +99,8 @@ class Application(Gtk.Application):
 
     DEL_FACTOR = 100  # Batch size to delete in one pass.
     FAV_FACTOR = DEL_FACTOR * 5
+    STREAMS_CHECK_LIMIT = 200  # Max number of streams for one background recheck.
+    SUBSCRIPTIONS_CHECK_INTERVAL = 60  # In seconds.
 
     _TV_TYPES = {"TV", "TV (HD)", "TV (UHD)", "TV (H264)"}
 
@@ -262,8 +269,12 @@ class Application(Gtk.Application):
         self._alt_file = set()
         self._alt_counter = 1
         self._data_hash = 0
-        self._filter_cache = {}
+        self._services_filter_index = FilterIndex(Column.SRV_FAV_ID, (Column.SRV_SERVICE, Column.SRV_PACKAGE,
+                                                                       Column.SRV_TYPE, Column.SRV_SSID,
+                                                                       Column.SRV_FREQ),
+                                                  Column.SRV_TYPE, Column.SRV_POS, Column.SRV_CODED)
         self._iptv_filter_cache = {}
+        self._search_index = TrigramIndex()
         self._in_bouquets = set()
         # For bouquets with different names of services in bouquet and main list
         self._extra_bouquets = {}
@@ -274,7 +285,20 @@ class Application(Gtk.Application):
         self._select_enabled = True  # Multiple selection
         # Picons
         self._picons_buffer = []
-        self._picons = DefaultDict(self.get_picon)
+        self._picons = PiconsCache(self.get_picon, self.on_picons_loaded, key=self.get_picon_key)
+        self._picons_pack = None
+        self._picons_store = None
+        self._picons_monitor = None
+        # IPTV streams health
+        self._streams_health = StreamsHealth()
+        self._streams_check_id = None
+        self._is_streams_check = False
+        # IPTV subscriptions
+        self._subscriptions = Subscriptions()
+        self._subscriptions_check_id = None
+        self._is_subscriptions_refresh = False
+        # Batched loader of the current bouquet services.
+        self._fav_loader = None
         # Current satellite positions in the services list
         self._sat_positions = set()
         self._service_types = set()
@@ -459,11 +483,13 @@ class Application(Gtk.Application):
         self._services_model_filter.set_visible_func(self.services_filter_function)
         self._iptv_services_model_filter = builder.get_object("iptv_services_model_filter")
         self._iptv_services_model_filter.set_visible_func(self.iptv_services_filter_function)
+        self._iptv_services_model_sort = builder.get_object("iptv_services_model_sort")
         self._filter_services_button = builder.get_object("filter_services_button")
         self._filter_entry = builder.get_object("filter_entry")
         self._iptv_filter_entry = builder.get_object("iptv_filter_entry")
         self._filter_box = builder.get_object("filter_box")
         self._iptv_filter_box = builder.get_object("iptv_filter_box")
+        self._iptv_filter_unavailable_button = builder.get_object("iptv_filter_unavailable_button")
         self._filter_types_model = builder.get_object("filter_types_list_store")
         self._filter_sat_pos_model = builder.get_object("filter_sat_pos_list_store")
         self._filter_bouquet_model = builder.get_object("filter_bouquet_list_store")
@@ -477,7 +503,8 @@ class Application(Gtk.Application):
                                                   builder.get_object("services_search_entry"),
                                                   builder.get_object("srv_search_down_button"),
                                                   builder.get_object("srv_search_up_button"),
-                                                  (Column.SRV_SERVICE, Column.SRV_PACKAGE))
+                                                  (Column.SRV_SERVICE, Column.SRV_PACKAGE),
+                                                  self._search_index, Column.SRV_FAV_ID)
         self._srv_search_button = builder.get_object("srv_search_button")
         self._srv_search_button.bind_property("active", builder.get_object("srv_search_box"), "visible")
         self._srv_search_button.connect("toggled", services_search_provider.on_search_toggled)
@@ -485,7 +512,8 @@ class Application(Gtk.Application):
                                              builder.get_object("fav_search_entry"),
                                              builder.get_object("fav_search_down_button"),
                                              builder.get_object("fav_search_up_button"),
-                                             (Column.FAV_SERVICE, Column.FAV_TYPE, Column.FAV_POS))
+                                             (Column.FAV_SERVICE, Column.FAV_TYPE, Column.FAV_POS),
+                                             self._search_index, Column.FAV_ID)
         self._fav_search_button = builder.get_object("fav_search_button")
         self._fav_search_button.bind_property("active", builder.get_object("fav_search_box"), "visible")
         self._fav_search_button.connect("toggled", fav_search_provider.on_search_toggled)
@@ -493,7 +521,8 @@ class Application(Gtk.Application):
                                               builder.get_object("iptv_search_entry"),
                                               builder.get_object("iptv_search_down_button"),
                                               builder.get_object("iptv_search_up_button"),
-                                              (Column.IPTV_SERVICE,))
+                                              (Column.IPTV_SERVICE,),
+                                              self._search_index, Column.IPTV_FAV_ID)
         self._iptv_search_button = builder.get_object("iptv_search_button")
         self._iptv_search_button.bind_property("active", builder.get_object("iptv_search_box"), "visible")
         self._iptv_search_button.connect("toggled", iptv_search_provider.on_search_toggled)
@@ -589,6 +618,8 @@ class Application(Gtk.Application):
         self._iptv_picon_renderer = builder.get_object("iptv_picon_renderer")
         self._iptv_picon_column = builder.get_object("iptv_picon_column")
         self._iptv_picon_column.set_cell_data_func(self._iptv_picon_renderer, self.iptv_picon_data_func)
+        alt_picon_renderer = builder.get_object("alt_picon_cellrendererpixbuf")
+        builder.get_object("alt_service_column").set_cell_data_func(alt_picon_renderer, self.alt_picon_data_func)
         self._picon_column.set_visible(self._settings.display_picons)
         self._fav_picon_column.set_visible(self._settings.display_picons)
         self._iptv_picon_column.set_visible(self._settings.display_picons)
@@ -720,7 +751,8 @@ class Application(Gtk.Application):
         self._iptv_menu_button.set_menu_model(builder.get_object("iptv_menu"))
         iptv_elem = self._tool_elements.get("fav_iptv_popup_item")
         for h in (self.on_iptv, self.on_import_yt_list, self.on_import_m3u, self.on_epg_list_configuration,
-                  self.on_iptv_list_configuration, self.on_remove_all_unavailable):
+                  self.on_iptv_list_configuration, self.on_remove_all_unavailable, self.on_iptv_subscription,
+                  self.on_streams_probe):
             iptv_elem.bind_property("sensitive", self.set_action(h.__name__, h, False), "enabled")
 
         self.init_extensions(builder)
@@ -979,7 +1011,11 @@ class Application(Gtk.Application):
         if self._picons_size != self._settings.list_picon_size:
             self._picons_size = self._settings.list_picon_size
             self._picons.clear()
+            self.init_picons_placeholder()
+            self.init_picons_pack()
             self.refresh_models()
+        elif not update:
+            self.init_picons_placeholder()
 
         self._picon_renderer.set_fixed_size(self._picons_size, self._picons_size * 0.65)
         self._fav_picon_renderer.set_fixed_size(self._picons_size, self._picons_size * 0.65)
@@ -1045,7 +1081,11 @@ class Application(Gtk.Application):
         self._iptv_model.set_name(self.IPTV_MODEL)
         self._iptv_services_model_filter = self._iptv_model.filter_new()
         self._iptv_services_model_filter.set_visible_func(self.iptv_services_filter_function)
-        self._iptv_services_view.set_model(Gtk.TreeModelSort(model=self._iptv_services_model_filter))
+        sort_column_id, order = self._iptv_services_model_sort.get_sort_column_id()
+        self._iptv_services_model_sort = Gtk.TreeModelSort(model=self._iptv_services_model_filter)
+        if sort_column_id is not None:
+            self._iptv_services_model_sort.set_sort_column_id(sort_column_id, order)
+        self._iptv_services_view.set_model(self._iptv_services_model_sort)
 
     def init_iptv(self, app, profile):
         """ Initializes IPTV after profile change. """
@@ -1259,9 +1299,9 @@ class Application(Gtk.Application):
         renderer.set_property("pixbuf", self.get_picon_pixbuf(picon_id, name))
 
     def picon_data_func(self, column, renderer, model, itr, data):
-        picon = self._picons.get(model.get_value(itr, Column.SRV_PICON_ID))
+        picon = self._picons.get_async(model.get_value(itr, Column.SRV_PICON_ID))
         if not picon:
-            picon = self._picons.get(get_picon_file_name(model.get_value(itr, Column.SRV_SERVICE)))
+            picon = self._picons.get_async(get_picon_file_name(model.get_value(itr, Column.SRV_SERVICE)))
         renderer.set_property("pixbuf", picon)
 
     def fav_picon_data_func(self, column, renderer, model, itr, data):
@@ -1276,22 +1316,26 @@ class Application(Gtk.Application):
             if alt_servs:
                 alt_srv = self._services.get(alt_servs[0].data, None)
                 if alt_srv:
-                    picon = self._picons.get(alt_srv.picon_id, None) if srv else None
+                    picon = self._picons.get_async(alt_srv.picon_id) if srv else None
 
         renderer.set_property("pixbuf", picon)
 
+    def alt_picon_data_func(self, column, renderer, model, itr, data):
+        srv = self._services.get(model.get_value(itr, Column.ALT_FAV_ID), None)
+        renderer.set_property("pixbuf", self._picons.get_async(srv.picon_id) if srv else None)
+
     def get_picon_pixbuf(self, picon_id, srv_name):
         """ Returns a picon pixbuf by id or service name.
 
             Used for models with IPTV services.
         """
-        picon = self._picons.get(picon_id)
+        picon = self._picons.get_async(picon_id)
         # Trying to get a satellite service piсon.
         if not picon and picon_id:
-            picon = self._picons.get(picon_id.replace(picon_id[:picon_id.find("_")], "1", 1))
+            picon = self._picons.get_async(picon_id.replace(picon_id[:picon_id.find("_")], "1", 1))
         # Getting picon by service name.
         if not picon:
-            picon = self._picons.get(get_picon_file_name(srv_name))
+            picon = self._picons.get_async(get_picon_file_name(srv_name))
 
         return picon
 
@@ -1444,6 +1488,11 @@ class Application(Gtk.Application):
 
     def on_services_update(self, app, services):
         """ Updates services in the main model. """
+        for fav_id, service in services.items():
+            srv = self._services.get(fav_id)
+            if srv:
+                self._search_index.add(fav_id, *get_search_fields(srv._replace(service=service.service)))
+
         for r in self._fav_model:
             fav_id = r[Column.FAV_ID]
             if fav_id in services:
@@ -1542,6 +1591,7 @@ class Application(Gtk.Application):
                         services.remove(fav_id)
                         srv_ids_to_delete.add(fav_id)
             self._services.pop(fav_id, None)
+            self._search_index.remove(fav_id)
 
         for f_itr in filter(lambda r: r[Column.FAV_ID] in srv_ids_to_delete, self._fav_model):
             self._fav_model.remove(f_itr.iter)
@@ -1841,6 +1891,7 @@ class Application(Gtk.Application):
             fav_id = srv.fav_id
             names = (b[:b.rindex(":")] for b, ids in self._bouquets.items() if fav_id in ids)
             text = f"{translate('Name')}: {srv.service}\n{translate('Bouquets')}: {', '.join(names)}"
+            text += self.get_stream_health_hint(view.get_model()[path][Column.IPTV_URL])
             tooltip.set_text(text)
             view.set_tooltip_row(tooltip, path)
             return True
@@ -2139,7 +2190,7 @@ class Application(Gtk.Application):
             fav_id = ext_row[fav_column]
             ch = self._services[fav_id]
             model.insert(dst_index, (0, ch.coded, ch.service, ch.locked, ch.hide, ch.service_type, ch.pos,
-                                     ch.fav_id, self._picons.get(ch.picon_id, None), None, None))
+                                     ch.fav_id, None, None, None))
             fav_bouquet.insert(dst_index, ch.fav_id)
 
         self.emit("fav-added", self._bq_selected)
@@ -2430,6 +2481,10 @@ class Application(Gtk.Application):
                 callback()
             yield True
             self._data_hash = self.get_data_hash()
+            self.update_search_index()
+            self.init_picons_pack()
+            self.init_streams_health()
+            self.init_iptv_subscriptions()
             yield True
             if self._filter_box.get_visible():
                 self.on_filter_changed()
@@ -2551,7 +2606,7 @@ class Application(Gtk.Application):
             locked = LOCKED_ICON if data_id in self._blacklist else None
 
         return Service(None, None, icon, srv.name, locked, None, None, srv.type.name,
-                       self._picons.get(picon_id, None), picon_id, *agr, data_id, fav_id, None)
+                       None, picon_id, *agr, data_id, fav_id, None)
 
     @run_idle
     def open_last_bouquet(self, app, profile):
@@ -2597,18 +2652,29 @@ class Application(Gtk.Application):
         services = [s for s in services if s.service_type == BqServiceType.IPTV.name]
         size = len(services)
 
-        for index, s in enumerate(services, start=1):
-            ref, url = get_iptv_data(s.fav_id)
-            self._iptv_model.append((s.service, None, None, ref, url, s.fav_id, s.picon_id, None))
-            if index % self.DEL_FACTOR == 0:
-                self._iptv_count_label.set_text(str(index))
-                self._iptv_progress_bar.set_fraction(index / size)
-                yield True
+        def get_rows():
+            for s in services:
+                ref, url = get_iptv_data(s.fav_id)
+                yield s.service, None, None, ref, url, s.fav_id, s.picon_id, None, self.get_stream_health_text(url)
 
+        def update_progress(count):
+            self._iptv_count_label.set_text(str(count))
+            self._iptv_progress_bar.set_fraction(count / size if size else 1)
+
+        # The view model [sort -> filter -> list] is reattached after loading.
+        loader = ModelLoader(self._iptv_model, self._iptv_services_view, view_model=self._iptv_services_model_sort)
+        yield from loader.load(get_rows(), update_progress)
         self._iptv_count_label.set_text(str(len(self._iptv_model)))
         self._iptv_progress_bar.hide()
         yield True
 
+    @run_task
+    def update_search_index(self):
+        """ Builds the fuzzy search index of the current services. """
+        markers = self.NON_REF_TYPES
+        services = [s for s in list(self._services.values()) if s.service_type not in markers]
+        self._search_index.build((s.fav_id, *get_search_fields(s)) for s in services)
+
     def get_new_background(self, flags):
         if self._use_colors and flags:
             f_flags = list(filter(lambda x: x.startswith("f:"), flags.split(",")))
@@ -2635,6 +2701,8 @@ class Application(Gtk.Application):
 
         self._blacklist.clear()
         self._services.clear()
+        self._search_index.clear()
+        parse_iptv_ref.cache_clear()
         self._rows_buffer.clear()
         self._picons.clear()
         self._alt_file.clear()
@@ -2804,9 +2872,8 @@ class Application(Gtk.Application):
                 for i, s in enumerate(srv[-1] or [], start=1):
                     s = self._services.get(s.data, None)
                     if s:
-                        pic = self._picons.get(s.picon_id, None)
                         itr = model.get_string_from_iter(model.get_iter(path))
-                        self._alt_model.append((i, pic, s.service, s.service_type, s.pos, s.fav_id, fav_id, itr))
+                        self._alt_model.append((i, None, s.service, s.service_type, s.pos, s.fav_id, fav_id, itr))
                 self._alt_revealer.set_visible(True)
         else:
             self._alt_revealer.set_visible(False)
@@ -2858,37 +2925,48 @@ class Application(Gtk.Application):
             tree_iter = model.get_iter(path)
 
         key = bq_key if bq_key else "{}:{}".format(*model.get(tree_iter, Column.BQ_NAME, Column.BQ_TYPE))
-        services = self._bouquets.get(key, [])
+        # A copy of the list [it may be changed during loading].
+        services = list(self._bouquets.get(key, ()))
         ex_services = self._extra_bouquets.get(key, None)
 
+        # The loader is registered before the first yield, so the next call can cancel this one.
+        if self._fav_loader:
+            self._fav_loader.cancel()
+        self._fav_loader = loader = ModelLoader(self._fav_model, self._fav_view)
+
         if len(services) > self.FAV_FACTOR * 20:
             self._bouquets_view.set_sensitive(False)
             yield True
+            if loader.is_canceled:
+                return
 
         self._fav_view.set_model(None)
         self._fav_model.clear()
 
-        num = 0
-        for srv_id in services:
-            srv = self._services.get(srv_id, None)
-            ex_srv_name = None
-            if ex_services:
-                ex_srv_name = ex_services.get(srv_id)
-            if srv:
-                background = self._EXTRA_COLOR if self._use_colors and ex_srv_name else None
-                coded = LINK_ICON if srv_id in self._stream_relay else srv.coded
-
-                srv_type = srv.service_type
-                is_marker = srv_type in self.MARKER_TYPES
-                if not is_marker:
-                    num += 1
-
-                self._fav_model.append((0 if is_marker else num, coded, ex_srv_name if ex_srv_name else srv.service,
-                                        srv.locked, srv.hide, srv_type, srv.pos, srv.fav_id,
-                                        None, None, background))
+        def get_rows():
+            num = 0
+            for srv_id in services:
+                srv = self._services.get(srv_id, None)
+                ex_srv_name = None
+                if ex_services:
+                    ex_srv_name = ex_services.get(srv_id)
+                if srv:
+                    background = self._EXTRA_COLOR if self._use_colors and ex_srv_name else None
+                    coded = LINK_ICON if srv_id in self._stream_relay else srv.coded
+
+                    srv_type = srv.service_type
+                    is_marker = srv_type in self.MARKER_TYPES
+                    if not is_marker:
+                        num += 1
+
+                    yield (0 if is_marker else num, coded, ex_srv_name if ex_srv_name else srv.service,
+                           srv.locked, srv.hide, srv_type, srv.pos, srv.fav_id, None, None, background)
+
+        yield from loader.load(get_rows())
+        if loader.is_canceled:
+            return
 
-        yield True
-        self._fav_view.set_model(self._fav_model)
+        self._fav_loader = None
         self.on_model_changed(self._fav_model)
         self._bouquets_view.set_sensitive(True)
         self._bouquets_view.grab_focus()
@@ -2943,6 +3021,7 @@ class Application(Gtk.Application):
 
         self.init_appearance(True)
         self.init_profiles()
+        self.init_streams_check()
         yield True
         gen = self.init_http_api()
         yield from gen
@@ -3202,6 +3281,7 @@ class Application(Gtk.Application):
             self.update_fav_num_column(self._fav_model)
 
     def on_iptv_service_added(self, app, services):
+        list(map(lambda s: self._search_index.add(s.fav_id, *get_search_fields(s)), services))
         if len(self._iptv_model) or self._iptv_button.get_active():
             gen = self.append_iptv_data(services)
             GLib.idle_add(lambda: next(gen, False), priority=GLib.PRIORITY_LOW)
@@ -3215,6 +3295,10 @@ class Application(Gtk.Application):
 
     @run_idle
     def on_iptv_service_edited(self, app, services: dict):
+        for old, new in services.values():
+            self._search_index.remove(old.fav_id)
+            self._search_index.add(new.fav_id, *get_search_fields(new))
+
         for srvs in self._bouquets.values():
             for i, s in enumerate(srvs):
                 if s in services:
@@ -3273,7 +3357,9 @@ class Application(Gtk.Application):
             return
 
         fav_bqt = self._bouquets.get(self._bq_selected, None)
-        response = SearchUnavailableDialog(self._main_window, self._fav_model, fav_bqt, iptv_rows, self._s_type).show()
+        response = SearchUnavailableDialog(self._main_window, self._fav_model, fav_bqt, iptv_rows, self._s_type,
+                                           self._streams_health).show()
+        self.update_iptv_health()
         if response:
             gen = self.remove_favorites(response, self._fav_model)
             GLib.idle_add(lambda: next(gen, False), priority=GLib.PRIORITY_LOW)
@@ -3311,6 +3397,115 @@ class Application(Gtk.Application):
             self._services[new_fav_id] = new_service
             self.emit("iptv-service-edited", {fav_id: (old_srv, new_service)})
 
+    # ***************** Streams health ********************* #
+
+    def init_streams_health(self):
+        """ Loads the streams check history and starts the background rechecks for the current profile. """
+        try:
+            self._streams_health.open(f"{self._settings.profile_data_path}cache{os.sep}")
+        except (OSError, sqlite3.Error) as e:
+            log(f"Streams health initialization error: {e}")
+            return
+
+        self.init_streams_check()
+
+    def init_streams_check(self):
+        """ [Re]starts the background rechecks of the IPTV streams with the current interval. """
+        if self._streams_check_id:
+            GLib.source_remove(self._streams_check_id)
+            self._streams_check_id = None
+
+        interval = self._settings.streams_check_interval
+        if interval > 0:
+            self._streams_check_id = GLib.timeout_add_seconds(interval * 60, self.on_streams_check,
+                                                              priority=GLib.PRIORITY_LOW)
+
+    def on_streams_check(self):
+        """ Rechecks [in the background] a limited number of stale or flaky IPTV streams. """
+        if not self._is_streams_check:
+            urls = (get_iptv_data(s.fav_id)[1] for s in self._services.values()
+                    if s.service_type == BqServiceType.IPTV.name)
+            max_age = self._settings.streams_check_interval * 60
+            urls = self._streams_health.get_stale(filter(None, urls), self.STREAMS_CHECK_LIMIT, max_age)
+            if urls:
+                self._is_streams_check = True
+                self.check_streams(urls)
+        return True
+
+    def on_streams_probe(self, action, value=None):
+        """ Probes [without playback] the IPTV streams of the current bouquet.
+
+            Variants [resolutions, bitrates], codecs and the first byte latency are stored as the streams metadata.
+        """
+        urls = [get_iptv_data(r[Column.FAV_ID])[1] for r in self._fav_model
+                if r[Column.FAV_TYPE] == BqServiceType.IPTV.value]
+        urls = list(filter(None, urls))
+        if not urls:
+            self.show_error_message("This list does not contains IPTV streams!")
+            return
+
+        if self._is_streams_check:
+            self.show_error_message("Checking streams in progress!")
+            return
+
+        self._is_streams_check = True
+        self.check_streams(urls, StreamProber(workers=8))
+
+    @run_task
+    def check_streams(self, urls, checker=None):
+        checker = checker or StreamChecker(workers=8, ttl=0)
+        try:
+            self._streams_health.update(list(checker.check_all(urls)))
+            log(f"Streams health: {len(urls)} streams have been checked [{checker.__class__.__name__}].")
+        except (OSError, sqlite3.Error, ValueError) as e:
+            log(f"Streams health update error: {e}")
+        finally:
+            checker.close()
+            self._is_streams_check = False
+        self.update_iptv_health()
+
+    @run_idle
+    def update_iptv_health(self):
+        for r in self._iptv_model:
+            health = self.get_stream_health_text(r[Column.IPTV_URL])
+            if r[Column.IPTV_HEALTH] != health:
+                r[Column.IPTV_HEALTH] = health
+
+    def get_stream_health_text(self, url):
+        health = self._streams_health.get(url)
+        if not health:
+            return None
+
+        if self._streams_health.is_unavailable(url):
+            return translate("Unavailable")
+        if health.failures or self._streams_health.is_flaky(health):
+            return translate("Unstable")
+        return translate("Available")
+
+    def get_stream_health_hint(self, url):
+        health = self._streams_health.get(url)
+        if not health:
+            return ""
+
+        status = health.status.value if health.status is not StreamStatus.HTTP_ERROR else f"HTTP {health.code}"
+        last_ok = datetime.fromtimestamp(health.last_ok).strftime("%Y-%m-%d %H:%M") if health.last_ok else "-"
+        hint = (f"\n{translate('Status')}: {self.get_stream_health_text(url)} [{status}]\n"
+                f"{translate('Checks')}: {health.checks} ({translate('Errors')}: {health.errors})\n"
+                f"{translate('Last available')}: {last_ok}")
+
+        info = self._streams_health.get_info(url)
+        if info:
+            variants = ", ".join(f"{v.resolution or '-'} [{v.bandwidth / 10 ** 6:.1f} Mbit/s]" if v.bandwidth else
+                                 (v.resolution or "-") for v in info.variants)
+            latency = f"{info.latency * 1000:.0f} ms" if info.latency is not None else "-"
+            hint += f"\n{translate('Type')}: {(info.kind or '-').upper()}"
+            hint += f"\n{translate('Variants')}: {variants}" if variants else ""
+            hint += f"\n{translate('Codecs')}: {', '.join(info.codecs)}" if info.codecs else ""
+            hint += f"\n{translate('First byte')}: {latency}"
+            if info.segment_latency is not None:
+                hint += f" ({translate('segment')}: {info.segment_latency * 1000:.0f} ms)"
+        return hint
+
     # ****************** EPG  ********************** #
 
     def set_display_epg(self, action, value):
@@ -3339,6 +3534,110 @@ class Application(Gtk.Application):
 
         EpgDialog(self, self._current_bq_name).show()
 
+    # ***************** IPTV subscriptions ******************** #
+
+    def init_iptv_subscriptions(self):
+        """ Loads the subscriptions state and starts the refresh timer for the current profile. """
+        self._subscriptions.open(f"{self._settings.profile_data_path}cache{os.sep}")
+        if not self._subscriptions_check_id:
+            self._subscriptions_check_id = GLib.timeout_add_seconds(self.SUBSCRIPTIONS_CHECK_INTERVAL,
+                                                                    self.on_subscriptions_refresh,
+                                                                    priority=GLib.PRIORITY_LOW)
+
+    def get_iptv_subscriptions(self):
+        return [Subscription(**s) for s in self._settings.iptv_subscriptions]
+
+    def on_iptv_subscription(self, action, value=None):
+        """ Subscribes the current bouquet to the remote *.m3u playlist. An empty URL -> unsubscribe. """
+        if not self._bq_selected:
+            self.show_error_message("Error. No bouquet is selected!")
+            return
+
+        subs = {s.bouquet: s for s in self.get_iptv_subscriptions()}
+        sub = subs.pop(self._bq_selected, None)
+        response = show_dialog(DialogType.INPUT, self._main_window, sub.url if sub else "http://")
+        if response == Gtk.ResponseType.CANCEL:
+            return
+
+        url = response.strip()
+        if url and urlparse(url).scheme not in ("http", "https"):
+            self.show_error_message("Invalid URL!")
+            return
+
+        if sub and sub.url != url:
+            try:
+                self._subscriptions.remove(sub.url)
+            except OSError as e:
+                log(f"Subscription [{sub.url}] removing error: {e}")
+
+        if url:
+            subs[self._bq_selected] = sub._replace(url=url) if sub else Subscription(url, self._bq_selected)
+        self._settings.iptv_subscriptions = [dict(s._asdict()) for s in subs.values()]
+        self.on_subscriptions_refresh()
+
+    def on_subscriptions_refresh(self):
+        """ Refreshes [in the background] the subscriptions of the current bouquets if they are due. """
+        if not self._is_subscriptions_refresh and not self.is_data_loading():
+            now = time.time()
+            data = {}
+            for sub in self.get_iptv_subscriptions():
+                fav_ids = self._bouquets.get(sub.bouquet)
+                if fav_ids is not None and self._subscriptions.is_due(sub, now):
+                    data[sub] = tuple(fav_ids), [self._services[f] for f in fav_ids if f in self._services]
+
+            if data:
+                self._is_subscriptions_refresh = True
+                self.refresh_iptv_subscriptions(data)
+        return True
+
+    @run_task
+    def refresh_iptv_subscriptions(self, data):
+        try:
+            for sub, (fav_ids, services) in data.items():
+                try:
+                    path = self._subscriptions.fetch(sub)
+                    if path:
+                        self.apply_subscription_diff(sub, fav_ids, Subscriptions.diff(path, services, self._s_type))
+                except OSError as e:
+                    log(f"Subscription [{sub.url}] refresh error: {e}")
+        finally:
+            self._is_subscriptions_refresh = False
+
+    @run_idle
+    def apply_subscription_diff(self, sub, fav_ids, diff):
+        """ Applies only the changed entries of the playlist to the bouquet. """
+        bq = self._bouquets.get(sub.bouquet)
+        if bq is None or tuple(bq) != fav_ids:
+            log(f"Subscription [{sub.url}]: the bouquet has been changed. The refresh is skipped.")
+            try:
+                self._subscriptions.set_unchecked(sub.url)
+            except OSError as e:
+                log(f"Subscription [{sub.url}] state saving error: {e}")
+            return
+
+        if any((diff.added, diff.removed, diff.changed)):
+            for srv in diff.services:
+                self._services.setdefault(srv.fav_id, srv)
+            bq[:] = Subscriptions.apply(bq, diff)
+
+            if self._bq_selected == sub.bouquet:
+                gen = self.update_bouquet_services(self._fav_model, None, self._bq_selected)
+                GLib.idle_add(lambda: next(gen, False), priority=GLib.PRIORITY_LOW)
+
+            if diff.added:
+                self.emit("iptv-service-added", diff.added)
+            if diff.changed:
+                self.emit("iptv-service-edited", {old.fav_id: (old, new) for old, new in diff.changed})
+
+            msg = f"Added: {len(diff.added)}, removed: {len(diff.removed)}, changed: {len(diff.changed)}."
+            log(f"Subscription [{sub.url}] has been refreshed. {msg}")
+            self.show_info_message(f"{sub.bouquet.rpartition(':')[0]}: {msg}", Gtk.MessageType.INFO)
+
+        try:
+            self._subscriptions.set_applied(sub.url)
+        except OSError as e:
+            log(f"Subscription [{sub.url}] state saving error: {e}")
+
     # ***************** Import ******************** #
 
     def on_import_yt_list(self, action, value=None):
@@ -3361,11 +3660,13 @@ class Application(Gtk.Application):
         M3uImportDialog(self._main_window, self._s_type, response, self).show()
 
     def append_imported_services(self, services):
+        """ Appends the imported services to the current bouquet.
+
+            The bouquet list is reloaded in chunks [without blocking the GUI].
+        """
         bq_services = self._bouquets.get(self._bq_selected)
-        self._fav_model.clear()
-        for srv in services:
-            self._services[srv.fav_id] = srv
-            bq_services.append(srv.fav_id)
+        self._services.update((s.fav_id, s) for s in services)
+        bq_services.extend(s.fav_id for s in services)
 
         gen = self.update_bouquet_services(self._fav_model, None, self._bq_selected)
         GLib.idle_add(lambda: next(gen, False), priority=GLib.PRIORITY_LOW)
@@ -3510,19 +3811,45 @@ class Application(Gtk.Application):
         self.save_bouquet_to_m3u((BouquetService(r[Column.IPTV_SERVICE], BqServiceType.IPTV, r[Column.IPTV_FAV_ID], i)
                                   for i, r in enumerate(self._iptv_model)), name="IPTV")
 
-    def save_bouquet_to_m3u(self, bq_services, url=None, name=None):
+    def save_bouquet_to_m3u(self, bq_services, url=None, name=None, compress=False, logos_url=None):
         """ Saves bouquet services to *.m3u file. """
         response = show_dialog(DialogType.CHOOSER, self._main_window, settings=self._settings, accept_label="Save")
         if response in (Gtk.ResponseType.CANCEL, Gtk.ResponseType.DELETE_EVENT):
             return
 
+        bq = Bouquet(name or self._current_bq_name, None, list(bq_services), None, None)
+        self.export_bouquet_to_m3u(response, bq, url, compress, logos_url)
+
+    @run_task
+    def export_bouquet_to_m3u(self, path, bouquet, url=None, compress=False, logos_url=None):
+        """ Exports the bouquet in the background.
+
+            @param logos_url: base URL of the picons for the tvg-logo attribute.
+                              If None, the tvg-logo attribute is omitted.
+        """
         try:
-            bq = Bouquet(name or self._current_bq_name, None, bq_services, None, None)
-            export_to_m3u(response, bq, self._s_type, url)
+            epg_ids = None
+            if self._settings.enable_epg_name_cache:
+                EpgCache.NAME_CACHE.open(self._settings.default_data_path)
+                epg_ids = EpgCache.NAME_CACHE
+            count = export_to_m3u(path, bouquet, self._s_type, url, self.get_m3u_logos(logos_url), epg_ids, compress)
         except Exception as e:
             self.show_error_message(str(e))
         else:
-            show_dialog(DialogType.INFO, self._main_window, "Done!")
+            log(f"Exported {count} services to the *.m3u file [{bouquet.name}].")
+            self.show_info_message(f"{translate('Done!')} {translate('Services')}: {count}")
+
+    def get_m3u_logos(self, base_url=None):
+        """ Returns picon id -> logo URL mapping for the existing picons.
+
+            Local file URIs are not usable by the players, so the mapping is empty without a base URL.
+        """
+        picons_path = self._settings.profile_picons_path
+        if not base_url or not os.path.isdir(picons_path):
+            return {}
+
+        with os.scandir(picons_path) as it:
+            return {e.name: f"{base_url}{e.name}" for e in it if e.name.endswith(".png")}
 
     # ***************** Backup  ******************** #
 
@@ -3898,6 +4225,7 @@ class Application(Gtk.Application):
     def iptv_filter_set_default(self):
         """ Setting defaults for IPTV filter elements. """
         self._iptv_filter_entry.set_text("")
+        self._iptv_filter_unavailable_button.set_active(False)
         first = self._filter_bouquet_model[self._filter_bouquet_model.get_iter_first()][:]
         self._filter_bouquet_model.clear()
         self._filter_bouquet_model.append((first[0], True))
@@ -3937,21 +4265,22 @@ class Application(Gtk.Application):
 
         update_filter_sat_positions(self._filter_sat_pos_model, self._sat_positions)
 
-    @run_with_delay(1)
+    @run_with_delay(0.3)
     def on_filter_changed(self, item=None):
         self._services_progress_bar.show()
-        self.update_filter_cache()
-        self.update_filter_state()
+        self.update_filter_state(self.update_filter_cache())
 
     @run_with_delay(1)
     def on_iptv_filter_changed(self, item=None):
         self.update_iptv_filter_cache()
         self.update_iptv_filter_state()
 
-    def update_filter_state(self):
+    def update_filter_state(self, itrs=None):
         factor = self.DEL_FACTOR * 2
-        refresh = len(self._services_model_filter) > factor and self._filter_services_button.get_active()
-        gen = self.refilter(self._services_view, self._services_model, factor, refresh)
+        size = len(self._services_model_filter) if itrs is None else len(itrs)
+        refresh = size > factor and self._filter_services_button.get_active()
+        index = self._services_filter_index if self._services_filter_index.is_valid(self._services_model) else None
+        gen = self.refilter(self._services_view, self._services_model, factor, refresh, itrs, index)
         GLib.idle_add(lambda: next(gen, False))
 
     def update_iptv_filter_state(self):
@@ -3960,39 +4289,52 @@ class Application(Gtk.Application):
         gen = self.refilter(self._iptv_services_view, self._iptv_model, factor, refresh)
         GLib.idle_add(lambda: next(gen, False))
 
-    def refilter(self, view, model, factor=100, refresh=False):
+    def refilter(self, view, model, factor=100, refresh=False, itrs=None, index=None):
+        """ Re-filters the model rows.
+
+            @param itrs: iters of the rows to refilter. If None -> all rows.
+            @param index: filter index, which shouldn't track the emitted changes.
+        """
         main_model = view.get_model()
         view.set_model(None) if refresh else None
+        rows = [(r.path, r.iter) for r in model] if itrs is None else [(model.get_path(i), i) for i in itrs]
 
-        for i, r in enumerate(model.emit("row-changed", r.path, r.iter) for r in model):
-            if i % factor == 0:
-                yield True
+        for i in range(0, len(rows), factor):
+            if index:
+                with index.suspended():
+                    list(map(lambda r: model.emit("row-changed", *r), rows[i:i + factor]))
+            else:
+                list(map(lambda r: model.emit("row-changed", *r), rows[i:i + factor]))
+            yield True
 
         view.set_model(main_model)
         GLib.idle_add(self._services_progress_bar.hide)
 
     def update_filter_cache(self):
-        self._filter_cache.clear()
+        """ Updates the filter index state.
+
+            Returns iters of the rows whose visibility has changed or None to refilter all rows.
+        """
+        index = self._services_filter_index
+        is_valid = index.is_valid(self._services_model)
+
         if not self._filter_box.is_visible():
+            if is_valid:
+                return index.reset()
+            index.clear()
             return
 
-        txt = self._filter_entry.get_text().upper()
-        for r in self._services_model:
-            fav_id = r[Column.SRV_FAV_ID]
-            free = True
-            if self._filter_free_button.get_active():
-                free = not r[Column.SRV_CODED]
-            elif self._filter_coded_button.get_active():
-                free = r[Column.SRV_CODED]
-
-            self._filter_cache[fav_id] = all((free, fav_id not in self._in_bouquets,
-                                              r[Column.SRV_TYPE] in self._service_types,
-                                              r[Column.SRV_POS] in self._sat_positions,
-                                              txt in "".join((r[Column.SRV_SERVICE],
-                                                              r[Column.SRV_PACKAGE],
-                                                              r[Column.SRV_TYPE],
-                                                              r[Column.SRV_SSID],
-                                                              r[Column.SRV_FREQ])).upper()))
+        if not is_valid:
+            index.build(self._services_model)
+
+        coded = None
+        if self._filter_free_button.get_active():
+            coded = False
+        elif self._filter_coded_button.get_active():
+            coded = True
+
+        return index.filter(self._filter_entry.get_text(), self._service_types, self._sat_positions,
+                            coded, self._in_bouquets, self._search_index)
 
     def update_iptv_filter_cache(self):
         self._iptv_filter_cache.clear()
@@ -4006,13 +4348,22 @@ class Application(Gtk.Application):
 
         selected_bqs = {r[0] for r in self._filter_bouquet_model if r[1]}
         txt = self._iptv_filter_entry.get_text().upper()
-        for r in self._iptv_model:
-            fav_id = r[Column.IPTV_FAV_ID]
-            self._iptv_filter_cache[fav_id] = all((txt in r[Column.IPTV_SERVICE].upper(),
-                                                   ids.get(fav_id, "") in selected_bqs))
+        rows = [(r[Column.IPTV_FAV_ID], r[Column.IPTV_SERVICE].upper()) for r in self._iptv_model]
+        found = {f for f, n in rows if txt in n}
+        if txt and not found:
+            found = {k for k, score in self._search_index.query(txt)}
+
+        unavailable = None
+        if self._iptv_filter_unavailable_button.get_active():
+            unavailable = {r[Column.IPTV_FAV_ID] for r in self._iptv_model
+                           if self._streams_health.is_unavailable(r[Column.IPTV_URL])}
+
+        for fav_id, name in rows:
+            self._iptv_filter_cache[fav_id] = all((fav_id in found, ids.get(fav_id, "") in selected_bqs,
+                                                   unavailable is None or fav_id in unavailable))
 
     def services_filter_function(self, model, itr, data):
-        return self._filter_cache.get(model.get_value(itr, Column.SRV_FAV_ID), True)
+        return self._services_filter_index.is_visible(model.get_value(itr, Column.SRV_FAV_ID))
 
     def iptv_services_filter_function(self, model, itr, data):
         return self._iptv_filter_cache.get(model.get_value(itr, Column.IPTV_FAV_ID), True)
@@ -4202,18 +4553,27 @@ class Application(Gtk.Application):
                 r[Column.FAV_BACKGROUND] = self._NEW_COLOR
 
     def on_remove_duplicates(self, item):
-        exist = set()
+        """ Removes duplicates from the current bouquet. IPTV services are compared by the normalized URLs. """
+        exist = {}
         to_remove = []
+        matches = []
+        iptv_type = BqServiceType.IPTV.value
         for r in self._fav_model:
-            fav_id = r[Column.FAV_ID]
-            if fav_id in exist:
+            key = r[Column.FAV_ID]
+            if r[Column.FAV_TYPE] == iptv_type:
+                url = get_iptv_stream_data(key, self._is_enigma)[0]
+                key = normalize_url(url) if url else key
+
+            if key in exist:
                 to_remove.append(r.iter)
+                matches.append((r[Column.FAV_SERVICE], exist[key]))
             else:
-                exist.add(fav_id)
+                exist[key] = r[Column.FAV_SERVICE]
 
         count = len(to_remove)
         if count:
-            if show_dialog(DialogType.QUESTION, self._main_window) != Gtk.ResponseType.OK:
+            msg = self.get_duplicates_message(matches)
+            if show_dialog(DialogType.QUESTION, self._main_window, msg) != Gtk.ResponseType.OK:
                 return
             gen = self.remove_favorites(to_remove, self._fav_model)
             GLib.idle_add(lambda: next(gen, False))
@@ -4221,6 +4581,15 @@ class Application(Gtk.Application):
         else:
             self.show_info_message(f"{translate('Done!')} {translate('Found')}: {count}")
 
+    @staticmethod
+    def get_duplicates_message(matches, limit=15):
+        """ Returns the confirmation text with the list of the duplicates [duplicate -> kept service]. """
+        lines = [f"{escape(d or '')} → {escape(s or '')}" for d, s in matches[:limit]]
+        if len(matches) > limit:
+            lines.append(f"... (+{len(matches) - limit})")
+        lines = "\n".join(lines)
+        return f"{translate('Found')}: {len(matches)}\n\n<small>{lines}</small>\n\n{translate('Are you sure?')}"
+
     def on_services_mark_not_in_bouquets(self, item):
         if self.is_data_loading():
             self.show_error_message("Data loading in progress!")
@@ -4333,14 +4702,76 @@ class Application(Gtk.Application):
         self._iptv_services_view.set_model(None)
         self._iptv_services_view.set_model(model)
 
-    @run_idle
     def update_picons(self):
+        """ Clears the picons cache. Should be called in the main thread. """
         self._picons.clear()
         self._fav_model.foreach(lambda m, p, i: m.set_value(i, Column.FAV_PICON, None))
 
     def get_picon(self, p_id):
+        pack = self._picons_pack
+        if pack and p_id in pack:
+            thumbnail = pack.get(p_id)
+            return get_pixbuf_from_thumbnail(*thumbnail) if thumbnail else None
         return get_picon_pixbuf(f"{self._settings.profile_picons_path}{p_id}", self._picons_size)
 
+    def get_picon_key(self, p_id):
+        """ Returns the content hash of the picon to decode identical picons only once. """
+        store = self._picons_store
+        return store.get_hash(p_id) if store else None
+
+    def init_picons_pack(self):
+        """ Initializes the pack of picons thumbnails for the current profile and list picon size. """
+        if self._picons_monitor:
+            self._picons_monitor.cancel()
+            self._picons_monitor = None
+
+        self._picons_pack = None
+        self._picons_store = None
+        picons_path = self._settings.profile_picons_path
+        if os.path.isdir(picons_path):
+            path = Gio.File.new_for_path(picons_path)
+            self._picons_monitor = path.monitor_directory(Gio.FileMonitorFlags.NONE, None)
+            self._picons_monitor.connect("changed", self.on_picons_folder_changed)
+
+        cache_path = f"{self._settings.profile_data_path}cache{os.sep}"
+        self.update_picons_pack(PiconsPack(cache_path, self._picons_size), PiconsStore(cache_path), picons_path)
+
+    @run_task
+    def update_picons_pack(self, pack, store, picons_path):
+        try:
+            store.load()
+            store.update(picons_path)
+            pack.load()
+            changed = pack.update(picons_path, get_picon_thumbnail, store.get_hash)
+        except OSError as e:
+            log(f"Picons pack update error: {e}")
+            pack.close()
+        else:
+            GLib.idle_add(self.on_picons_pack_updated, pack, store, changed)
+
+    def on_picons_pack_updated(self, pack, store, changed):
+        if pack.size != self._picons_size:
+            return
+
+        self._picons_pack = pack
+        self._picons_store = store
+        list(map(self._picons.pop, changed))
+        self.on_picons_loaded()
+
+    @run_with_delay(3)
+    def on_picons_folder_changed(self, monitor, file, other_file, event_type):
+        pack, store = self._picons_pack, self._picons_store
+        if pack and store and monitor is self._picons_monitor:
+            self.update_picons_pack(pack, store, self._settings.profile_picons_path)
+
+    def init_picons_placeholder(self):
+        self._picons.placeholder = get_placeholder_pixbuf(self._picons_size, int(self._picons_size * 0.65))
+
+    def on_picons_loaded(self):
+        """ Redraws the views after loading new picons. """
+        list(map(lambda v: v.queue_draw(), (self._services_view, self._fav_view, self._iptv_services_view,
+                                            self._alt_view)))
+
     def get_tooltip_picon(self, srv):
         size, path, picon_id = self._settings.tooltip_logo_size, self._settings.profile_picons_path, srv.picon_id
         pix = get_picon_pixbuf(f"{path}{picon_id}", size=size)
@@ -4363,10 +4794,23 @@ class Application(Gtk.Application):
         remove_picon(self.get_target_view(view), self._services_view, self._fav_view, self._picons, self._settings)
 
     def on_remove_unused_picons(self, item):
-        if show_dialog(DialogType.QUESTION, self._main_window) == Gtk.ResponseType.CANCEL:
+        usage = get_picons_usage(self._settings.profile_picons_path, self._services.values())
+        if not usage.unused:
+            self.show_info_message(f"{translate('Unused')}: 0", Gtk.MessageType.INFO)
+            return
+
+        size = usage.unused_size / 1024 / 1024
+        msg = (f"{translate('Used')}: {len(usage.used)}, {translate('Unused')}: {len(usage.unused)} [{size:.2f} MB], "
+               f"{translate('Missing')}: {len(usage.missing)}\n\n{translate('Are you sure?')}")
+        if show_dialog(DialogType.QUESTION, self._main_window, msg) == Gtk.ResponseType.CANCEL:
             return
 
-        remove_all_unused_picons(self._settings, self._services.values())
+        msg = "Move unused picons to the backup folder? [No -> remove]"
+        resp = show_dialog(DialogType.QUESTION, self._main_window, msg, action_type=Gtk.ButtonsType.YES_NO)
+        if resp not in (Gtk.ResponseType.YES, Gtk.ResponseType.NO):
+            return
+
+        remove_all_unused_picons(self._settings, self._services.values(), usage, resp == Gtk.ResponseType.YES)
 
     def get_target_view(self, view):
         return ViewTarget.SERVICES if Gtk.Buildable.get_name(view) == "services_tree_view" else ViewTarget.FAV
@@ -4454,7 +4898,7 @@ class Application(Gtk.Application):
             self._alt_file.add(key)
             data = {Column.FAV_CODED: srv.coded, Column.FAV_SERVICE: srv.service, Column.FAV_LOCKED: srv.locked,
                     Column.FAV_HIDE: srv.hide, Column.FAV_TYPE: s_type, Column.FAV_POS: None,
-                    Column.FAV_ID: alt_id, Column.FAV_PICON: self._picons.get(srv.picon_id, None)}
+                    Column.FAV_ID: alt_id, Column.FAV_PICON: None}
             model.set(model.get_iter(paths), data)
             self._fav_view.row_activated(paths[0], self._fav_view.get_column(Column.FAV_NUM))
 
@@ -4480,7 +4924,7 @@ class Application(Gtk.Application):
                 itr = self._fav_model.get_iter_from_string(itr)
                 data = {Column.FAV_CODED: srv.coded, Column.FAV_SERVICE: srv.service, Column.FAV_LOCKED: srv.locked,
                         Column.FAV_HIDE: srv.hide, Column.FAV_TYPE: srv.service_type, Column.FAV_POS: srv.pos,
-                        Column.FAV_ID: srv.fav_id, Column.FAV_PICON: self._picons.get(srv.picon_id, None)}
+                        Column.FAV_ID: srv.fav_id, Column.FAV_PICON: None}
                 self._fav_model.set(itr, data)
                 self._alt_revealer.set_visible(False)
         else:
@@ -4543,7 +4987,7 @@ class Application(Gtk.Application):
         srv = self._services.get(self._alt_model.get_value(a_iter, Column.ALT_FAV_ID), None)
         if srv:
             fav_iter = self._fav_model.get_iter_from_string(self._alt_model.get_value(a_iter, Column.ALT_ITER))
-            self._fav_model.set_value(fav_iter, Column.FAV_PICON, self._picons.get(srv.picon_id, None))
+            self._fav_model.set_value(fav_iter, Column.FAV_PICON, None)  # Redrawing the row.
 
         return True
 
@@ -4583,8 +5027,7 @@ class Application(Gtk.Application):
         alt_id, a_itr = a_row[Column.ALT_ID], a_row[Column.ALT_ITER]
 
         for i, srv in enumerate(srvs, start=len(self._alt_model) + 1):
-            pic = self._picons.get(srv.picon_id, None)
-            self._alt_model.append((i, pic, srv.service, srv.service_type, srv.pos, srv.fav_id, alt_id, a_itr))
+            self._alt_model.append((i, None, srv.service, srv.service_type, srv.pos, srv.fav_id, alt_id, a_itr))
 
         return True
 
@@ -4706,6 +5149,10 @@ class Application(Gtk.Application):
     def current_services(self):
         return self._services
 
+    @property
+    def search_index(self):
+        return self._search_index
+
     @property
     def current_bouquet(self):
         return self._bq_selected
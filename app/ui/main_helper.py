@@ -34,23 +34,29 @@ __all__ = ("insert_marker", "move_items", "rename", "ViewTarget", "set_flags", "
            "get_model_data", "remove_all_unused_picons", "get_picon_pixbuf", "get_base_itrs", "get_iptv_url",
            "get_iptv_data", "update_entry_data", "append_text_to_tview", "on_popup_menu", "get_picon_file_name",
            "update_toggle_model", "update_popup_filter_model", "update_filter_sat_positions", "get_pos_num",
-           "show_info_bar_message", "gen_bouquet_name")
+           "show_info_bar_message", "gen_bouquet_name", "PiconsCache", "get_placeholder_pixbuf",
+           "get_picon_thumbnail", "get_pixbuf_from_thumbnail", "get_picons_usage", "PiconsUsage",
+           "PiconsLibrary", "ModelLoader")
 
 import os
 import re
 import shutil
 import unicodedata
+from collections import Counter, OrderedDict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
 from functools import lru_cache
-from itertools import groupby
-from pathlib import Path
-from urllib.parse import unquote
+from itertools import groupby, islice
+from threading import RLock
+from time import perf_counter
 
 from gi.repository import GdkPixbuf, GLib, Gio
 
+from app.commons import log
 from app.eparser import Service
-from app.eparser.ecommons import Flag, BouquetService, Bouquet, BqType
+from app.eparser.ecommons import Flag, BouquetService, Bouquet, BqType, parse_iptv_ref
 from app.eparser.enigma.bouquets import BqServiceType
 from app.settings import SettingsType, SEP, IS_WIN, IS_DARWIN, IS_LINUX
+from app.tools.picons import detach_picon
 from .dialogs import show_dialog, DialogType, translate
 from .uicommons import ViewTarget, BqGenType, Gtk, Gdk, HIDE_ICON, LOCKED_ICON, KeyboardKey, Column
 
@@ -462,6 +468,7 @@ def assign_picons(target, srv_view, fav_view, transient, picons, settings, servi
             picons_path = dst_path or settings.profile_picons_path
             os.makedirs(os.path.dirname(picons_path), exist_ok=True)
             picon_file = picons_path + picon_id
+            detach_picon(picon_file, src_path)
             try:
                 shutil.copy(src_path, picon_file)
             except shutil.SameFileError:
@@ -528,12 +535,252 @@ def remove_picon(target, srv_view, fav_view, picons, settings):
     remove_picons(settings, picon_ids, picons)
 
 
-def remove_all_unused_picons(settings, services):
-    """ Removes picons from profile picons folder if there are no services for these picons. """
-    ids = {s.picon_id for s in services}
-    for p in Path(settings.profile_picons_path).glob("*.png"):
-        if p.name not in ids and p.is_file():
-            p.unlink()
+PiconsUsage = namedtuple("PiconsUsage", ["used", "unused", "missing", "used_size", "unused_size"])
+PiconsUsage.__doc__ = """ Picons usage report.
+
+    used, unused -> dicts of picon file name: size in bytes.
+    missing -> set of picon ids [or picon names by service name if the id is shared] of services without any picon.
+"""
+
+
+def get_picon_names(srv):
+    """ Returns a tuple of all picon names that can be used for the service.
+
+        The same resolution rules as for displaying are used:
+        picon id, picon id with the alternate [satellite] namespace and picon name by service name.
+    """
+    p_id = srv.picon_id
+    names = [get_picon_file_name(srv.service)] if srv.service else []
+    if p_id:
+        names.insert(0, p_id)
+        alt_id = p_id.replace(p_id[:p_id.find("_")], "1", 1)
+        if alt_id != p_id:
+            names.insert(1, alt_id)
+    return tuple(names)
+
+
+def get_referenced_picons(services):
+    """ Returns a dict of picon id -> set of all picon names that can be used for the services with this id.
+
+        Several services [e.g. IPTV] can share the same picon id, so the names of all of them are collected.
+    """
+    refs = {}
+    for s in services:
+        names = get_picon_names(s)
+        if names:
+            refs.setdefault(s.picon_id or names[0], set()).update(names)
+
+    return refs
+
+
+def get_missing_picon_name(srv, names, shared):
+    """ Returns the picon id of the service or the picon name by service name if the id is shared [Counter]. """
+    p_id = srv.picon_id
+    return p_id if p_id and (shared[p_id] == 1 or not srv.service) else names[-1]
+
+
+def get_picons_usage(picons_path, services):
+    """ Returns picons usage [PiconsUsage] for the given services with a single pass over the picons folder. """
+    services = list(services)
+    refs = get_referenced_picons(services)
+    referenced = {n for names in refs.values() for n in names}
+    used, unused = {}, {}
+
+    if os.path.isdir(picons_path):
+        with os.scandir(picons_path) as it:
+            for e in it:
+                if e.name.endswith(".png") and e.is_file():
+                    try:
+                        size = e.stat().st_size
+                    except OSError:
+                        size = 0
+                    (used if e.name in referenced else unused)[e.name] = size
+
+    shared = Counter(s.picon_id for s in services if s.picon_id)
+    missing = set()
+    for s in services:
+        names = get_picon_names(s)
+        if names and not any(n in used for n in names):
+            missing.add(get_missing_picon_name(s, names, shared))
+
+    return PiconsUsage(used, unused, missing, sum(used.values()), sum(unused.values()))
+
+
+class PiconsLibrary:
+    """ Index of a picons library folder [with sub-folders] for bulk matching of picons.
+
+        Picons are indexed once by reference [picon id], by reference without the service type
+        [SD/HD variants] and by the normalized name.
+        The services are resolved with the same rules as for displaying,
+        then by the service type free reference and by the service name.
+        The modification times of the scanned folders are kept to detect library changes.
+    """
+
+    def __init__(self, path):
+        self._path = path
+        self._refs = {}
+        self._type_free_refs = {}
+        self._names = {}
+        self._folders = {}
+
+    def __len__(self):
+        return len(self._refs) + len(self._names)
+
+    @property
+    def path(self):
+        return self._path
+
+    def build(self):
+        """ Indexes the library folder. Returns the number of picons. """
+        self._refs.clear()
+        self._type_free_refs.clear()
+        self._names.clear()
+        self._folders.clear()
+        count = 0
+
+        folders = [self._path]
+        while folders:
+            folder = folders.pop()
+            try:
+                self._folders[folder] = os.stat(folder).st_mtime_ns
+                with os.scandir(folder) as it:
+                    for e in it:
+                        if e.is_dir():
+                            folders.append(e.path)
+                        elif e.name.lower().endswith(".png"):
+                            self.add(e.name, e.path)
+                            count += 1
+            except OSError as e:
+                log(f"{self.__class__.__name__} [build] error: {e}")
+
+        return count
+
+    def is_modified(self):
+        """ Checks if any of the scanned folders has been changed [or removed] since the last build. """
+        for folder, mtime in self._folders.items():
+            try:
+                if os.stat(folder).st_mtime_ns != mtime:
+                    return True
+            except OSError:
+                return True
+        return not self._folders
+
+    def add(self, name, path):
+        name = f"{name[:-4]}.png"  # Normalizing the extension case.
+        key = name.upper()
+        if key.count("_") > 8:
+            self._refs.setdefault(key, path)
+            self._type_free_refs.setdefault(self.get_type_free_key(key), path)
+        else:
+            self._names.setdefault(get_picon_file_name(name[:-4]), path)
+
+    def find(self, srv):
+        """ Returns the library path of the picon for the service or None. """
+        match = self.match(srv)
+        return match[1] if match else None
+
+    def match(self, srv):
+        """ Returns a tuple of the picon file name and the library path of the picon for the service or None.
+
+            Picons matched by reference are named by the picon id, matched by name -> by the service name.
+        """
+        p_id = srv.picon_id
+        if p_id:
+            for name in get_picon_names(srv):
+                path = self._refs.get(name.upper())
+                if path:
+                    return p_id, path
+
+            path = self._type_free_refs.get(self.get_type_free_key(p_id.upper()))
+            if path:
+                return p_id, path
+
+        if srv.service:
+            name = get_picon_file_name(srv.service)
+            path = self._names.get(name)
+            if path:
+                return name, path
+
+    def resolve(self, services, picons_path=None):
+        """ Resolves picons for the services in bulk.
+
+            Services that already have a picon in the picons path [if set] are skipped.
+            Returns a dict of picon file name -> library path and a set of picon ids
+            [or picon names by service name if the id is shared] still missing.
+        """
+        services = list(services)
+        to_skip = set(get_picons_usage(picons_path, services).used) if picons_path else set()
+        shared = Counter(s.picon_id for s in services if s.picon_id)
+
+        matches, missing = {}, set()
+        for srv in services:
+            names = get_picon_names(srv)
+            if not names or any(n in to_skip for n in names):
+                continue
+
+            match = self.match(srv)
+            if match:
+                matches.setdefault(*match)
+            else:
+                missing.add(get_missing_picon_name(srv, names, shared))
+
+        return matches, missing
+
+    @staticmethod
+    def apply(matches, picons_path, use_links=False):
+        """ Copies [or links] the matched picons to the picons path. Returns the number of added picons. """
+        os.makedirs(os.path.dirname(picons_path), exist_ok=True)
+        count = 0
+        for name, src in matches.items():
+            dst = f"{picons_path}{name}"
+            try:
+                detach_picon(dst, src)
+                if use_links:
+                    if os.path.lexists(dst):
+                        os.remove(dst)
+                    try:
+                        os.link(src, dst)
+                    except OSError:
+                        os.symlink(os.path.abspath(src), dst)
+                else:
+                    shutil.copyfile(src, dst)
+            except OSError as e:
+                log(f"Picon [{name}] copying error: {e}")
+            else:
+                count += 1
+
+        return count
+
+    @staticmethod
+    def get_type_free_key(key):
+        """ Returns the reference key without the service type [3-rd value]. """
+        data = key.split("_")
+        return "_".join(data[:2] + data[3:]) if len(data) > 3 else key
+
+
+def remove_all_unused_picons(settings, services, usage=None, backup=False):
+    """ Removes [or moves to the backup folder] picons from profile picons folder
+        if there are no services for these picons.
+
+        Returns the usage [PiconsUsage] before removing.
+    """
+    picons_path = settings.profile_picons_path
+    usage = usage or get_picons_usage(picons_path, services)
+    backup_path = f"{settings.profile_backup_path}picons{SEP}"
+    if backup and usage.unused:
+        os.makedirs(os.path.dirname(backup_path), exist_ok=True)
+
+    for name in usage.unused:
+        try:
+            if backup:
+                shutil.move(f"{picons_path}{name}", f"{backup_path}{name}")
+            else:
+                os.remove(f"{picons_path}{name}")
+        except OSError as e:
+            log(f"Removing unused picon [{name}] error: {e}")
+
+    log(f"Unused picons {'moved to backup' if backup else 'removed'}: {len(usage.unused)} [{usage.unused_size} bytes].")
+    return usage
 
 
 def remove_picons(settings, picon_ids, picons):
@@ -566,6 +813,242 @@ def get_picon_pixbuf(path, size=32):
         pass  # NOP
 
 
+class ModelLoader:
+    """ Batched [non-blocking] loader of rows to the ListStore.
+
+        The view is detached while loading. Rows are inserted in chunks until the time budget
+        of the current main loop iteration is spent, then control is returned to the main loop.
+        Each row is inserted with all values at once [ListStore.append -> insert_with_valuesv].
+    """
+    FRAME_BUDGET = 0.012  # In seconds.
+    CHUNK_SIZE = 64
+
+    def __init__(self, model, view=None, budget=FRAME_BUDGET, view_model=None):
+        self._model = model
+        self._view = view
+        self._view_model = view_model or model
+        self._budget = budget
+        self._is_canceled = False
+
+    @property
+    def is_canceled(self):
+        return self._is_canceled
+
+    def cancel(self):
+        """ Stops loading and reattaches the view model. """
+        self._is_canceled = True
+        if self._view:
+            self._view.set_model(self._view_model)
+
+    def load(self, rows, clb=None):
+        """ Generator for loading rows [use with GLib.idle_add].
+
+            The callback [if set] is called with the number of loaded rows after each iteration.
+        """
+        if self._view:
+            self._view.set_model(None)
+
+        rows = iter(rows)
+        append = self._model.append
+        count, done = 0, False
+
+        while not done:
+            start = perf_counter()
+            while perf_counter() - start < self._budget:
+                chunk = list(islice(rows, self.CHUNK_SIZE))
+                for r in chunk:
+                    append(r)
+                count += len(chunk)
+                if len(chunk) < self.CHUNK_SIZE:
+                    done = True
+                    break
+
+            if clb:
+                clb(count)
+            yield True
+
+            if self._is_canceled:
+                return
+
+        if self._view:
+            self._view.set_model(self._view_model)
+
+
+class PiconsCache:
+    """ Size-bounded [in bytes] LRU cache of the picons pixbufs.
+
+        Missing picons are decoded in place [get] or in a thread pool [get_async].
+        While a picon is decoding, get_async returns a placeholder.
+        The callback is called [once per batch] after the new picons are ready.
+        The optional key function [picon id -> content key] allows to decode identical picons only once.
+        Content keys are used only for reading: the picons set [or removed] directly are kept by picon id,
+        because the content of the file may not match its key yet.
+        The access to the data is guarded by a lock [the cache can be cleared from other threads].
+    """
+    MAX_SIZE = 64 * 1024 * 1024
+    _ENTRY_SIZE = 64  # Approximate size of an entry without pixbuf.
+
+    def __init__(self, loader, callback=None, max_size=MAX_SIZE, workers=4, key=None):
+        self._loader = loader
+        self._callback = callback
+        self._key = key
+        self._max_size = max_size
+        self._data = OrderedDict()
+        self._own_keys = set()  # Picon ids of the directly set picons.
+        self._size = 0
+        self._pending = set()
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+        self._lock = RLock()
+        self._generation = 0
+        self._notify_scheduled = False
+        self.placeholder = None
+
+    def __contains__(self, p_id):
+        return self.get_key(p_id) in self._data
+
+    def __len__(self):
+        return len(self._data)
+
+    def __getitem__(self, p_id):
+        return self.get(p_id)
+
+    def __setitem__(self, p_id, pixbuf):
+        with self._lock:
+            self._own_keys.add(p_id)
+            self.set(p_id, pixbuf)
+
+    def get_key(self, p_id):
+        if not self._key or p_id in self._own_keys:
+            return p_id
+        return self._key(p_id) or p_id
+
+    def set(self, key, pixbuf):
+        with self._lock:
+            self.pop_key(key)
+            self._data[key] = pixbuf
+            self._size += self.get_entry_size(pixbuf)
+            self.shrink()
+
+    def get(self, p_id, default=None):
+        """ Returns the picon pixbuf. Loads it in place if it is not in the cache. """
+        if p_id is None:
+            return default
+
+        key = self.get_key(p_id)
+        with self._lock:
+            if key in self._data:
+                return self.get_cached(key)
+
+        pixbuf = self._loader(p_id)
+        self.set(key, pixbuf)
+        return pixbuf
+
+    def get_async(self, p_id):
+        """ Returns the picon pixbuf or placeholder if the picon is loading. """
+        if p_id is None:
+            return None
+
+        key = self.get_key(p_id)
+        with self._lock:
+            if key in self._data:
+                return self.get_cached(key)
+
+            if key not in self._pending:
+                self._pending.add(key)
+                self._executor.submit(self.load, self._generation, key, p_id)
+
+        return self.placeholder
+
+    def get_cached(self, key):
+        """ Returns the cached pixbuf and marks it as recently used. """
+        with self._lock:
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def pop(self, p_id, default=None):
+        with self._lock:
+            if p_id in self._own_keys:
+                self._own_keys.discard(p_id)
+                return self.pop_key(p_id, default)
+            return self.pop_key(self.get_key(p_id), default)
+
+    def pop_key(self, key, default=None):
+        with self._lock:
+            if key in self._data:
+                pixbuf = self._data.pop(key)
+                self._size -= self.get_entry_size(pixbuf)
+                return pixbuf
+            return default
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._data.clear()
+            self._own_keys.clear()
+            self._pending.clear()
+            self._size = 0
+
+    def shrink(self):
+        with self._lock:
+            while self._size > self._max_size and self._data:
+                self._size -= self.get_entry_size(self._data.popitem(last=False)[1])
+
+    def load(self, generation, key, p_id):
+        try:
+            pixbuf = self._loader(p_id)
+        except Exception as e:
+            log(f"{self.__class__.__name__} [load] error: {e}")
+            pixbuf = None
+        GLib.idle_add(self.on_loaded, generation, key, pixbuf)
+
+    def on_loaded(self, generation, key, pixbuf):
+        with self._lock:
+            if generation != self._generation:
+                return
+
+            self._pending.discard(key)
+            self.set(key, pixbuf)
+
+        if self._callback and not self._notify_scheduled:
+            self._notify_scheduled = True
+            GLib.idle_add(self.notify, priority=GLib.PRIORITY_LOW)
+
+    def notify(self):
+        self._notify_scheduled = False
+        self._callback()
+
+    @staticmethod
+    def get_entry_size(pixbuf):
+        return PiconsCache._ENTRY_SIZE + (pixbuf.get_byte_length() if pixbuf else 0)
+
+
+def get_picon_thumbnail(path, size, height=None):
+    """ Returns (width, height, RGBA data) of the scaled picon. """
+    pixbuf = get_pixbuf_at_scale(path, size, height or size, True)
+    if pixbuf:
+        if not pixbuf.get_has_alpha():
+            pixbuf = pixbuf.add_alpha(False, 0, 0, 0)
+
+        width, height, stride = pixbuf.get_width(), pixbuf.get_height(), pixbuf.get_rowstride()
+        data = pixbuf.get_pixels()
+        row_size = width * 4
+        if stride != row_size:
+            data = b"".join(data[i * stride: i * stride + row_size] for i in range(height))
+        return width, height, data
+
+
+def get_pixbuf_from_thumbnail(width, height, data):
+    return GdkPixbuf.Pixbuf.new_from_bytes(GLib.Bytes.new(data), GdkPixbuf.Colorspace.RGB, True, 8,
+                                           width, height, width * 4)
+
+
+def get_placeholder_pixbuf(width, height):
+    """ Returns a transparent pixbuf. """
+    pixbuf = GdkPixbuf.Pixbuf.new(GdkPixbuf.Colorspace.RGB, True, 8, width, height)
+    pixbuf.fill(0)
+    return pixbuf
+
+
 def get_pixbuf_from_data(img_data, w=48, h=32):
     if img_data:
         f = Gio.MemoryInputStream.new_from_data(img_data)
@@ -586,18 +1069,6 @@ def get_picon_file_name(service_name):
     return f"{re.sub('[^a-z0-9]', '', name.replace('&', 'and').replace('+', 'plus').replace('*', 'star').lower())}.png"
 
 
-def svg_to_png(svg_path, remove_svg=True):
-    """ Converts *.svg files to *.png. """
-    img = Gtk.Image.new_from_file(str(svg_path))
-    dest = f"{svg_path.parent}{os.sep}{svg_path.stem}.png"
-    bix = img.get_pixbuf()
-    if bix:
-        bix.savev(dest, "png")
-
-    if Path(dest).is_file() and remove_svg:
-        svg_path.unlink()
-
-
 # ***************** Bouquets ********************* #
 
 def gen_bouquets(app, gen_type):
@@ -849,24 +1320,18 @@ def append_text_to_tview(char, view):
 
 def get_iptv_url(row, s_type, column=Column.FAV_ID):
     """ Returns URL from IPTV type row. """
-    data = row[column].split(":" if s_type is SettingsType.ENIGMA_2 else "::")
-
-    if data:
-        if s_type is SettingsType.ENIGMA_2:
-            if len(data) > 10 and "http" in data[10]:
-                url, sep, desc = data[10].partition("#DESCRIPTION")
-                return unquote(url.strip())
-        else:
-            return data[0]
+    is_enigma = s_type is SettingsType.ENIGMA_2
+    ref = parse_iptv_ref(row[column], is_enigma)
+    if ref and (not is_enigma or "http" in ref.url):
+        return ref.url
 
 
 def get_iptv_data(fav_id):
     """ Returns the reference and URL as a tuple from the fav_id. """
-    data, sep, desc = fav_id.partition("#DESCRIPTION")
-    data = data.split(":")
-    if len(data) < 11:
-        return None, desc
-    return ":".join(data[:10]), unquote(data[10].strip())
+    ref = parse_iptv_ref(fav_id)
+    if not ref:
+        return None, fav_id.partition("#DESCRIPTION")[2]
+    return ref.ref, ref.url
 
 
 def on_popup_menu(menu, event):
@@ -31,24 +31,35 @@ import re
 import shutil
 from enum import Enum
 from html import escape
+from importlib.util import find_spec
 from pathlib import Path
 from urllib.parse import urlparse, unquote
 
-from gi.repository import GLib, GObject
+from gi.repository import GLib, GObject, Gio
 from gi.repository.GdkPixbuf import Pixbuf
 
 from app.commons import run_idle, run_task, run_with_delay, log
 from app.connections import upload_data, DownloadType, download_data, remove_picons
 from app.settings import SettingsType, Settings, SEP, IS_DARWIN
 from app.tools.picons import (PiconsParser, parse_providers, Provider, convert_to, download_picon, PiconsCzDownloader,
-                              PiconsError, PiconFormat)
+                              PiconsError, PiconFormat, PiconsConverter, PiconsStore, PiconsPack,
+                              detach_picon, HttpCache)
 from app.tools.satellites import SatellitesParser, SatelliteSource
 from .dialogs import show_dialog, DialogType, translate, get_builder, show_chooser_dialog
 from .main_helper import (scroll_to, on_popup_menu, get_base_model, set_picon, get_picon_pixbuf, get_picon_dialog,
-                          get_picon_file_name, get_pixbuf_from_data, get_pixbuf_at_scale, get_pos_num, svg_to_png)
+                          get_picon_file_name, get_pixbuf_from_data, get_pixbuf_at_scale, get_pos_num,
+                          PiconsCache, get_placeholder_pixbuf, PiconsLibrary, get_picon_thumbnail,
+                          get_pixbuf_from_thumbnail)
 from .uicommons import Gtk, Gdk, UI_RESOURCES_PATH, TV_ICON, Column, KeyboardKey, Page, ViewTarget
 
 
+class PiconItem(GObject.Object):
+    """ Picon data [item of the picons views models]. """
+    name = GObject.Property(type=str)
+    path = GObject.Property(type=str)
+    info = GObject.Property(type=str)
+
+
 @Gtk.Template(filename=f"{UI_RESOURCES_PATH}picon_widget.ui")
 class PiconWidget(Gtk.FlowBoxChild):
     __gtype_name__ = "PiconWidget"
@@ -57,17 +68,46 @@ class PiconWidget(Gtk.FlowBoxChild):
     _name_label = Gtk.Template.Child()
     _image = Gtk.Template.Child()
 
-    def __init__(self, name, path, info=None, **properties):
-        super().__init__(**properties)
-        self._name = name
-        self._path = path
+    WIDTH, HEIGHT = 100, 60
 
-        self.name = name
-        self.path = path
-        self.info = info or translate("Not assigned")
+    def __init__(self, item, cache=None, **properties):
+        super().__init__(**properties)
+        self._item = item
+        self._name = item.name
+        self._path = item.path
+        self._cache = cache
+        self._is_loaded = False
+        # The image is decoded on the first drawing [only for visible widgets].
+        self._image.set_size_request(self.WIDTH, self.HEIGHT)
+        self._image.connect("draw", self.on_image_draw)
+        # The widget follows the changes of the item.
+        flags = GObject.BindingFlags.SYNC_CREATE
+        item.bind_property("name", self, "name", flags)
+        item.bind_property("path", self, "path", flags)
+        item.bind_property("info", self, "info", flags, lambda b, v: v or translate("Not assigned"))
 
         self.show_all()
 
+    @property
+    def item(self):
+        return self._item
+
+    def on_image_draw(self, image, cr):
+        if self._is_loaded or not self._path:
+            return False
+
+        path = str(self._path)
+        if self._cache is None:
+            pixbuf = get_pixbuf_at_scale(path, self.WIDTH, self.HEIGHT, True)
+        else:
+            pixbuf = self._cache.get_async(path)
+            if pixbuf is self._cache.placeholder:
+                return False  # Will be redrawn when loaded.
+
+        self._is_loaded = True
+        image.set_from_pixbuf(pixbuf)
+        return False
+
     @GObject.Property(type=str)
     def name(self):
         return self._name
@@ -92,11 +132,19 @@ class PiconWidget(Gtk.FlowBoxChild):
 
     @path.setter
     def path(self, value):
+        if self._is_loaded:
+            # The picon file may have been changed.
+            self._is_loaded = False
+            if self._cache is not None:
+                self._cache.pop(str(self._path))
         self._path = value
-        self._image.set_from_pixbuf(get_pixbuf_at_scale(value, 100, 60, True))
+        self._image.queue_draw()
 
     @GObject.Property(type=Pixbuf)
     def pixbuf(self):
+        if not self._is_loaded:
+            pixbuf = self._cache.get(str(self._path)) if self._cache else None
+            return pixbuf or get_pixbuf_at_scale(self._path, self.WIDTH, self.HEIGHT, True)
         return self._image.get_pixbuf()
 
 
@@ -123,20 +171,28 @@ class PiconManager(Gtk.Box):
         self._POS_PATTERN = re.compile(r"^\d+\.\d+[EW]?$")
         self._FACTOR = self._app.DEL_FACTOR // 4
         self._current_process = None
+        self._converter = None
         self._is_downloading = False
         self._services = None
         self._current_picon_info = None
         self._filter_cache = {}
-        self._current_paths = set()
+        self._filter_text = ""
+        self._current_names = set()
+        self._picons_cache = PiconsCache(self.load_picon, self.on_picons_loaded)
+        self._picons_cache.placeholder = get_placeholder_pixbuf(PiconWidget.WIDTH, PiconWidget.HEIGHT)
+        self._picons_pack = None
+        self._picons_pack_dir = None
         # Downloader
         self._sats = None
         self._sat_names = None
         self._download_src = self.DownloadSource.PICON_CZ
         self._picon_cz_downloader = None
+        self._picons_library = None
 
         handlers = {"on_tool_switched": self.on_tool_switched,
                     "on_add": self.on_add,
                     "on_extract": self.on_extract,
+                    "on_match_library": self.on_match_library,
                     "on_receive": self.on_receive,
                     "on_cancel": self.on_cancel,
                     "on_remove": self.on_remove,
@@ -155,6 +211,7 @@ class PiconManager(Gtk.Box):
                     "on_selective_download": self.on_selective_download,
                     "on_selective_remove": self.on_selective_remove,
                     "on_local_remove": self.on_local_remove,
+                    "on_compact_picons": self.on_compact_picons,
                     "on_download_source_changed": self.on_download_source_changed,
                     "on_satellites_view_realize": self.on_satellites_view_realize,
                     "on_satellite_filter_toggled": self.on_satellite_filter_toggled,
@@ -216,8 +273,13 @@ class PiconManager(Gtk.Box):
         self._auto_filter_switch = builder.get_object("auto_filter_switch")
         self._filter_button = builder.get_object("filter_button")
         self._src_button = builder.get_object("src_button")
-        self._picons_dest_box.set_filter_func(self.picons_dst_filter_function)
-        self._picons_src_box.set_filter_func(self.picons_src_filter_function)
+        # The views show the models built from the picons index [all items of the folder] by filtering.
+        self._picons_items = {self._picons_src_box: [], self._picons_dest_box: []}
+        self._picons_stores = {}
+        for box in self._picons_items:
+            store = Gio.ListStore(item_type=PiconItem)
+            box.bind_model(store, self.create_picon_widget)
+            self._picons_stores[box] = store
         # Header buttons. -> Used instead stack switcher.
         self._manager_button = builder.get_object("manager_button")
         self._downloader_button = builder.get_object("downloader_button")
@@ -233,12 +295,76 @@ class PiconManager(Gtk.Box):
 
         self.show()
 
-    def get_picon_widget(self, name, path):
-        srv, info = self._services.get(name, None), None
-        if srv:
-            info = self.get_picon_info_markup(srv)
+    def get_picon_item(self, name, path):
+        srv = self._services.get(name, None) if self._services else None
+        return PiconItem(name=name, path=path, info=self.get_picon_info_markup(srv) if srv else None)
+
+    def create_picon_widget(self, item):
+        return PiconWidget(item, self._picons_cache)
+
+    def get_picon_widget(self, box, item):
+        """ Returns the widget of the item or None if the item is not visible. """
+        store = self._picons_stores[box]
+        for i in range(store.get_n_items()):
+            if store.get_item(i) is item:
+                return box.get_child_at_index(i)
+
+    def append_picons(self, box, items):
+        """ Adds items to the index and the visible ones to the view model. """
+        self._picons_items[box].extend(items)
+        visible = [i for i in items if self.is_picon_visible(box, i.name)]
+        if visible:
+            store = self._picons_stores[box]
+            store.splice(store.get_n_items(), 0, visible)
+
+    def remove_picons(self, box, items):
+        items = set(items)
+        self._picons_items[box] = [i for i in self._picons_items[box] if i not in items]
+        self.filter_picons(box)
+
+    def clear_picons(self, box):
+        self._picons_items[box].clear()
+        self._picons_stores[box].remove_all()
+
+    def load_picon(self, path):
+        """ Returns the picon pixbuf. The thumbnails of the current picons are read from the pack. """
+        pack = self._picons_pack
+        dir_name, name = os.path.split(path)
+        if pack and dir_name == self._picons_pack_dir:
+            try:
+                st = os.stat(path)
+            except OSError:
+                return None
+
+            if pack.is_actual(name, st.st_mtime_ns, st.st_size):
+                thumbnail = pack.get(name)
+                return get_pixbuf_from_thumbnail(*thumbnail) if thumbnail else None
+
+        return get_pixbuf_at_scale(path, PiconWidget.WIDTH, PiconWidget.HEIGHT, True)
+
+    @run_task
+    def update_picons_pack(self, path):
+        """ Updates the pack of the picons thumbnails for the current picons folder. """
+        pack = self._picons_pack
+        if not pack or self._picons_pack_dir != path:
+            pack = PiconsPack(f"{self._settings.profile_data_path}cache{os.sep}manager{os.sep}", PiconWidget.WIDTH)
+
+        try:
+            pack.load()
+            pack.update(path, lambda p, s: get_picon_thumbnail(p, s, PiconWidget.HEIGHT))
+        except OSError as e:
+            log(f"Picons pack update error: {e}")
+            pack.close()
+        else:
+            GLib.idle_add(self.on_picons_pack_updated, pack, path)
 
-        return PiconWidget(name, path, info)
+    def on_picons_pack_updated(self, pack, path):
+        if path == os.path.realpath(self._settings.profile_picons_path):
+            self._picons_pack, self._picons_pack_dir = pack, path
+
+    def on_picons_loaded(self):
+        self._picons_dest_box.queue_draw()
+        self._picons_src_box.queue_draw()
 
     def on_tool_switched(self, button):
         if not button.get_active():
@@ -277,7 +403,7 @@ class PiconManager(Gtk.Box):
             self.show_info_message(f"{translate('Source error!')} {translate('The paths are the same!')}")
         else:
             self._src_button.set_active(True)
-            self._picons_src_box.foreach(lambda w: self._picons_src_box.remove(w))
+            self.clear_picons(self._picons_src_box)
             self.update_picons_data(self._picons_src_box, resp)
 
     def update_picons_dest(self, app, page):
@@ -290,10 +416,12 @@ class PiconManager(Gtk.Box):
             self.update_picons_data(self._picons_dest_box)
 
     def on_profile_changed(self, app, data):
-        self._current_paths.clear()
+        self._current_names.clear()
+        self._picons_cache.clear()
+        self._picons_pack, self._picons_pack_dir = None, None
         self._s_type = app.app_settings.setting_type
         self._sat_positions = app.sat_positions
-        self._picons_dest_box.foreach(lambda w: self._picons_dest_box.remove(w))
+        self.clear_picons(self._picons_dest_box)
         self._current_path_label.set_text(self._settings.profile_picons_path)
         self.update_picons_dest(app, self._app.page)
         self._enigma2_path_button.set_filename(self._settings.profile_picons_path)
@@ -324,43 +452,61 @@ class PiconManager(Gtk.Box):
     def update_dst_picons(self, path):
         os.makedirs(os.path.dirname(path), exist_ok=True)
         self._dst_count_label.set_text("0")
-        info = {}
-
-        for index, file in enumerate(Path(path).glob("*.png")):
-            p_path = file.resolve()
-
-            if p_path in self._current_paths:
-                srv = self._services.get(file.name, None)
+        path = os.path.realpath(path)
+        self.update_picons_pack(path)
+        box = self._picons_dest_box
+        items = {i.name: i for i in self._picons_items[box]}
+        new_items = []
+
+        for index, entry in enumerate(self.scan_picons(path)):
+            name = entry.name
+            item = items.get(name, None)
+            if item:
+                srv = self._services.get(name, None) if self._services else None
                 if srv:
-                    info[file.name] = self.get_picon_info_markup(srv)
-                yield True
+                    item.info = self.get_picon_info_markup(srv)
             else:
-                self._current_paths.add(p_path)
-                self._picons_dest_box.add(self.get_picon_widget(file.name, p_path))
-                if index % self._FACTOR == 0:
-                    self._dst_count_label.set_text(str(len(self._current_paths)))
-                    yield True
-
-        if info:
-            for w in self._picons_dest_box:
-                name = w.name
-                if name in info:
-                    w.info = info[name]
-                    yield True
-
-        self._dst_count_label.set_text(str(len(self._current_paths)))
+                self._current_names.add(name)
+                new_items.append(self.get_picon_item(name, entry.path))
+
+            if index % self._FACTOR == 0:
+                self.append_picons(box, new_items)
+                new_items = []
+                self._dst_count_label.set_text(str(len(self._current_names)))
+                yield True
+
+        self.append_picons(box, new_items)
+        self._dst_count_label.set_text(str(len(self._current_names)))
         self._progress.hide()
         yield True
 
     def update_src_picons(self, path):
-        for index, file in enumerate(Path(path).glob("*.png")):
-            self._picons_src_box.add(self.get_picon_widget(file.name, file.resolve()))
+        items = []
+        for index, entry in enumerate(self.scan_picons(os.path.realpath(path))):
+            items.append(self.get_picon_item(entry.name, entry.path))
             if index % self._FACTOR == 0:
+                self.append_picons(self._picons_src_box, items)
+                items = []
                 yield True
 
+        self.append_picons(self._picons_src_box, items)
+
         self._progress.hide()
         yield True
 
+    @staticmethod
+    def scan_picons(path):
+        """ Returns sorted *.png file entries of the given folder [single pass]. """
+        try:
+            with os.scandir(path) as it:
+                entries = [e for e in it if e.name.endswith(".png") and e.is_file()]
+        except OSError as e:
+            log(f"Picons scan error: {e}")
+            return []
+        else:
+            entries.sort(key=lambda e: e.name)
+            return entries
+
     def get_picon_info_markup(self, srv):
         ext_info = "" if srv.service_type == "IPTV" else f" {srv.pos} {srv.freq}"
         return (f'<span size="small" weight="bold">{translate("Service")}: {escape(srv.service)}</span>\n'
@@ -376,7 +522,7 @@ class PiconManager(Gtk.Box):
         dest = self._picons_dest_box if box is self._picons_dest_box else self._picons_src_box
 
         if path.is_file():
-            dest.add(self.get_picon_widget(path.name, f_path))
+            self.append_picons(dest, [self.get_picon_item(path.name, f_path)])
         elif path.is_dir():
             self.update_picons_data(dest, f_path)
 
@@ -465,28 +611,30 @@ class PiconManager(Gtk.Box):
     def update_picons_dest_view(self, picons):
         """ Update destination view on adding/changing picons. """
         if picons:
-            p_widget = None
-            paths = {p.name: p for p in self._picons_dest_box}
+            box, p_widget = self._picons_dest_box, None
+            items = {i.name: i for i in self._picons_items[box]}
             for p_path in picons:
                 path = Path(p_path)
                 if path.resolve().is_file():
                     p_name = path.name
-                    p_widget = paths.get(p_name, None)
-                    if p_widget:
-                        p_widget.name = p_name
-                        p_widget.path = p_path
+                    item = items.get(p_name, None)
+                    if item:
+                        item.path = p_path
                     else:
-                        self._current_paths.add(p_path)
-                        p_widget = self.get_picon_widget(p_name, p_path)
-                        self._picons_dest_box.add(p_widget)
-                    self._picons_dest_box.select_child(p_widget)
+                        self._current_names.add(p_name)
+                        item = self.get_picon_item(p_name, p_path)
+                        self.append_picons(box, [item])
+                    widget = self.get_picon_widget(box, item)
+                    if widget:
+                        box.select_child(widget)
+                        p_widget = widget
             # Scrolling to the last widget.
             if p_widget:
                 v_value = p_widget.get_allocation().y
                 adj = self._picons_dest_box_sw.get_vadjustment()
                 adj.set_value(v_value if v_value > 0 else adj.get_upper())
 
-            self._dst_count_label.set_text(str(len(self._current_paths)))
+            self._dst_count_label.set_text(str(len(self._current_names)))
 
     def on_picons_view_drag_end(self, view, drag_context):
         self.update_picons_dest_view(self._app.picons_buffer)
@@ -503,9 +651,10 @@ class PiconManager(Gtk.Box):
             src = urlparse(unquote(uris[0])).path
             dst = f"{urlparse(unquote(uris[1])).path}{SEP}{name}"
             if src != dst:
+                detach_picon(dst, src)
                 shutil.copy(src, dst)
 
-                for p in self._picons_dest_box:
+                for p in self._picons_items[self._picons_dest_box]:
                     if name == p.name:
                         p.path = dst
                         img.set_from_pixbuf(get_pixbuf_at_scale(p.path, 192, 128, True))
@@ -548,13 +697,57 @@ class PiconManager(Gtk.Box):
         if arch_path:
             self.copy_picons_file(Path(arch_path.name).glob("*.png"), arch_path.cleanup)
 
+    def on_match_library(self, item):
+        """ Assigns picons for all current services from a picons library folder. """
+        if not self._app.current_services:
+            message = translate("To automatically set the identifiers for picons,\n"
+                                "first load the required services list into the main application window.")
+            self.show_info_message(message, Gtk.MessageType.WARNING)
+            return
+
+        resp = show_dialog(DialogType.CHOOSER, self._app_window, settings=self._settings, title="Open folder")
+        if resp in (Gtk.ResponseType.CANCEL, Gtk.ResponseType.DELETE_EVENT):
+            return
+
+        if resp == self._settings.profile_picons_path:
+            self.show_info_message(f"{translate('Source error!')} {translate('The paths are the same!')}")
+            return
+
+        msg = "Link the matched picons instead of copying? [No -> copy]"
+        link_resp = show_dialog(DialogType.QUESTION, self._app_window, msg, action_type=Gtk.ButtonsType.YES_NO)
+        if link_resp not in (Gtk.ResponseType.YES, Gtk.ResponseType.NO):
+            return
+
+        services = list(self._app.current_services.values())
+        self.match_library(resp, services, link_resp == Gtk.ResponseType.YES)
+
+    @run_task
+    def match_library(self, path, services, use_links=False):
+        self.show_info_message(translate("Please, wait..."), Gtk.MessageType.INFO)
+        library = self._picons_library
+        if not library or library.path != path or library.is_modified():
+            library = PiconsLibrary(path)
+            log(f"Picons library [{path}]: {library.build()} picons.")
+            self._picons_library = library
+
+        picons_path = self._settings.profile_picons_path
+        matches, missing = library.resolve(services, picons_path)
+        count = library.apply(matches, picons_path, use_links)
+        if missing:
+            log(f"Picons still missing [{len(missing)}]: {', '.join(sorted(missing))}")
+
+        msg = f"{translate('Done!')} {translate('Added')}: {count}, {translate('Missing')}: {len(missing)}"
+        self.show_info_message(msg, Gtk.MessageType.INFO)
+        GLib.idle_add(self._app.update_picons)
+        GLib.idle_add(self.update_picons_data, self._picons_dest_box)
+
     def copy_picons_file(self, files, callback=None):
         """ Copies files to the profile picons folder. """
         picon_path = self._settings.profile_picons_path
         os.makedirs(os.path.dirname(picon_path), exist_ok=True)
 
         try:
-            picons = [shutil.copy(p, picon_path) for p in files]
+            picons = [self.copy_picon(p, picon_path) for p in files]
         except shutil.SameFileError as e:
             log(e)
             self.show_info_message(str(e), Gtk.MessageType.ERROR)
@@ -565,6 +758,11 @@ class PiconManager(Gtk.Box):
             if callback:
                 callback()
 
+    @staticmethod
+    def copy_picon(src, picon_path):
+        detach_picon(os.path.join(picon_path, os.path.basename(src)), src)
+        return shutil.copy(src, picon_path)
+
     # ******************** Download/Upload/Remove ************************* #
 
     def on_selective_send(self, box):
@@ -600,16 +798,42 @@ class PiconManager(Gtk.Box):
             path = c.path
             p_path = Path(c.path).resolve()
             if p_path.is_file():
-                if is_dest and p_path in self._current_paths:
-                    self._current_paths.remove(p_path)
+                if is_dest:
+                    self._current_names.discard(c.name)
+                self._picons_cache.pop(str(path))
                 p_path.unlink()
-                to_remove.append(c)
+                to_remove.append(c.item)
 
-        [box.remove(c) for c in to_remove]
+        self.remove_picons(box, to_remove)
 
         self._app.update_picons()
         if box is self._picons_dest_box:
-            self._dst_count_label.set_text(str(len(self._current_paths)))
+            self._dst_count_label.set_text(str(len(self._current_names)))
+
+    def on_compact_picons(self, item):
+        """ Stores identical picons once. Other names are replaced by links. """
+        if show_dialog(DialogType.QUESTION, self._app_window) != Gtk.ResponseType.OK:
+            return
+
+        self.compact_picons(self._settings.profile_picons_path)
+
+    @run_task
+    def compact_picons(self, path):
+        self.show_info_message(translate("Please, wait..."), Gtk.MessageType.INFO)
+        store = PiconsStore(f"{self._settings.profile_data_path}cache{os.sep}")
+        try:
+            store.load()
+            store.update(path)
+            stats = store.get_stats(path)
+            linked, saved = store.compact(path)
+        except OSError as e:
+            self.show_info_message(str(e), Gtk.MessageType.ERROR)
+        else:
+            log((f"Picons: {stats['files']}, unique: {stats['unique']}, duplicates: {stats['duplicates']}. "
+                 f"Linked: {linked}, saved: {saved / 1024 / 1024:.2f} MB."))
+            msg = f"{translate('Done!')} {linked} / {saved / 1024 / 1024:.2f} MB"
+            self.show_info_message(msg, Gtk.MessageType.INFO)
+            GLib.idle_add(self._app.update_picons)
 
     def on_send(self, app, page):
         if page is Page.PICONS:
@@ -848,17 +1072,29 @@ class PiconManager(Gtk.Box):
             if not self._resize_no_radio_button.get_active():
                 self.resize(picons_path)
         finally:
-            self._app.update_picons()
+            GLib.idle_add(self._app.update_picons)
             GLib.idle_add(self._cancel_button.hide)
             self._is_downloading = False
 
     def get_picons_for_lyngsat(self, path, providers):
+        # Conditional requests and one connection pool for all workers.
+        cache = HttpCache(f"{self._settings.profile_data_path}cache{os.sep}", "lyngsat")
+        try:
+            self.download_lyngsat_picons(path, providers, cache)
+        finally:
+            try:
+                cache.save()
+            except OSError as e:
+                log(f"HTTP cache saving error: {e}")
+            cache.close()
+
+    def download_lyngsat_picons(self, path, providers, cache):
         import concurrent.futures
 
-        with concurrent.futures.ThreadPoolExecutor(max_workers=10) as executor:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=HttpCache.POOL_SIZE) as executor:
             picons = []
             # Getting links to picons.
-            futures = {executor.submit(self.process_provider, p, path): p for p in providers}
+            futures = {executor.submit(self.process_provider, p, path, cache): p for p in providers}
             for future in concurrent.futures.as_completed(futures):
                 if not self._is_downloading:
                     executor.shutdown()
@@ -868,7 +1104,7 @@ class PiconManager(Gtk.Box):
                 if pic:
                     picons.extend(pic)
             # Getting picon images.
-            futures = {executor.submit(download_picon, *pic): pic for pic in picons}
+            futures = {executor.submit(download_picon, *pic, cache): pic for pic in picons}
             done, not_done = concurrent.futures.wait(futures, timeout=0)
             while self._is_downloading and not_done:
                 done, not_done = concurrent.futures.wait(not_done, timeout=5)
@@ -877,12 +1113,10 @@ class PiconManager(Gtk.Box):
                 future.cancel()
             concurrent.futures.wait(not_done)
             # Converting svg -> png.
-            res = Path(path).glob("*.svg")
-            svg_path = next(res, False)
-            if svg_path:
+            svg_files = list(Path(path).glob("*.svg"))
+            if svg_files:
                 log("Converting *.svg to *.png...")
-                svg_to_png(svg_path)
-                [svg_to_png(file) for file in res]
+                self.get_converter(translate("Converting...")).svg_to_png(svg_files)
 
             self.show_info_message(translate("Done!"), Gtk.MessageType.INFO)
 
@@ -893,12 +1127,9 @@ class PiconManager(Gtk.Box):
             if not p_ids:
                 return
 
-        try:
-            # We download it sequentially.
-            [self._picon_cz_downloader.download(p, path, p_ids) for p in providers]
-        except PiconsError as e:
-            log(f"Error: {str(e)}\n")
-            self.show_info_message(str(e), Gtk.MessageType.ERROR)
+        errors = self._picon_cz_downloader.download_all(providers, path, p_ids)
+        if errors:
+            self.show_info_message(str(errors[-1]), Gtk.MessageType.ERROR)
         else:
             self.show_info_message(translate("Done!"), Gtk.MessageType.INFO)
 
@@ -923,32 +1154,31 @@ class PiconManager(Gtk.Box):
                 ids.add(get_picon_file_name(s.service))
         return ids
 
-    def process_provider(self, prv, picons_path):
+    def process_provider(self, prv, picons_path, cache=None):
         log(f"Getting links to picons for: {prv.name}.\n")
-        return PiconsParser.parse(prv, picons_path, self.get_picon_ids(), self.get_picons_format())
+        return PiconsParser.parse(prv, picons_path, self.get_picon_ids(), self.get_picons_format(), cache)
 
     @run_task
     def resize(self, path):
         self.show_info_message(translate("Resizing..."), Gtk.MessageType.INFO)
 
-        try:
-            from pathlib import Path
-            from PIL import Image, UnidentifiedImageError
-        except ImportError as e:
-            self.show_info_message(f"{translate('Conversion error.')} {e}", Gtk.MessageType.ERROR)
+        if not find_spec("PIL"):
+            self.show_info_message(f"{translate('Conversion error.')} No module named 'PIL'", Gtk.MessageType.ERROR)
         else:
             res = (220, 132) if self._resize_220_132_radio_button.get_active() else (100, 60)
+            converter = self.get_converter(translate("Resizing..."))
+            count = converter.resize(Path(path).glob("*.png"), res)
+            if not converter.is_canceled:
+                log(f"Resized picons: {count}.")
+                self.show_info_message(translate("Done!"), Gtk.MessageType.INFO)
 
-            for img_file in Path(path).glob("*.png"):
-                try:
-                    img = Image.open(img_file)
-                except UnidentifiedImageError as e:
-                    f"{translate('Conversion error.')} {e} -> {img_file}"
-                else:
-                    img = img.resize(res, Image.Resampling.LANCZOS)
-                    img.save(img_file, "PNG", optimize=True)
+    def get_converter(self, title):
+        """ Returns a new picons converter with progress reporting. """
+        def on_progress(done, total):
+            self.show_info_message(f"{title} {done}/{total}", Gtk.MessageType.INFO)
 
-            self.show_info_message(translate("Done!"), Gtk.MessageType.INFO)
+        self._converter = PiconsConverter(self._settings.picons_workers, on_progress)
+        return self._converter
 
     def on_cancel(self, item=None):
         if self._is_downloading and show_dialog(DialogType.QUESTION, self._app_window) == Gtk.ResponseType.CANCEL:
@@ -959,6 +1189,8 @@ class PiconManager(Gtk.Box):
     @run_task
     def terminate_task(self):
         self._is_downloading = False
+        if self._converter:
+            self._converter.cancel()
         self.show_info_message(translate("The task is canceled!"), Gtk.MessageType.WARNING)
 
     @run_task
@@ -1012,39 +1244,38 @@ class PiconManager(Gtk.Box):
 
     def on_fiter_dst_toggled(self, button):
         """ Activates re-filtering when filter check-button has toggled. """
-        GLib.idle_add(self._picons_dest_box.invalidate_filter, priority=GLib.PRIORITY_LOW)
+        GLib.idle_add(self.filter_picons, self._picons_dest_box, priority=GLib.PRIORITY_LOW)
 
     def on_fiter_src_toggled(self, button):
         """ Activates re-filtering when filter check-button has toggled. """
-        GLib.idle_add(self._picons_src_box.invalidate_filter, priority=GLib.PRIORITY_LOW)
+        GLib.idle_add(self.filter_picons, self._picons_src_box, priority=GLib.PRIORITY_LOW)
 
     @run_with_delay(0.5)
     def on_picons_filter_changed(self, entry):
         self._filter_cache.clear()
-        txt = entry.get_text().upper().split("|")
-        for s in self._app.current_services.values():
-            self._filter_cache[s.picon_id] = any(t in s.service.upper() or t in str(s.picon_id) for t in txt)
-
-        GLib.idle_add(self._picons_dest_box.invalidate_filter, priority=GLib.PRIORITY_LOW)
-        GLib.idle_add(self._picons_src_box.invalidate_filter, priority=GLib.PRIORITY_LOW)
-
-    def picons_src_filter_function(self, item):
-        return self.filter_function(item, self._src_filter_button.get_active())
-
-    def picons_dst_filter_function(self, item):
-        return self.filter_function(item, self._dst_filter_button.get_active())
-
-    def filter_function(self, item, active):
-        """ Main filtering function. """
-        if not active:
+        txt = entry.get_text().upper()
+        if txt:
+            values = txt.split("|")
+            for s in self._app.current_services.values():
+                self._filter_cache[s.picon_id] = any(t in s.service.upper() or t in str(s.picon_id) for t in values)
+        self._filter_text = txt
+
+        GLib.idle_add(self.filter_picons, self._picons_dest_box, priority=GLib.PRIORITY_LOW)
+        GLib.idle_add(self.filter_picons, self._picons_src_box, priority=GLib.PRIORITY_LOW)
+
+    def filter_picons(self, box):
+        """ Rebuilds the view model from the picons index. Only the visible picons get widgets. """
+        store = self._picons_stores[box]
+        visible = [i for i in self._picons_items[box] if self.is_picon_visible(box, i.name)]
+        size = store.get_n_items()
+        if size != len(visible) or any(store.get_item(i) is not item for i, item in enumerate(visible)):
+            store.splice(0, size, visible)
+
+    def is_picon_visible(self, box, name):
+        button = self._dst_filter_button if box is self._picons_dest_box else self._src_filter_button
+        if not button.get_active() or not self._filter_text:
             return True
-
-        t = item.name
-        txt = self._picons_filter_entry.get_text().upper()
-        if not txt:
-            return True
-
-        return txt in t.upper() or self._filter_cache.get(t, False)
+        return self._filter_text in name.upper() or self._filter_cache.get(name, False)
 
     def on_picon_activated(self, box: Gtk.FlowBox):
         if self._info_check_button.get_active():
@@ -1123,10 +1354,9 @@ class PiconManager(Gtk.Box):
         p_format = PiconFormat.NEUTRINO if self._converter_nt_button.get_active() else PiconFormat.OSCAM
 
         if p_format is PiconFormat.OSCAM:
-            try:
-                from PIL import Image
-            except ImportError as e:
-                self.show_info_message(f"{translate('Conversion error.')} {e}", Gtk.MessageType.ERROR)
+            if not find_spec("PIL"):
+                self.show_info_message(f"{translate('Conversion error.')} No module named 'PIL'",
+                                       Gtk.MessageType.ERROR)
                 return
 
         if self._converter_bq_button.get_active():
@@ -1138,7 +1368,8 @@ class PiconManager(Gtk.Box):
             ids = {services.get(s).picon_id for s in self._app.current_bouquets.get(bq_selected) if s in services}
 
         convert_to(src_path=picons_path, dest_path=save_path, p_format=p_format, ids=ids, services=self._services,
-                   done_callback=lambda: self.show_info_message(translate("Done!"), Gtk.MessageType.INFO))
+                   done_callback=lambda: self.show_info_message(translate("Done!"), Gtk.MessageType.INFO),
+                   converter=self.get_converter(translate("Converting...")))
 
     @run_idle
     def update_receive_button_state(self):
@@ -1,9 +1,29 @@
 """ This is helper module for search features """
-from app.commons import run_with_delay
+import re
+from bisect import bisect_right
+from collections import defaultdict, Counter
+from contextlib import contextmanager
+from functools import lru_cache
+from itertools import groupby
+from threading import Lock
+
+from gi.repository import GLib
+
+from app.commons import run_with_delay, run_task
+from app.eparser.ecommons import BqServiceType
+from .main_helper import get_iptv_data
+from .uicommons import Gtk
 
 
 class SearchProvider:
-    def __init__(self, view, entry, down_button, up_button, columns=None):
+    _SEP = "\n"  # Rows separator in the haystack.
+    _COLUMN_SEP = "\t"
+
+    def __init__(self, view, entry, down_button, up_button, columns=None, index=None, id_column=None):
+        """
+            @param index: trigram index for fuzzy search if there are no exact matches.
+            @param id_column: column with the index keys [fav_id].
+        """
         self._paths = []
         self._current_index = -1
         self._max_indexes = 0
@@ -12,31 +32,107 @@ class SearchProvider:
         self._up_button = up_button
         self._down_button = down_button
         self._columns = columns
+        self._index = index
+        self._id_column = id_column
+        # Cached uppercased text of the model rows.
+        self._model = None
+        self._model_handlers = []
+        self._haystack = None
+        self._offsets = []
+        self._ids = []
+        self._search_id = 0
 
         entry.connect("changed", self.on_search)
         self._down_button.connect("clicked", self.on_search_down)
         self._up_button.connect("clicked", self.on_search_up)
+        self._view.connect("notify::model", self.on_model_changed)
+        self.on_model_changed(view)
+
+    def on_model_changed(self, view, param=None):
+        if self._model:
+            list(map(self._model.disconnect, self._model_handlers))
+
+        self._model = view.get_model()
+        self._model_handlers.clear()
+        if self._model:
+            for s in ("row-changed", "row-inserted", "row-deleted", "rows-reordered"):
+                self._model_handlers.append(self._model.connect(s, self.invalidate))
+        self.invalidate()
+
+    def invalidate(self, *args):
+        self._haystack = None
+
+    def init_haystack(self, model):
+        """ Builds uppercased text of all model rows and the rows start positions. """
+        keys = []
+        self._offsets.clear()
+        self._ids.clear()
+        pos = 0
+        for r in model:
+            if self._id_column is not None:
+                self._ids.append(r[self._id_column])
+            data = [r[i] for i in self._columns] if self._columns else r[:]
+            key = self._COLUMN_SEP.join(str(s).upper() for s in data)
+            keys.append(key)
+            self._offsets.append(pos)
+            pos += len(key) + 1
+
+        self._haystack = self._SEP.join(keys)
 
     def search(self, text):
+        self._search_id += 1
         self._current_index = -1
         self._paths.clear()
         model = self._view.get_model()
         selection = self._view.get_selection()
-        if not selection:
+        if not selection or not model:
             return
 
         selection.unselect_all()
         if not text:
+            self._max_indexes = 0
+            self.update_navigation_buttons()
             return
 
-        text = text.upper()
-        for r in model:
-            data = [r[i] for i in self._columns] if self._columns else r[:]
-            if next((s for s in data if text in str(s).upper()), False):
-                path = r.path
-                selection.select_path(r.path)
-                self._paths.append(path)
+        if self._haystack is None:
+            self.init_haystack(model)
+
+        self.find(self._search_id, text.upper(), self._haystack, tuple(self._offsets), tuple(self._ids))
+
+    @run_task
+    def find(self, search_id, text, haystack, offsets, ids):
+        """ Searches for the rows containing the text in a separate thread.
+
+            If there are no exact matches, the fuzzy search results
+            are used [if an index is set] sorted by rank.
+        """
+        indexes = []
+        start = haystack.find(text)
+        while start > -1 and search_id == self._search_id:
+            index = bisect_right(offsets, start) - 1
+            indexes.append(index)
+            if index + 1 >= len(offsets):
+                break
+            start = haystack.find(text, offsets[index + 1])
+
+        if not indexes and self._index and ids:
+            ranks = {k: i for i, (k, score) in enumerate(self._index.query(text))}
+            indexes = sorted((i for i, k in enumerate(ids) if k in ranks), key=lambda i: ranks[ids[i]])
 
+        GLib.idle_add(self.apply_result, search_id, indexes)
+
+    def apply_result(self, search_id, indexes):
+        """ Selects all found rows in one pass. """
+        if search_id != self._search_id:
+            return
+
+        selection = self._view.get_selection()
+        # Consecutive rows are selected as ranges.
+        for k, g in groupby(enumerate(sorted(indexes)), lambda i: i[1] - i[0]):
+            group = [i for n, i in g]
+            selection.select_range(Gtk.TreePath(group[0]), Gtk.TreePath(group[-1]))
+
+        self._paths.extend(Gtk.TreePath(i) for i in indexes)
         self._max_indexes = len(self._paths) - 1
         if self._max_indexes > 0:
             self.on_search_down()
@@ -61,7 +157,7 @@ class SearchProvider:
         self._up_button.set_sensitive(self._current_index > 0)
         self._down_button.set_sensitive(self._current_index < self._max_indexes)
 
-    @run_with_delay(1)
+    @run_with_delay(0.15)
     def on_search(self, entry):
         self.search(entry.get_text())
 
@@ -69,5 +165,262 @@ class SearchProvider:
         self._entry.grab_focus() if action.get_active() else self._entry.set_text("")
 
 
+class FilterIndex:
+    """ Index of the list model rows for fast filtering.
+
+        It is built once per data load and keeps pre-uppercased
+        concatenated keys and sets of row indexes by type, position and coding.
+        Typing narrows the previous text result instead of scanning the whole model.
+        Any model changes (except those made while suspended) invalidate the index.
+    """
+
+    def __init__(self, id_column, key_columns, type_column, pos_column, coded_column):
+        self._id_column = id_column
+        self._key_columns = key_columns
+        self._type_column = type_column
+        self._pos_column = pos_column
+        self._coded_column = coded_column
+
+        self._model = None
+        self._handlers = []
+        self._ids = []
+        self._iters = []
+        self._keys = []
+        self._id_indexes = {}
+        self._types = defaultdict(set)
+        self._positions = defaultdict(set)
+        self._coded = set()
+        # Last text query and matches.
+        self._text = ""
+        self._text_matches = None
+        # Current state. None -> all rows are visible.
+        self._visible_indexes = None
+        self._visible = None
+        self._is_valid = False
+        self._is_synced = False
+
+    def is_valid(self, model):
+        return self._is_valid and model is self._model
+
+    def build(self, model):
+        """ Builds the index for the given model. """
+        self.clear()
+        self._model = model
+
+        for index, r in enumerate(model):
+            fav_id = r[self._id_column]
+            self._ids.append(fav_id)
+            self._iters.append(r.iter)
+            self._id_indexes[fav_id] = index
+            self._keys.append("".join(r[c] for c in self._key_columns).upper())
+            self._types[r[self._type_column]].add(index)
+            self._positions[r[self._pos_column]].add(index)
+            if r[self._coded_column]:
+                self._coded.add(index)
+
+        self._handlers = [model.connect(s, self.invalidate) for s in ("row-changed", "row-inserted",
+                                                                      "row-deleted", "rows-reordered")]
+        self._is_valid = True
+
+    def clear(self):
+        if self._model:
+            list(map(self._model.disconnect, self._handlers))
+        self._model = None
+        self._handlers.clear()
+        self._ids.clear()
+        self._iters.clear()
+        self._keys.clear()
+        self._id_indexes.clear()
+        self._types.clear()
+        self._positions.clear()
+        self._coded.clear()
+        self._text, self._text_matches = "", None
+        self._visible_indexes = None
+        self._visible = None
+        self._is_valid = False
+        self._is_synced = False
+
+    def invalidate(self, *args):
+        self._is_valid = False
+
+    @contextmanager
+    def suspended(self):
+        """ Suspends tracking of the model changes [e.g. for refiltering]. """
+        model, handlers = self._model, tuple(self._handlers)
+        if model:
+            list(map(model.handler_block, handlers))
+        try:
+            yield
+        finally:
+            if model:
+                list(map(model.handler_unblock, handlers))
+
+    def is_visible(self, fav_id):
+        return self._visible is None or fav_id in self._visible
+
+    def filter(self, text, types, positions, coded=None, exclude=None, search_index=None):
+        """ Applies the filter params.
+
+            @param coded: None -> all, True -> only coded, False -> only free.
+            @param search_index: trigram index for fuzzy search if there are no exact matches.
+            Returns iters of the rows whose visibility has changed.
+        """
+        text = text.upper()
+        keys = self._keys
+        if self._text_matches is not None and self._text in text:
+            matches = self._text_matches
+        else:
+            matches = range(len(keys))
+
+        matches = {i for i in matches if text in keys[i]} if text else set(matches)
+        self._text, self._text_matches = text, matches
+
+        if text and not matches and search_index:
+            ids = self._id_indexes
+            matches = {ids[k] for k, score in search_index.query(text) if k in ids}
+            # Fuzzy results are not used for narrowing.
+            self._text_matches = None
+
+        visible = matches & self.get_indexes(self._types, types)
+        visible &= self.get_indexes(self._positions, positions)
+        if coded is not None:
+            visible = visible & self._coded if coded else visible - self._coded
+        if exclude:
+            visible -= {self._id_indexes[f] for f in exclude if f in self._id_indexes}
+
+        return self.update_state(visible)
+
+    def reset(self):
+        """ Makes all rows visible. Returns iters of the rows whose visibility has changed. """
+        if self._is_synced and self._visible_indexes is None:
+            return []
+        return self.update_state(None)
+
+    def update_state(self, visible):
+        prev = self._visible_indexes
+        all_indexes = set(range(len(self._ids)))
+        if self._is_synced:
+            changed = (all_indexes if prev is None else prev) ^ (all_indexes if visible is None else visible)
+        else:
+            # The actual state of the filter model is unknown after (re)building.
+            changed, self._is_synced = all_indexes, True
+        self._visible_indexes = visible
+        self._visible = None if visible is None else {self._ids[i] for i in visible}
+
+        return [self._iters[i] for i in sorted(changed)]
+
+    @staticmethod
+    def get_indexes(data, values):
+        indexes = set()
+        indexes.update(*(data[v] for v in values if v in data))
+        return indexes
+
+
+class TrigramIndex:
+    """ Trigram index for the fuzzy search of services.
+
+        Each entry can have several text fields (name, package, URL, etc.).
+        Results are ranked by the best Dice similarity between
+        the query and the entry fields trigrams.
+    """
+    _WORDS = {"ZERO": "0", "ONE": "1", "TWO": "2", "THREE": "3", "FOUR": "4", "FIVE": "5",
+              "SIX": "6", "SEVEN": "7", "EIGHT": "8", "NINE": "9", "TEN": "10"}
+    # Letters and digits are separate tokens -> "BBC1" = "BBC 1".
+    _TOKEN_PATTERN = re.compile(r"[^\W\d_]+|\d+")
+
+    def __init__(self):
+        self._entries = {}
+        self._postings = defaultdict(set)
+        self._lock = Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    @lru_cache(maxsize=50000)
+    def get_token_trigrams(token):
+        w = f" {TrigramIndex._WORDS.get(token, token)} "
+        return frozenset(w[i:i + 3] for i in range(len(w) - 2))
+
+    @staticmethod
+    def get_trigrams(text):
+        # Long numbers [IDs in URLs, etc.] are skipped.
+        tokens = (t for t in TrigramIndex._TOKEN_PATTERN.findall(text.upper()) if len(t) < 5 or not t.isdigit())
+        return frozenset().union(*map(TrigramIndex.get_token_trigrams, tokens))
+
+    def build(self, entries):
+        """ Builds a new index from the iterable of (key, *fields) and replaces the current one. """
+        index, postings = {}, defaultdict(set)
+        for key, *fields in entries:
+            self.add_entry(key, fields, index, postings)
+
+        with self._lock:
+            self._entries, self._postings = index, postings
+
+    def add(self, key, *fields):
+        """ Adds or replaces the entry. """
+        with self._lock:
+            self.remove_entry(key)
+            self.add_entry(key, fields, self._entries, self._postings)
+
+    def remove(self, *keys):
+        with self._lock:
+            list(map(self.remove_entry, keys))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._postings.clear()
+
+    def add_entry(self, key, fields, index, postings):
+        grams = tuple(g for g in map(self.get_trigrams, filter(None, fields)) if g)
+        if grams:
+            index[key] = grams
+            for g in frozenset().union(*grams):
+                postings[g].add(key)
+
+    def remove_entry(self, key):
+        grams = self._entries.pop(key, None)
+        if grams:
+            for g in frozenset().union(*grams):
+                keys = self._postings.get(g)
+                if keys:
+                    keys.discard(key)
+                    if not keys:
+                        del self._postings[g]
+
+    def query(self, text, limit=100, threshold=0.4):
+        """ Returns a list of (key, score) sorted by score. """
+        q_grams = self.get_trigrams(text)
+        if not q_grams:
+            return []
+
+        q_size = len(q_grams)
+        results = []
+        with self._lock:
+            counts = Counter()
+            for g in q_grams:
+                counts.update(self._postings.get(g, ()))
+            # Dice >= threshold -> common >= threshold * (|q| + |f|) / 2 >= threshold * |q| / 2.
+            min_count = threshold * q_size / 2
+            # Only the best candidates by the number of common trigrams are scored.
+            for key, count in counts.most_common(limit * 10):
+                if count < min_count:
+                    break
+                score = max(2 * len(q_grams & f) / (q_size + len(f)) for f in self._entries[key])
+                if score >= threshold:
+                    results.append((key, score))
+
+        results.sort(key=lambda r: -r[1])
+        return results[:limit]
+
+
+def get_search_fields(srv):
+    """ Returns the service fields used for the fuzzy search. """
+    if srv.service_type == BqServiceType.IPTV.name:
+        return srv.service, get_iptv_data(srv.fav_id)[1]
+    return srv.service, srv.package
+
+
 if __name__ == "__main__":
     pass
@@ -39,6 +39,7 @@ from app.eparser.neutrino import get_attributes, SP, KSP
 from app.settings import SettingsType
 from .dialogs import show_dialog, DialogType, Action, get_builder
 from .main_helper import get_base_model, scroll_to
+from .search import get_search_fields
 from .uicommons import Gtk, Gdk, UI_RESOURCES_PATH, HIDE_ICON, CODED_ICON, Column
 
 _UI_PATH = f"{UI_RESOURCES_PATH}service_dialog.glade"
@@ -87,6 +88,7 @@ class ServiceDetailsDialog:
         self._action = action
         self._old_service = None
         self._services = app.current_services
+        self._search_index = app.search_index
         self._bouquets = app.current_bouquets
         self._new_color = app._NEW_COLOR
         self._transponder_services_iters = None
@@ -512,6 +514,8 @@ class ServiceDetailsDialog:
             self.update_bouquets(fav_id, old_fav_id)
 
         self._services[fav_id] = service
+        self._search_index.remove(old_fav_id)
+        self._search_index.add(fav_id, *get_search_fields(service))
 
         if self._old_service.picon_id != service.picon_id:
             self.update_picon_name(self._old_service.picon_id, service.picon_id)
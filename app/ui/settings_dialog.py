@@ -168,6 +168,7 @@ class SettingsDialog:
         self._list_font_button = builder.get_object("list_font_button")
         self._picons_size_button = builder.get_object("picons_size_button")
         self._tooltip_logo_size_button = builder.get_object("tooltip_logo_size_button")
+        self._streams_check_interval_button = builder.get_object("streams_check_interval_button")
         self._colors_grid = builder.get_object("colors_grid")
         self._set_color_switch = builder.get_object("set_color_switch")
         self._new_color_button = builder.get_object("new_color_button")
@@ -329,6 +330,8 @@ class SettingsDialog:
         self.on_transcoding_preset_changed(self._presets_combo_box)
         self._picons_size_button.set_active_id(str(self._settings.list_picon_size))
         self._tooltip_logo_size_button.set_active_id(str(self._settings.tooltip_logo_size))
+        if not self._streams_check_interval_button.set_active_id(str(self._settings.streams_check_interval)):
+            self._streams_check_interval_button.set_active_id("0")
         self._list_font_button.set_font(self._settings.list_font)
         self._support_http_api_switch.set_active(self._settings.http_api_support)
 
@@ -408,6 +411,7 @@ class SettingsDialog:
         self._ext_settings.active_preset = self._presets_combo_box.get_active_id()
         self._ext_settings.list_picon_size = int(self._picons_size_button.get_active_id())
         self._ext_settings.tooltip_logo_size = int(self._tooltip_logo_size_button.get_active_id())
+        self._ext_settings.streams_check_interval = int(self._streams_check_interval_button.get_active_id())
         self._ext_settings.list_font = self._list_font_button.get_font()
         self._ext_settings.http_api_support = self._support_http_api_switch.get_active()
 
@@ -279,6 +279,7 @@ class Column(IntEnum):
     IPTV_FAV_ID = 5
     IPTV_PICON_ID = 6
     IPTV_TOOLTIP = 7
+    IPTV_HEALTH = 8
     # EPG view
     EPG_SERVICE = 0
     EPG_TITLE = 1
@@ -0,0 +1,98 @@
+""" Local HTTP stand-in serving fixture pages and playlists for the offline tests. """
+import hashlib
+import os
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from socketserver import ThreadingMixIn
+from threading import Thread, Lock
+
+FIXTURES_PATH = f"{os.path.dirname(os.path.abspath(__file__))}{os.sep}fixtures{os.sep}"
+
+CONTENT_TYPES = {".html": "text/html; charset=utf-8",
+                 ".png": "image/png",
+                 ".m3u8": "application/vnd.apple.mpegurl",
+                 ".ts": "video/mp2t"}
+
+
+def read_fixture(name):
+    with open(f"{FIXTURES_PATH}{name}", "rb") as f:
+        return f.read()
+
+
+class FixtureServer(ThreadingMixIn, HTTPServer):
+    """ Serves the routes [path -> data] with ETag validation.
+
+        The requests are counted by path and status code.
+        Use as a context manager: the server is started in a separate thread.
+    """
+    daemon_threads = True
+
+    def __init__(self, routes=None):
+        super().__init__(("127.0.0.1", 0), FixtureHandler)
+        self.routes = routes or {}
+        self.requests = []  # (method, path, code)
+        self._lock = Lock()
+        self._thread = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def count(self, path, code=None):
+        with self._lock:
+            return sum(1 for m, p, c in self.requests if p == path and (code is None or c == code))
+
+    def add_request(self, method, path, code):
+        with self._lock:
+            self.requests.append((method, path, code))
+
+    def __enter__(self):
+        self._thread = Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.shutdown()
+        self.server_close()
+        self._thread.join()
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_HEAD(self):
+        self.send_data(with_body=False)
+
+    def do_GET(self):
+        self.send_data()
+
+    def send_data(self, with_body=True):
+        path = self.path.partition("?")[0]
+        data = self.server.routes.get(path)
+        if data is None:
+            self.send_status(404)
+            return
+
+        etag = f'"{hashlib.sha1(data).hexdigest()}"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_status(304, etag)
+            return
+
+        self.server.add_request(self.command, path, 200)
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPES.get(os.path.splitext(path)[1], "application/octet-stream"))
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("ETag", etag)
+        self.end_headers()
+        if with_body:
+            self.wfile.write(data)
+
+    def send_status(self, code, etag=None):
+        self.server.add_request(self.command, self.path.partition("?")[0], code)
+        self.send_response(code)
+        if etag:
+            self.send_header("ETag", etag)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass  # NOP
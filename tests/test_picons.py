@@ -0,0 +1,128 @@
+""" Offline tests for the cached LyngSat picons downloading [HttpCache, PiconsParser]. """
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from app.settings import SettingsType
+from app.tools.picons import HttpCache, PiconsParser, Provider, download_picon
+from tests.http_server import FixtureServer, read_fixture
+
+PAGE_PATH = "/packages/test-package.html"
+PICON_PATH = "/logo/tv/tt/test-one.png"
+
+
+class HttpCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.path = f"{self._tmp.name}{os.sep}"
+        self.server = FixtureServer({PAGE_PATH: read_fixture("lyngsat/package.html"),
+                                     PICON_PATH: read_fixture("lyngsat/test-one.png")}).__enter__()
+
+    def tearDown(self):
+        self.server.__exit__(None, None, None)
+        self._tmp.cleanup()
+
+    def get_cache(self, name="lyngsat"):
+        cache = HttpCache(self.path, name, timeout=5)
+        self.addCleanup(cache.close)
+        return cache
+
+    def test_page_is_reused_if_not_modified(self):
+        url = f"{self.server.url}{PAGE_PATH}"
+        cache = self.get_cache()
+        page = cache.get_page(url)
+        self.assertIn("Test One", page)
+        self.assertEqual(cache.get_page(url), page)
+        self.assertEqual(self.server.count(PAGE_PATH, 200), 1)
+        self.assertEqual(self.server.count(PAGE_PATH, 304), 1)
+
+    def test_validators_are_persistent(self):
+        url = f"{self.server.url}{PAGE_PATH}"
+        cache = self.get_cache()
+        page = cache.get_page(url)
+        cache.save()
+
+        self.assertEqual(self.get_cache().get_page(url), page)
+        self.assertEqual(self.server.count(PAGE_PATH, 304), 1)
+
+    def test_modified_page_is_downloaded(self):
+        url = f"{self.server.url}{PAGE_PATH}"
+        cache = self.get_cache()
+        cache.get_page(url)
+        self.server.routes[PAGE_PATH] = b"<html>Modified</html>"
+
+        self.assertEqual(cache.get_page(url), "<html>Modified</html>")
+        self.assertEqual(self.server.count(PAGE_PATH, 200), 2)
+
+    def test_separate_metadata(self):
+        url = f"{self.server.url}{PAGE_PATH}"
+        first, second = self.get_cache("first"), self.get_cache("second")
+        first.get_page(url)
+        second.get_page(url)
+        first.save()
+        second.save()
+
+        self.assertTrue(os.path.isfile(f"{self.path}first-cache.json"))
+        self.assertTrue(os.path.isfile(f"{self.path}second-cache.json"))
+        self.get_cache("first").get_page(url)
+        self.get_cache("second").get_page(url)
+        self.assertEqual(self.server.count(PAGE_PATH, 304), 2)
+
+    def test_old_data_is_removed(self):
+        url = f"{self.server.url}{PAGE_PATH}"
+        cache = self.get_cache()
+        cache.get_page(url)
+        data_path = f"{self.path}lyngsat{os.sep}"
+        files = os.listdir(data_path)
+        self.assertEqual(len(files), 1)
+
+        old_time = time.time() - HttpCache.MAX_DATA_AGE - 60
+        os.utime(f"{data_path}{files[0]}", (old_time, old_time))
+        cache.save()
+
+        self.assertEqual(os.listdir(data_path), [])
+        self.get_cache().get_page(url)
+        self.assertEqual(self.server.count(PAGE_PATH, 200), 2)
+
+    def test_picon_download(self):
+        url = f"{self.server.url}{PICON_PATH}"
+        dest = f"{self.path}picon.png"
+        cache = self.get_cache()
+        download_picon(url, dest, cache)
+        with open(dest, "rb") as f:
+            self.assertEqual(f.read(), read_fixture("lyngsat/test-one.png"))
+        mtime = os.path.getmtime(dest)
+
+        self.assertFalse(cache.download(url, dest))
+        self.assertEqual(os.path.getmtime(dest), mtime)
+        # Local copy removed -> downloaded again.
+        os.remove(dest)
+        self.assertTrue(cache.download(url, dest))
+        self.assertEqual(self.server.count(PICON_PATH, 200), 2)
+
+    def test_missing_picon(self):
+        dest = f"{self.path}picon.png"
+        download_picon(f"{self.server.url}/logo/tv/tt/missing.png", dest, self.get_cache())
+        self.assertFalse(os.path.exists(dest))
+
+    def test_provider_parsing(self):
+        provider = Provider(None, "Test", "19.2E", PAGE_PATH, "1", None, False, True)
+        picon_ids = {"4D2:1:C00000": "1_0_1_4D2_1_1_C00000_0_0_0.png"}
+        cache = self.get_cache()
+
+        with mock.patch.object(PiconsParser, "_BASE_URL", self.server.url):
+            picons = PiconsParser.parse(provider, self.path, picon_ids, SettingsType.ENIGMA_2, cache)
+            self.assertEqual(PiconsParser.parse(provider, self.path, picon_ids, SettingsType.ENIGMA_2, cache),
+                             picons)
+
+        self.assertEqual(picons, [(f"{self.server.url}/logo/tv/tt/test-one.png",
+                                   f"{self.path}1_0_1_4D2_1_1_C00000_0_0_0.png"),
+                                  (f"{self.server.url}/logo/tv/tt/test-two.png", f"{self.path}test-two.png")])
+        self.assertEqual(self.server.count(PAGE_PATH, 304), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,114 @@
+""" Offline tests for the IPTV streams checking and probing. """
+import socket
+import unittest
+
+from app.tools.streams import StreamChecker, StreamProber, StreamStatus, StreamVariant
+from tests.http_server import FixtureServer, read_fixture
+
+TS_PACKET_SIZE = 188
+PMT_PID = 0x100
+# Stream type, PID, descriptors.
+TS_STREAMS = ((0x1B, 0x101, b""), (0x0F, 0x102, b""), (0x06, 0x103, b"\x6A\x00"))
+
+
+def get_ts_packet(pid, section):
+    """ Returns the TS packet [with the start of the section] padded to the packet size. """
+    header = bytes((0x47, 0x40 | (pid >> 8), pid & 0xFF, 0x10, 0x00))
+    return (header + section).ljust(TS_PACKET_SIZE, b"\xFF")
+
+
+def get_section(table_id, ext_id, data):
+    length = 5 + len(data) + 4  # + CRC [not checked].
+    return bytes((table_id, 0xB0 | (length >> 8), length & 0xFF, ext_id >> 8, ext_id & 0xFF, 0xC1, 0, 0)) + data + \
+           b"\x00" * 4
+
+
+def get_ts_segment(streams=TS_STREAMS):
+    """ Returns the MPEG-TS data with PAT, PMT and several empty packets. """
+    pat = get_section(0x00, 1, bytes((0x00, 0x01, 0xE0 | (PMT_PID >> 8), PMT_PID & 0xFF)))
+    es = b"".join(bytes((t, 0xE0 | (p >> 8), p & 0xFF, 0xF0, len(d))) + d for t, p, d in streams)
+    pmt = get_section(0x02, 1, bytes((0xE1, 0x01, 0xF0, 0x00)) + es)
+    empty = bytes((0x47, 0x01, 0x01, 0x10)).ljust(TS_PACKET_SIZE, b"\xFF")
+    return get_ts_packet(0, pat) + get_ts_packet(PMT_PID, pmt) + empty * 8
+
+
+def get_free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class StreamsTest(unittest.TestCase):
+
+    def setUp(self):
+        media, segment = read_fixture("streams/media.m3u8"), get_ts_segment()
+        self.server = FixtureServer({"/live/master.m3u8": read_fixture("streams/master.m3u8"),
+                                     "/live/hd/media.m3u8": media,
+                                     "/live/sd/media.m3u8": media,
+                                     "/live/sd/segment0.ts": segment,
+                                     "/live/hd/segment0.ts": segment,
+                                     "/invalid.m3u8": read_fixture("streams/invalid.m3u8"),
+                                     "/stream.ts": segment * 4}).__enter__()
+        self.prober = StreamProber(workers=4, timeout=(2, 2))
+        self.checker = StreamChecker(workers=4, timeout=(2, 2), ttl=0)
+
+    def tearDown(self):
+        self.prober.close()
+        self.checker.close()
+        self.server.__exit__(None, None, None)
+
+    def test_ts_codecs(self):
+        segment = get_ts_segment()
+        self.assertEqual(StreamProber.get_ts_codecs(segment), ("H.264", "AAC", "AC-3"))
+        # Not aligned data.
+        self.assertEqual(StreamProber.get_ts_codecs(b"\x00" * 10 + segment), ("H.264", "AAC", "AC-3"))
+        self.assertEqual(StreamProber.get_ts_codecs(b"\x00" * 1024), ())
+
+    def test_probe_master_playlist(self):
+        url = f"{self.server.url}/live/master.m3u8"
+        result = self.prober.probe(url)
+
+        self.assertIs(result.status, StreamStatus.OK)
+        self.assertEqual(result.kind, "hls")
+        hd, sd = f"{self.server.url}/live/hd/media.m3u8", f"{self.server.url}/live/sd/media.m3u8"
+        self.assertEqual(result.variants, (StreamVariant(2560000, "1280x720", "avc1.64001f,mp4a.40.2", hd),
+                                           StreamVariant(800000, "640x360", "avc1.4d401e,mp4a.40.2", sd)))
+        self.assertEqual(result.codecs, ("H.264", "AAC", "AC-3"))
+        self.assertIsNotNone(result.segment_latency)
+        # The variant with the lowest bandwidth is checked only.
+        self.assertEqual(self.server.count("/live/sd/segment0.ts", 200), 1)
+        self.assertEqual(self.server.count("/live/hd/media.m3u8"), 0)
+
+    def test_probe_media_playlist(self):
+        result = self.prober.probe(f"{self.server.url}/live/sd/media.m3u8")
+        self.assertIs(result.status, StreamStatus.OK)
+        self.assertEqual((result.kind, result.variants, result.codecs), ("hls", (), ("H.264", "AAC", "AC-3")))
+
+    def test_probe_ts_stream(self):
+        result = self.prober.probe(f"{self.server.url}/stream.ts")
+        self.assertIs(result.status, StreamStatus.OK)
+        self.assertEqual((result.kind, result.code, result.codecs), ("ts", 200, ("H.264", "AAC", "AC-3")))
+
+    def test_probe_errors(self):
+        result = self.prober.probe(f"{self.server.url}/missing.ts")
+        self.assertEqual((result.status, result.code), (StreamStatus.HTTP_ERROR, 404))
+        result = self.prober.probe(f"http://127.0.0.1:{get_free_port()}/stream.ts")
+        self.assertIs(result.status, StreamStatus.CONNECTION_ERROR)
+        self.assertIs(self.prober.probe("rtmp://127.0.0.1/live").status, StreamStatus.UNSUPPORTED)
+
+    def test_check_all(self):
+        urls = {f"{self.server.url}/live/master.m3u8": StreamStatus.OK,
+                f"{self.server.url}/stream.ts": StreamStatus.OK,
+                f"{self.server.url}/invalid.m3u8": StreamStatus.INVALID,
+                f"{self.server.url}/missing.m3u8": StreamStatus.HTTP_ERROR,
+                "rtsp://127.0.0.1/live": StreamStatus.UNSUPPORTED}
+        results = {r.url: r.status for r in self.checker.check_all(list(urls) * 2)}
+
+        self.assertEqual(results, urls)
+        # Duplicates are checked once. HEAD is used for the streams.
+        self.assertEqual(self.server.count("/live/master.m3u8"), 1)
+        self.assertEqual(self.server.requests.count(("HEAD", "/stream.ts", 200)), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()